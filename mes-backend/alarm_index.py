@@ -0,0 +1,369 @@
+import asyncio
+import os
+import threading
+from datetime import datetime
+import psycopg2.extras
+from starlette.concurrency import run_in_threadpool
+from db import connection
+from change_feed import change_feed
+
+# Seconds within which a machine resending an open alarm's code counts as
+# another occurrence of that alarm rather than a new one; 0 turns it off
+ALARM_DEDUP_WINDOW = float(os.getenv("ALARM_DEDUP_WINDOW", "60"))
+# Seconds between writes of the folded occurrence counts
+ALARM_FLUSH_INTERVAL = float(os.getenv("ALARM_FLUSH_INTERVAL", "5"))
+
+OPEN_ALARMS_SQL = (
+    "SELECT a.id, a.machine_id, a.code, COALESCE(a.last_seen_at, a.occurred_at) AS last_seen, m.line_id "
+    "FROM alarms a LEFT JOIN machines m ON m.id = a.machine_id WHERE a.cleared_at IS NULL"
+)
+MACHINE_LINES_SQL = "SELECT id, line_id FROM machines WHERE id = ANY(%s)"
+
+# A new row unless the machine has this code open and seen within the window
+# (opened by another worker, or before a restart); that row is adopted below
+OPEN_SQL = """
+    INSERT INTO alarms (machine_id, code, description, occurred_at, last_seen_at)
+    SELECT %(machine_id)s, %(code)s, %(description)s, %(at)s, %(at)s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM alarms
+        WHERE machine_id = %(machine_id)s AND code = %(code)s AND cleared_at IS NULL
+          AND COALESCE(last_seen_at, occurred_at) >= %(at)s::timestamp - %(window)s * INTERVAL '1 second'
+    )
+    RETURNING id, last_seen_at AS last_seen, (SELECT line_id FROM machines WHERE id = %(machine_id)s) AS line_id
+"""
+ADOPT_SQL = """
+    UPDATE alarms SET occurrences = occurrences + 1,
+                      last_seen_at = GREATEST(COALESCE(last_seen_at, occurred_at), %(at)s::timestamp)
+    WHERE id = (
+        SELECT id FROM alarms
+        WHERE machine_id = %(machine_id)s AND code = %(code)s AND cleared_at IS NULL
+        ORDER BY COALESCE(last_seen_at, occurred_at) DESC LIMIT 1
+    )
+    RETURNING id, last_seen_at AS last_seen, (SELECT line_id FROM machines WHERE id = %(machine_id)s) AS line_id
+"""
+INSERT_SQL = (
+    "INSERT INTO alarms (machine_id, code, description, occurred_at, cleared_at) VALUES (%s, %s, %s, %s, %s) "
+    "RETURNING id, occurred_at AS last_seen, (SELECT line_id FROM machines WHERE id = %s) AS line_id"
+)
+FLUSH_SQL = (
+    "UPDATE alarms SET occurrences = alarms.occurrences + v.n, "
+    "last_seen_at = GREATEST(COALESCE(alarms.last_seen_at, alarms.occurred_at), v.seen) "
+    "FROM (VALUES %s) AS v(id, n, seen) WHERE alarms.id = v.id"
+)
+
+def report_time(value):
+    # Timestamps arrive as ISO strings from JSON; naive like the column, and
+    # None when unparseable (the report is then written as it is)
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+class AlarmIndex:
+    # Open alarms per machine, with the line each machine is on, mirrored
+    # from the alarms table so line summaries count them without a query.
+    #
+    # It also folds alarm storms: a report of a code the machine already has
+    # open, seen within ALARM_DEDUP_WINDOW, only bumps that alarm's
+    # occurrence count in memory. The counts are written every
+    # ALARM_FLUSH_INTERVAL seconds in one UPDATE, so a PLC resending a fault
+    # many times a second costs one write per interval instead of one per
+    # report. A crash loses at most one interval of counts, never an alarm.
+    #
+    # Loaded lazily like the stop tracker; another worker's alarm writes
+    # arrive through the change feed and drop the state for a reload.
+
+    def __init__(self, window=ALARM_DEDUP_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.open = {}
+        self.latest = {}
+        self.lines = {}
+        self.pending = {}
+        self.loaded = False
+        self.lines_stale = False
+        self.counters = {"folded": 0, "opened": 0, "flushes": 0, "failures": 0}
+
+    # Loading
+
+    def _fill(self, rows):
+        with self.lock:
+            if self.loaded:
+                return
+            self.open, self.latest, self.lines = {}, {}, {}
+            for row in rows:
+                self._add(row["id"], row["machine_id"], row["code"], row["last_seen"], row["line_id"])
+            self.loaded = True
+            self.lines_stale = False
+
+    def ensure_loaded(self, conn):
+        if not self.loaded:
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.execute(OPEN_ALARMS_SQL)
+            rows = cur.fetchall()
+            cur.close()
+            self._fill(rows)
+
+    async def ensure_loaded_async(self, aconn):
+        if not self.loaded:
+            self._fill(await aconn.fetch(OPEN_ALARMS_SQL))
+
+    def _add(self, alarm_id, machine_id, code, last_seen, line_id):
+        # Under self.lock. An alarm without a time never folds reports
+        last_seen = last_seen or datetime.min
+        self.open.setdefault(machine_id, {})[alarm_id] = [code, last_seen]
+        self.lines[machine_id] = line_id
+        current = self.latest.get((machine_id, code))
+        if current is None or self.open[machine_id][current][1] <= last_seen:
+            self.latest[(machine_id, code)] = alarm_id
+
+    def _remove(self, alarm_id):
+        # Under self.lock
+        for machine_id, alarms in list(self.open.items()):
+            entry = alarms.pop(alarm_id, None)
+            if entry is None:
+                continue
+            if self.latest.get((machine_id, entry[0])) == alarm_id:
+                del self.latest[(machine_id, entry[0])]
+                for other_id, (code, last_seen) in list(alarms.items()):
+                    if code == entry[0]:
+                        self._add(other_id, machine_id, code, last_seen, self.lines.get(machine_id))
+            if not alarms:
+                del self.open[machine_id]
+                self.lines.pop(machine_id, None)
+            return
+
+    # Reports
+
+    def match(self, machine_id, code, at):
+        # The open alarm a report at `at` repeats, or None when it needs a row
+        if self.window <= 0 or at is None or not self.loaded:
+            return None
+        with self.lock:
+            alarm_id = self.latest.get((machine_id, code))
+            if alarm_id is None or abs((at - self.open[machine_id][alarm_id][1]).total_seconds()) > self.window:
+                return None
+            return alarm_id
+
+    def count(self, folded):
+        # folded: {alarm_id: (reports, latest report time)}, added to the
+        # counts waiting for the next flush
+        with self.lock:
+            for alarm_id, (n, at) in folded.items():
+                for alarms in self.open.values():
+                    if alarm_id in alarms:
+                        alarms[alarm_id][1] = max(alarms[alarm_id][1], at)
+                pending_n, seen = self.pending.get(alarm_id, (0, at))
+                self.pending[alarm_id] = (pending_n + n, max(seen, at))
+                self.counters["folded"] += n
+
+    def absorb(self, machine_id, code, at):
+        # match() and count() in one step
+        alarm_id = self.match(machine_id, code, at)
+        if alarm_id is not None:
+            self.count({alarm_id: (1, at)})
+        return alarm_id
+
+    def observe(self, conn, machine_id, code, description, occurred_at, cleared_at=None):
+        # Records one alarm report. Returns (alarm id, folded into an open
+        # alarm, change); call inside the request's transaction and pass the
+        # change to apply() once it has committed.
+        self.ensure_loaded(conn)
+        at = report_time(occurred_at)
+        if cleared_at is None:
+            alarm_id = self.absorb(machine_id, code, at)
+            if alarm_id is not None:
+                return alarm_id, True, None
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        try:
+            if cleared_at is not None or self.window <= 0 or at is None:
+                cur.execute(INSERT_SQL, (machine_id, code, description, occurred_at, cleared_at, machine_id))
+                row = cur.fetchone()
+                change = None if cleared_at is not None else (row["id"], machine_id, code, row["last_seen"], row["line_id"])
+                return row["id"], False, change
+            params = {"machine_id": machine_id, "code": code, "description": description, "at": occurred_at, "window": self.window}
+            cur.execute(OPEN_SQL, params)
+            row = cur.fetchone()
+            folded = row is None
+            if folded:
+                cur.execute(ADOPT_SQL, params)
+                row = cur.fetchone()
+            if row is None:
+                # The open alarm was cleared in between
+                folded = False
+                cur.execute(INSERT_SQL, (machine_id, code, description, occurred_at, None, machine_id))
+                row = cur.fetchone()
+            return row["id"], folded, (row["id"], machine_id, code, row["last_seen"], row["line_id"])
+        finally:
+            cur.close()
+
+    def apply(self, change):
+        if change is None:
+            return
+        with self.lock:
+            if not self.loaded:
+                return
+            alarm_id, machine_id, code, last_seen, line_id = change
+            if alarm_id not in self.open.get(machine_id, {}):
+                self.counters["opened"] += 1
+            self._add(alarm_id, machine_id, code, last_seen, line_id)
+
+    def collapse(self, rows):
+        # For bulk ingest, rows = [(index, (machine_id, code, occurred_at,
+        # description, cleared_at))], after ensure_loaded(). Returns
+        # - the rows still to insert, with their occurrence count and last
+        #   report time appended,
+        # - (index, target, target_is_row) for every report folded away:
+        #   target is an open alarm's id, or the index of the row of this
+        #   batch it was folded into,
+        # - the counts for count() once the batch has committed.
+        keep, folded, counts, first = [], [], {}, {}
+        for index, values in rows:
+            machine_id, code, occurred_at, _, cleared_at = values
+            at = report_time(occurred_at)
+            if cleared_at is not None or at is None or self.window <= 0:
+                keep.append([index, values, 1, occurred_at])
+                continue
+            alarm_id = self.match(machine_id, code, at)
+            if alarm_id is not None:
+                n, seen = counts.get(alarm_id, (0, at))
+                counts[alarm_id] = (n + 1, max(seen, at))
+                folded.append((index, alarm_id, False))
+                continue
+            row = first.get((machine_id, code))
+            if row is not None and abs((at - report_time(row[3])).total_seconds()) <= self.window:
+                row[2] += 1
+                if at > report_time(row[3]):
+                    row[3] = occurred_at
+                folded.append((index, row[0], True))
+                continue
+            row = first[(machine_id, code)] = [index, values, 1, occurred_at]
+            keep.append(row)
+        return [(index, values + (n, last_seen)) for index, values, n, last_seen in keep], folded, counts
+
+    # Other writes
+
+    def forget(self, alarm_id):
+        with self.lock:
+            self._remove(alarm_id)
+
+    def updated(self, row):
+        # row: the alarm as written by a PUT, with line_id
+        with self.lock:
+            self._remove(row["id"])
+            if self.loaded and row["cleared_at"] is None:
+                self._add(row["id"], row["machine_id"], row["code"], row["last_seen"], row["line_id"])
+
+    def machine_moved(self, machine_id, line_id):
+        with self.lock:
+            if machine_id in self.lines:
+                self.lines[machine_id] = line_id
+
+    def forget_machine(self, machine_id):
+        with self.lock:
+            for alarm_id in list(self.open.get(machine_id, {})):
+                self._remove(alarm_id)
+            self.lines.pop(machine_id, None)
+
+    def invalidate(self):
+        # Reloaded from the table on next use; folded counts not yet written
+        # are kept, they refer to rows by id
+        with self.lock:
+            self.open, self.latest, self.lines = {}, {}, {}
+            self.loaded = False
+
+    # Reads
+
+    def _refresh_lines(self, rows):
+        with self.lock:
+            for row in rows:
+                if row["id"] in self.lines:
+                    self.lines[row["id"]] = row["line_id"]
+            self.lines_stale = False
+
+    def _counts(self):
+        with self.lock:
+            by_machine = {machine_id: len(alarms) for machine_id, alarms in self.open.items()}
+            by_line = {}
+            for machine_id, count in by_machine.items():
+                line_id = self.lines.get(machine_id)
+                by_line[line_id] = by_line.get(line_id, 0) + count
+            return by_line, by_machine
+
+    def cached_counts(self):
+        # open_counts_async() without a query, or None while the index has to
+        # be loaded or lines of moved machines read
+        with self.lock:
+            if not self.loaded or self.lines_stale:
+                return None
+        return self._counts()
+
+    async def open_counts_async(self, aconn):
+        # ({line_id: open alarms}, {machine_id: open alarms})
+        await self.ensure_loaded_async(aconn)
+        if self.lines_stale:
+            self._refresh_lines(await aconn.fetch(MACHINE_LINES_SQL, (list(self.lines),)))
+        return self._counts()
+
+    # Folded counts
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+        try:
+            with connection() as conn:
+                cur = conn.cursor()
+                psycopg2.extras.execute_values(
+                    cur, FLUSH_SQL, [(alarm_id, n, seen) for alarm_id, (n, seen) in batch.items()]
+                )
+                conn.commit()
+                cur.close()
+        except Exception:
+            with self.lock:
+                for alarm_id, (n, seen) in batch.items():
+                    pending_n, pending_seen = self.pending.get(alarm_id, (0, seen))
+                    self.pending[alarm_id] = (n + pending_n, max(seen, pending_seen))
+                self.counters["failures"] += 1
+            raise
+        with self.lock:
+            self.counters["flushes"] += 1
+        return len(batch)
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                "loaded": self.loaded,
+                "open_alarms": sum(len(alarms) for alarms in self.open.values()),
+                "machines_alarmed": len(self.open),
+                "pending_alarms": len(self.pending),
+                "window": self.window,
+            }
+
+async def run_flusher(index, interval=ALARM_FLUSH_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(index.flush)
+        except Exception as exc:
+            print(f"[alarms] occurrence flush failed, will retry: {exc}")
+
+alarm_index = AlarmIndex()
+
+def _on_alarms_change(change):
+    if not change.local:
+        alarm_index.invalidate()
+
+def _on_machines_change(change):
+    # Only the line of machines with open alarms matters here
+    if change.local:
+        return
+    if change.ids is None or any(machine_id in alarm_index.lines for machine_id in change.ids):
+        alarm_index.lines_stale = True
+
+change_feed.subscribe(("alarms",), _on_alarms_change)
+change_feed.subscribe(("machines",), _on_machines_change)
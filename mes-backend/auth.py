@@ -1,21 +1,39 @@
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import os
+import threading
+import time
+import psycopg2.extras
+from db import connection
+from password_pool import password_pool
+from change_feed import change_feed
 
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Resolved users are cached per token subject; writes to users invalidate
+# entries immediately, in other workers through the change feed, and the TTL
+# bounds staleness while the feed is down
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# bcrypt runs on the password process pool, never on a request thread
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.verify(plain_password, hashed_password)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await password_pool.verify_async(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_pool.hash(password)
+
+async def get_password_hash_async(password):
+    return await password_pool.hash_async(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -23,8 +41,65 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+class PrincipalCache:
+    def __init__(self, ttl=AUTH_CACHE_TTL, max_size=AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username):
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(username, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, username, user):
+        with self.lock:
+            self.entries[username] = (time.monotonic() + self.ttl, user)
+            self.entries.move_to_end(username)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id=None, username=None):
+        with self.lock:
+            if username is not None:
+                self.entries.pop(username, None)
+            if user_id is not None:
+                for key, (_, user) in list(self.entries.items()):
+                    if user["id"] == user_id:
+                        del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+principal_cache = PrincipalCache()
+
+def _on_users_change(change):
+    # A role change or deactivation elsewhere takes effect here at once
+    if change.local:
+        return
+    if change.ids is None:
+        principal_cache.clear()
+    else:
+        for user_id in change.ids:
+            principal_cache.invalidate(user_id=user_id)
+
+change_feed.subscribe(("users",), _on_users_change)
+
 def get_current_user(token: str = Depends(oauth2_scheme)):
-    from db import get_connection
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -37,19 +112,20 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    # Fetch user from DB
-    conn = get_connection(cursor_factory=None)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = %s", (username,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    user = principal_cache.get(username)
     if user is None:
-        raise credentials_exception
-    # Convert to dict if needed
-    if not isinstance(user, dict):
-        columns = [desc[0] for desc in cur.description]
-        user = dict(zip(columns, user))
+        with connection() as conn:
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+            user = cur.fetchone()
+            cur.close()
+        if user is None:
+            raise credentials_exception
+        user = dict(user)
+        user.pop("password_hash", None)
+        principal_cache.put(username, user)
+    if (user.get("status") or "").lower() == "banned":
+        raise HTTPException(status_code=403, detail="User is banned")
     return user
 
 def require_role(*roles):
@@ -0,0 +1,74 @@
+"""Requests/s under many concurrent clients, slow and fast endpoints mixed.
+
+Each client loops for --duration seconds. A --slow-share fraction of the
+requests are large list reads (GET /api/events/?limit=5000); the rest are
+single-machine reads (GET /api/machines/{id}). Fast-request latency shows
+whether slow queries starve everything else of workers.
+
+Run it against the same database once with the sync routes (the commit
+before the async DB layer) and once with the current tree:
+
+    uvicorn main:app --port 8000
+    python benchmarks/concurrency_bench.py --url http://localhost:8000 --clients 500 --duration 30
+"""
+import argparse
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def client(url, machine_ids, slow_share, deadline, results, lock):
+    fast, slow, errors = [], [], 0
+    while time.perf_counter() < deadline:
+        is_slow = random.random() < slow_share
+        path = "/api/events/?limit=5000" if is_slow else f"/api/machines/{random.choice(machine_ids)}"
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url + path, timeout=60) as res:
+                res.read()
+        except (urllib.error.URLError, OSError):
+            errors += 1
+            continue
+        (slow if is_slow else fast).append(time.perf_counter() - started)
+    with lock:
+        results["fast"].extend(fast)
+        results["slow"].extend(slow)
+        results["errors"] += errors
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--slow-share", type=float, default=0.05)
+    parser.add_argument("--machine-ids", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    results = {"fast": [], "slow": [], "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for _ in range(args.clients):
+            pool.submit(client, args.url, args.machine_ids, args.slow_share, deadline, results, lock)
+    elapsed = time.perf_counter() - started
+
+    total = len(results["fast"]) + len(results["slow"])
+    print(f"clients:     {args.clients} for {elapsed:.1f} s")
+    print(f"requests:    {total} ok, {results['errors']} failed")
+    print(f"throughput:  {total / elapsed:,.0f} req/s")
+    print(f"fast p50:    {percentile(results['fast'], 0.5):.1f} ms")
+    print(f"fast p99:    {percentile(results['fast'], 0.99):.1f} ms")
+    print(f"slow p50:    {percentile(results['slow'], 0.5):.1f} ms")
+    print(f"slow p99:    {percentile(results['slow'], 0.99):.1f} ms")
+
+if __name__ == "__main__":
+    main()
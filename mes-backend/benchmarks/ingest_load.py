@@ -0,0 +1,73 @@
+"""Load test for POST /api/ingest.
+
+Sends batches of mixed events/alarms/stops to a running backend and reports
+sustained records per second.
+
+    python benchmarks/ingest_load.py --url http://localhost:8000 --records 100000 --batch 1000 --concurrency 4
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+def make_record(machine_ids, work_order_id, now):
+    machine_id = random.choice(machine_ids)
+    at = (now - timedelta(seconds=random.randint(0, 3600))).isoformat()
+    kind = random.choices(["event", "alarm", "stop"], weights=[8, 1, 1])[0]
+    if kind == "event":
+        return {"kind": "event", "machine_id": machine_id, "work_order_id": work_order_id,
+                "event_type": "COUNTER", "description": "pieces=1", "occurred_at": at}
+    if kind == "alarm":
+        return {"kind": "alarm", "machine_id": machine_id, "code": f"E{random.randint(100, 199)}",
+                "description": "load test", "occurred_at": at, "cleared_at": at}
+    return {"kind": "stop", "machine_id": machine_id, "reason": "load test", "start_time": at, "end_time": at}
+
+def post_batch(url, records, ndjson):
+    if ndjson:
+        body = "\n".join(json.dumps(r) for r in records).encode()
+        content_type = "application/x-ndjson"
+    else:
+        body = json.dumps(records).encode()
+        content_type = "application/json"
+    req = urllib.request.Request(f"{url}/api/ingest/", data=body, headers={"Content-Type": content_type})
+    started = time.perf_counter()
+    with urllib.request.urlopen(req) as res:
+        result = json.loads(res.read())
+    return result["accepted"], result["rejected"], time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--machine-ids", type=int, nargs="+", default=[1])
+    parser.add_argument("--work-order-id", type=int, default=1)
+    parser.add_argument("--ndjson", action="store_true")
+    args = parser.parse_args()
+
+    now = datetime.now()
+    batches = []
+    for start in range(0, args.records, args.batch):
+        size = min(args.batch, args.records - start)
+        batches.append([make_record(args.machine_ids, args.work_order_id, now) for _ in range(size)])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda b: post_batch(args.url, b, args.ndjson), batches))
+    elapsed = time.perf_counter() - started
+
+    accepted = sum(r[0] for r in results)
+    rejected = sum(r[1] for r in results)
+    latencies = sorted(r[2] * 1000 for r in results)
+    print(f"records:     {accepted} accepted, {rejected} rejected in {len(batches)} batches")
+    print(f"elapsed:     {elapsed:.2f} s")
+    print(f"throughput:  {accepted / elapsed:,.0f} records/s")
+    print(f"batch p50:   {latencies[len(latencies) // 2]:.1f} ms")
+    print(f"batch p99:   {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Serialization cost of list payloads: jsonable_encoder vs json_response.
+
+Builds stops-shaped rows (ints, text, timestamps, NULLs, booleans, numerics)
+and times FastAPI's default path (jsonable_encoder + json.dumps) against
+json_response.dumps with orjson and with the stdlib fallback. No database
+needed.
+
+    python benchmarks/json_bench.py --rows 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+import json_response
+
+def make_rows(count):
+    now = datetime.now()
+    rows = []
+    for i in range(count):
+        start = now - timedelta(seconds=random.randint(0, 30 * 86400), microseconds=random.randint(0, 999999))
+        closed = random.random() < 0.95
+        rows.append({
+            "id": i + 1,
+            "machine_id": random.randint(1, 200),
+            "reason": random.choice([None, "Jam", "Changeover", "No material"]),
+            "start_time": start,
+            "end_time": start + timedelta(seconds=random.randint(5, 3600)) if closed else None,
+            "resolved": closed,
+            "downtime": Decimal(random.randint(5, 360000)) / 100,
+        })
+    return rows
+
+def fastapi_default(payload):
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def stdlib_fallback(payload):
+    return json_response._stdlib_encoder.encode(payload).encode("utf-8")
+
+def timed(fn, payload, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(payload)
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    variants = [("jsonable_encoder", fastapi_default), ("stdlib fallback", stdlib_fallback)]
+    if json_response.orjson is not None:
+        variants.append(("orjson", json_response.dumps))
+    print(f"{'rows':>8}  " + "  ".join(f"{name:>18}" for name, _ in variants))
+    for count in args.rows:
+        payload = {"stops": make_rows(count), "next_after_id": None}
+        cells, reference = [], None
+        for name, fn in variants:
+            seconds, body = timed(fn, payload, args.repeat)
+            decoded = json.loads(body)
+            if reference is None:
+                reference = decoded
+            elif decoded != reference:
+                raise SystemExit(f"{name} output differs from jsonable_encoder at {count} rows")
+            cells.append(f"{seconds * 1000:>15.1f} ms")
+        print(f"{count:>8}  " + "  ".join(cells))
+
+if __name__ == "__main__":
+    main()
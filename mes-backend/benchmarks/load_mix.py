@@ -0,0 +1,253 @@
+"""Replay a shop-floor traffic mix against a running backend.
+
+Seed the database with seed_plant.py, start the API, then run:
+
+    python benchmarks/load_mix.py --url http://localhost:8000 --duration 60 --out results/main.json
+
+Traffic, all running at once for --duration seconds:
+  screens     --screens displays, each polling GET /api/machines/ and
+              GET /api/production-lines/ every --poll seconds
+  dashboards  --dashboards users loading the dashboard summary, the lines
+              page and one line timeline every --dashboard-every seconds
+  stops       POST /api/stops/ at --stop-rate per second (closed stops)
+  status      PUT /api/machines/{id}/status at --status-rate per second
+  logins      a burst of --login-burst concurrent logins every --login-every
+              seconds, spread over the seeded bench_user_N accounts
+
+Per endpoint it reports throughput and p50/p95/p99, and writes them as JSON
+to --out. --compare takes an earlier result file, prints the change per
+endpoint and exits 1 when a p95 got worse by more than --tolerance.
+Logins are rate limited per IP by the backend; raise LOGIN_IP_LIMIT on the
+server for large bursts, otherwise they show up as 429s.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.statuses = {}
+
+    def record(self, label, seconds, status):
+        with self.lock:
+            self.samples.setdefault(label, []).append(seconds)
+            counts = self.statuses.setdefault(label, {})
+            counts[status] = counts.get(status, 0) + 1
+
+def percentile(values, p):
+    # Nearest rank on sorted values, in ms
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, max(0, int(round(p * len(values))) - 1))] * 1000, 2)
+
+class Client:
+    def __init__(self, url, recorder, token=None):
+        self.url = url
+        self.recorder = recorder
+        self.token = token
+
+    def call(self, method, path, label, body=None, form=None, token=None):
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if token or self.token:
+            headers["Authorization"] = f"Bearer {token or self.token}"
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        payload = None
+        try:
+            with urllib.request.urlopen(request, timeout=60) as res:
+                payload = res.read()
+                status = res.status
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            status = exc.code
+        except (urllib.error.URLError, OSError):
+            status = "error"
+        self.recorder.record(label, time.perf_counter() - started, status)
+        return json.loads(payload) if payload else None
+
+    def login(self, username, password, label="POST /api/auth/login"):
+        result = self.call("POST", "/api/auth/login", label, form={"username": username, "password": password})
+        return result["access_token"] if result else None
+
+def every(interval, deadline, action, jitter=True):
+    # Fixed cadence; a slow call delays the next one instead of bursting
+    if jitter:
+        time.sleep(random.random() * interval)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        action()
+        time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+def open_loop(rate, deadline, pool, action):
+    # Poisson arrivals at rate per second, each on a pool thread, so a slow
+    # server does not lower the offered load
+    if rate <= 0:
+        return
+    while time.perf_counter() < deadline:
+        time.sleep(random.expovariate(rate))
+        pool.submit(action)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for label, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        statuses = recorder.statuses[label]
+        errors = sum(count for status, count in statuses.items() if status == "error" or int(status) >= 400)
+        endpoints[label] = {
+            "count": len(samples),
+            "errors": errors,
+            "statuses": {str(status): count for status, count in statuses.items()},
+            "throughput": round(len(samples) / elapsed, 2),
+            "mean": round(sum(samples) / len(samples) * 1000, 2),
+            "p50": percentile(samples, 0.50),
+            "p95": percentile(samples, 0.95),
+            "p99": percentile(samples, 0.99),
+            "max": round(samples[-1] * 1000, 2),
+        }
+    return endpoints
+
+def compare(previous, current, tolerance):
+    regressions = []
+    print(f"\n{'endpoint':<44} {'p50':>16} {'p95':>16} {'p99':>16}")
+    for label, now in current.items():
+        before = previous.get(label)
+        if before is None:
+            continue
+        cells = []
+        for key in ("p50", "p95", "p99"):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:.1f}>{now[key]:.1f} {change:+.0f}%")
+        print(f"{label:<44} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16}")
+        if before["p95"] and now["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(label)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--screens", type=int, default=50)
+    parser.add_argument("--poll", type=float, default=5)
+    parser.add_argument("--dashboards", type=int, default=5)
+    parser.add_argument("--dashboard-every", type=float, default=15)
+    parser.add_argument("--stop-rate", type=float, default=2)
+    parser.add_argument("--status-rate", type=float, default=20)
+    parser.add_argument("--login-burst", type=int, default=20)
+    parser.add_argument("--login-every", type=float, default=30)
+    parser.add_argument("--users", type=int, default=50, help="bench_user_N accounts seeded")
+    parser.add_argument("--password", default="bench")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write results as JSON here")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95 increase, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    setup = Client(args.url, Recorder())
+    token = setup.login("bench_admin", args.password)
+    if token is None:
+        raise SystemExit("Login as bench_admin failed; seed the database with benchmarks/seed_plant.py first.")
+    machines = setup.call("GET", "/api/machines/", "setup", token=token)["machines"]
+    machine_ids = [m["id"] for m in machines]
+    line_ids = sorted({m["line_id"] for m in machines if m["line_id"] is not None})
+    lines_by_id = {m["id"]: m["line_id"] for m in machines}
+
+    recorder = Recorder()
+    client = Client(args.url, recorder, token)
+
+    def screen():
+        client.call("GET", "/api/machines/", "GET /api/machines/")
+        client.call("GET", "/api/production-lines/", "GET /api/production-lines/")
+
+    def dashboard():
+        client.call("GET", "/api/dashboard/summary?range=7d", "GET /api/dashboard/summary")
+        client.call("GET", "/api/production-lines/", "GET /api/production-lines/")
+        client.call("GET", f"/api/production-lines/{random.choice(line_ids)}/timeline",
+                    "GET /api/production-lines/{line_id}/timeline")
+
+    def create_stop():
+        machine_id = random.choice(machine_ids)
+        end = datetime.now()
+        start = end - timedelta(seconds=random.randint(30, 900))
+        client.call("POST", "/api/stops/", "POST /api/stops/", body={
+            "machine_id": machine_id, "line_id": lines_by_id[machine_id], "reason": "load test",
+            "start_time": start.isoformat(), "end_time": end.isoformat(),
+        })
+
+    def report_status():
+        client.call("PUT", f"/api/machines/{random.choice(machine_ids)}/status", "PUT /api/machines/{id}/status",
+                    body={"status": random.choices(("RUNNING", "STOPPED"), weights=(9, 1))[0]})
+
+    def login_burst():
+        users = [f"bench_user_{random.randint(1, args.users)}" for _ in range(args.login_burst)]
+        with ThreadPoolExecutor(max_workers=max(1, args.login_burst)) as burst:
+            list(burst.map(lambda username: client.login(username, args.password), users))
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    workers = args.screens + args.dashboards + 4
+    with ThreadPoolExecutor(max_workers=workers) as actors, ThreadPoolExecutor(max_workers=64) as arrivals:
+        for _ in range(args.screens):
+            actors.submit(every, args.poll, deadline, screen)
+        for _ in range(args.dashboards):
+            actors.submit(every, args.dashboard_every, deadline, dashboard)
+        if args.login_burst:
+            actors.submit(every, args.login_every, deadline, login_burst)
+        actors.submit(open_loop, args.stop_rate, deadline, arrivals, create_stop)
+        actors.submit(open_loop, args.status_rate, deadline, arrivals, report_status)
+    elapsed = time.perf_counter() - started
+
+    endpoints = summarize(recorder, elapsed)
+    print(f"{'endpoint':<44} {'count':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for label, e in endpoints.items():
+        print(f"{label:<44} {e['count']:>7} {e['errors']:>5} {e['throughput']:>8.1f} "
+              f"{e['p50']:>8.1f} {e['p95']:>8.1f} {e['p99']:>8.1f}")
+    total = sum(e["count"] for e in endpoints.values())
+    print(f"total: {total} requests in {elapsed:.1f} s, {total / elapsed:,.1f} req/s")
+
+    result = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "elapsed": round(elapsed, 2),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "password")},
+        "endpoints": endpoints,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        regressions = compare(previous["endpoints"], endpoints, args.tolerance)
+        if regressions:
+            print(f"\np95 regressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
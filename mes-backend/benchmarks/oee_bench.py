@@ -0,0 +1,116 @@
+"""Compare the old per-machine OEE loop with oee.attach_oee.
+
+Runs against the database configured in .env, using TEMP tables that shadow
+machines/stops for this session only, so real data is never touched.
+
+    python benchmarks/oee_bench.py [--sizes 10 100 1000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2.extras
+from db import get_connection
+from oee import PLANNED_TIME, attach_oee
+
+def seed(conn, machine_count, stops_per_machine=20):
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS pg_temp.stops, pg_temp.machines")
+    cur.execute(
+        "CREATE TEMP TABLE machines (id SERIAL PRIMARY KEY, name TEXT, line_id INTEGER, status TEXT, "
+        "type TEXT, counter_type TEXT, avg_pieces_per_sec NUMERIC, product_id INTEGER)"
+    )
+    cur.execute(
+        "CREATE TEMP TABLE stops (id SERIAL PRIMARY KEY, machine_id INTEGER, reason TEXT, "
+        "start_time TIMESTAMP NOT NULL, end_time TIMESTAMP, resolved BOOLEAN DEFAULT FALSE)"
+    )
+    machines = [
+        (f"M{i}", i % 10, "RUNNING", "CNC", random.choice(["status", "counter"]), random.choice([None, 1.5]), None)
+        for i in range(machine_count)
+    ]
+    psycopg2.extras.execute_values(
+        cur,
+        "INSERT INTO machines (name, line_id, status, type, counter_type, avg_pieces_per_sec, product_id) VALUES %s",
+        machines,
+    )
+    now = datetime.now()
+    stops = []
+    for machine_id in range(1, machine_count + 1):
+        for _ in range(stops_per_machine):
+            start = now - timedelta(seconds=random.randint(0, 2 * PLANNED_TIME))
+            stops.append((machine_id, start, start + timedelta(seconds=random.randint(10, 600))))
+    psycopg2.extras.execute_values(cur, "INSERT INTO stops (machine_id, start_time, end_time) VALUES %s", stops)
+    cur.execute("CREATE INDEX ON stops (machine_id, start_time)")
+    cur.execute("ANALYZE machines")
+    cur.execute("ANALYZE stops")
+    conn.commit()
+    cur.close()
+
+def legacy_loop(conn):
+    # The pre-oee.py implementation of GET /api/machines, minus the debug print
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute("SELECT * FROM machines")
+    machines = cur.fetchall()
+    for machine in machines:
+        planned_time = PLANNED_TIME
+        shift_start = datetime.now() - timedelta(hours=8)
+        cur.execute(
+            "SELECT SUM(EXTRACT(EPOCH FROM (COALESCE(end_time, NOW()) - start_time))) as downtime "
+            "FROM stops WHERE machine_id = %s AND start_time >= %s",
+            (machine["id"], shift_start),
+        )
+        downtime = cur.fetchone()["downtime"] or 0
+        operating_time = max(planned_time - downtime, 0)
+        if machine["counter_type"] == "status":
+            actual_output, theoretical_output = operating_time, planned_time
+        else:
+            rate = machine["avg_pieces_per_sec"] or 0
+            actual_output, theoretical_output = rate * operating_time, rate * planned_time
+        availability = operating_time / planned_time
+        performance = (actual_output / theoretical_output) if theoretical_output > 0 else 0
+        machine["oee"] = round(float(availability) * float(performance) * 100, 1)
+    cur.close()
+    return machines
+
+def batched(conn):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute("SELECT * FROM machines")
+    machines = cur.fetchall()
+    cur.close()
+    return attach_oee(conn, machines, use_shifts=False)
+
+def measure(fn, conn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(conn)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    conn = get_connection()
+    try:
+        print(f"{'machines':>8} {'loop ms':>10} {'batched ms':>11} {'speedup':>8}")
+        for size in args.sizes:
+            seed(conn, size)
+            old = {m["id"]: m["oee"] for m in legacy_loop(conn)}
+            new = {m["id"]: m["oee"] for m in batched(conn)}
+            assert all(abs(old[k] - new[k]) <= 0.1 for k in old), "batched OEE differs from the legacy loop"
+            loop_ms = measure(legacy_loop, conn, args.repeat)
+            batch_ms = measure(batched, conn, args.repeat)
+            print(f"{size:>8} {loop_ms:>10.2f} {batch_ms:>11.2f} {loop_ms / batch_ms:>7.1f}x")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
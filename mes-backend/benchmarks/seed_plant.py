@@ -0,0 +1,215 @@
+"""Seed a database with a synthetic plant for benchmarks and load tests.
+
+Builds --lines production lines of --machines machines each, with --months
+of stop, status, counter-event and alarm history, written with COPY. The
+same --seed gives the same plant, so runs on different commits compare.
+
+Point .env at a scratch database: --reset empties every plant table first.
+
+    python benchmarks/seed_plant.py --reset --lines 10 --machines 20 --months 3
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, time as clock, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrate
+import partitions
+import rollups
+import shift_oee
+from db import get_connection
+from password_pool import _hash
+
+# Rows buffered per COPY round trip
+COPY_CHUNK = 100_000
+
+PLANT_TABLES = (
+    "events", "alarms", "stops", "machine_status_segments", "stop_rollups_hourly", "stop_rollups_daily",
+    "shift_oee", "batches", "production_history", "shifts", "work_orders", "machines", "products",
+    "production_lines", "users",
+)
+STOP_REASONS = ("Jam", "Material shortage", "Changeover", "Maintenance", "Quality check", "No operator", None)
+ALARM_CODES = tuple(f"E{code}" for code in range(100, 140))
+SHIFT_TIMES = (("Morning", clock(6), clock(14)), ("Afternoon", clock(14), clock(22)), ("Night", clock(22), clock(6)))
+
+class Copier:
+    # Streams rows into one table with COPY ... FROM STDIN, COPY_CHUNK at a time
+    def __init__(self, cur, table, columns):
+        self.cur = cur
+        self.sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = 0
+        self.total = 0
+
+    def add(self, row):
+        self.writer.writerow(row)
+        self.pending += 1
+        if self.pending >= COPY_CHUNK:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.buffer.seek(0)
+            self.cur.copy_expert(self.sql, self.buffer)
+            self.total += self.pending
+            self.buffer = io.StringIO()
+            self.writer = csv.writer(self.buffer)
+            self.pending = 0
+        return self.total
+
+def _ids(cur, sql):
+    cur.execute(sql)
+    return [row[0] for row in cur.fetchall()]
+
+def seed_reference(cur, rng, args, now):
+    password_hash = _hash(args.password)
+    users = [("Bench Admin", "bench_admin@example.com", "bench_admin", password_hash, "Active", "Admin")]
+    users += [
+        (f"Bench User {i}", f"bench_user_{i}@example.com", f"bench_user_{i}", password_hash, "Active", "User")
+        for i in range(1, args.users + 1)
+    ]
+    copier = Copier(cur, "users", ("full_name", "email", "username", "password_hash", "status", "role"))
+    for row in users:
+        copier.add(row)
+    copier.flush()
+
+    copier = Copier(cur, "products", ("name", "description", "status"))
+    for i in range(1, 6):
+        copier.add((f"Product {i}", "Synthetic product", "Active"))
+    copier.flush()
+    product_ids = _ids(cur, "SELECT id FROM products ORDER BY id")
+
+    copier = Copier(cur, "production_lines", ("name", "description", "status"))
+    for i in range(1, args.lines + 1):
+        copier.add((f"Line {i}", "Synthetic line", "RUNNING"))
+    copier.flush()
+    line_ids = _ids(cur, "SELECT id FROM production_lines ORDER BY id")
+
+    machines = Copier(cur, "machines", ("name", "line_id", "status", "type", "counter_type", "avg_pieces_per_sec", "product_id"))
+    shifts = Copier(cur, "shifts", ("line_id", "name", "start_time", "end_time", "shift_quantity", "operator", "duration", "status"))
+    orders = Copier(cur, "work_orders", ("product_id", "quantity", "status", "due_date", "assigned_line_id", "progress"))
+    batches = Copier(cur, "batches", ("line_id", "name", "current", "target", "elapsed"))
+    history = Copier(cur, "production_history", ("line_id", "code", "label", "qty"))
+    for line_id in line_ids:
+        for i in range(1, args.machines + 1):
+            counter = rng.random() < 0.5
+            machines.add((
+                f"L{line_id}-M{i}", line_id, "RUNNING", rng.choice(("CNC", "Press", "Filler", "Packer")),
+                "counter" if counter else "status", round(rng.uniform(0.5, 3.0), 3) if counter else None,
+                rng.choice(product_ids),
+            ))
+        for name, start, end in SHIFT_TIMES:
+            shifts.add((line_id, name, start, end, 1000, f"Operator {rng.randint(1, 50)}", 8, "Scheduled"))
+        for _ in range(2):
+            orders.add((rng.choice(product_ids), rng.randint(500, 5000), "Active",
+                        (now + timedelta(days=rng.randint(1, 30))).date(), line_id, round(rng.random(), 2)))
+        batches.add((line_id, f"Batch {line_id}-1", rng.randint(0, 900), 1000, "02:15"))
+        for i in range(5):
+            history.add((line_id, f"P{line_id}{i}", f"Run {i}", str(rng.randint(100, 1000))))
+    for copier in (machines, shifts, orders, batches, history):
+        copier.flush()
+    cur.execute("SELECT id, line_id FROM machines ORDER BY id")
+    return cur.fetchall(), _ids(cur, "SELECT id FROM work_orders ORDER BY id")
+
+def seed_history(cur, rng, args, machines, work_order_ids, start, now):
+    # Per machine: alternating RUNNING/STOPPED runs with exponential uptimes
+    # and log-normal stop durations, plus counter events and alarms
+    stops = Copier(cur, "stops", ("machine_id", "line_id", "start_time", "end_time", "reason", "resolved"))
+    segments = Copier(cur, "machine_status_segments", ("machine_id", "status", "start_time", "end_time"))
+    events = Copier(cur, "events", ("machine_id", "work_order_id", "event_type", "description", "occurred_at"))
+    alarms = Copier(cur, "alarms", ("machine_id", "code", "description", "occurred_at", "cleared_at"))
+    span = (now - start).total_seconds()
+    mean_uptime = 86400 / args.stops_per_day
+    stopped = []
+    for machine_id, line_id in machines:
+        at = start
+        while True:
+            run_end = at + timedelta(seconds=rng.expovariate(1 / mean_uptime))
+            if run_end >= now:
+                segments.add((machine_id, "RUNNING", at, None))
+                break
+            segments.add((machine_id, "RUNNING", at, run_end))
+            stop_end = run_end + timedelta(seconds=min(rng.lognormvariate(math.log(300), 1.0), 4 * 3600))
+            if stop_end >= now:
+                stops.add((machine_id, line_id, run_end, None, rng.choice(STOP_REASONS), False))
+                segments.add((machine_id, "STOPPED", run_end, None))
+                stopped.append(machine_id)
+                break
+            stops.add((machine_id, line_id, run_end, stop_end, rng.choice(STOP_REASONS), True))
+            segments.add((machine_id, "STOPPED", run_end, stop_end))
+            at = stop_end
+        for _ in range(int(span / 3600 * args.events_per_hour)):
+            occurred = start + timedelta(seconds=rng.random() * span)
+            kind = "REJECT" if rng.random() < 0.03 else "GOOD"
+            events.add((machine_id, rng.choice(work_order_ids), kind, None, occurred))
+        for _ in range(int(span / 86400 * args.alarms_per_day)):
+            occurred = start + timedelta(seconds=rng.random() * span)
+            cleared = occurred + timedelta(seconds=rng.randint(30, 3600))
+            alarms.add((machine_id, rng.choice(ALARM_CODES), "Synthetic alarm", occurred, cleared if cleared < now else None))
+    counts = {copier.sql.split()[1]: copier.flush() for copier in (stops, segments, events, alarms)}
+    if stopped:
+        cur.execute("UPDATE machines SET status = 'STOPPED' WHERE id = ANY(%s)", (stopped,))
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=5)
+    parser.add_argument("--machines", type=int, default=10, help="machines per line")
+    parser.add_argument("--months", type=int, default=3, help="months of history")
+    parser.add_argument("--stops-per-day", type=float, default=12, help="per machine")
+    parser.add_argument("--events-per-hour", type=float, default=12, help="counter events per machine")
+    parser.add_argument("--alarms-per-day", type=float, default=4, help="per machine")
+    parser.add_argument("--users", type=int, default=50, help="bench_user_N accounts for login bursts")
+    parser.add_argument("--password", default="bench", help="password of every seeded user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="empty the plant tables first")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.now().replace(microsecond=0)
+    start = now - timedelta(days=30 * args.months)
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        applied = migrate.apply_pending(conn)
+        if applied:
+            print(f"migrations:  {', '.join(applied)}")
+        cur = conn.cursor()
+        if args.reset:
+            cur.execute(f"TRUNCATE {', '.join(PLANT_TABLES)} RESTART IDENTITY CASCADE")
+        else:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM machines)")
+            if cur.fetchone()[0]:
+                sys.exit("The database already has machines; rerun with --reset to replace the plant.")
+        for table, column in partitions.PARTITIONED_TABLES.items():
+            if partitions.is_partitioned(cur, table):
+                partitions.ensure_partitions(cur, table, column, now.date(), since=start.date())
+        machines, work_order_ids = seed_reference(cur, rng, args, now)
+        counts = seed_history(cur, rng, args, machines, work_order_ids, start, now)
+        conn.commit()
+        rebuilt = rollups.rebuild(conn)
+        conn.autocommit = True
+        for table in ("machines", "stops", "events", "alarms", "machine_status_segments", "stop_rollups_hourly", "stop_rollups_daily"):
+            cur.execute(f"ANALYZE {table}")
+        cur.close()
+    finally:
+        conn.close()
+    shift_oee.refresh_all(now)
+
+    print(f"plant:       {args.lines} lines x {args.machines} machines, {args.months} months, seed {args.seed}")
+    for table, count in counts.items():
+        print(f"{table + ':':<24} {count:,}")
+    print(f"rollups:     {rebuilt:,} closed stops folded")
+    print(f"users:       bench_admin and bench_user_1..{args.users}, password {args.password!r}")
+    print(f"elapsed:     {time.perf_counter() - started:.1f} s")
+
+if __name__ == "__main__":
+    main()
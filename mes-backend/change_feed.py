@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import psycopg
+from db import connect_kwargs, worker_origin
+
+# Channel the triggers of migrations/0005_change_feed.sql notify on
+CHANGE_CHANNEL = "mes_changes"
+# Seconds between attempts to reopen the listening connection
+CHANGE_FEED_RETRY = float(os.getenv("CHANGE_FEED_RETRY", "5"))
+# Seconds between pings of the listening connection, so a dead connection is
+# noticed and replaced instead of silently missing changes
+CHANGE_FEED_PING = float(os.getenv("CHANGE_FEED_PING", "60"))
+
+class Change:
+    # One committed statement on a watched table. ids is None when the
+    # statement touched too many rows to list (or for a resync); local is
+    # True when this worker made the write itself.
+    __slots__ = ("table", "op", "ids", "local")
+
+    def __init__(self, table, op, ids, local):
+        self.table = table
+        self.op = op
+        self.ids = ids
+        self.local = local
+
+class ChangeFeed:
+    # One LISTEN connection per worker, driven from the event loop, that
+    # hands each notification to the callbacks subscribed to its table.
+    # Callbacks run on the event loop and must not block; the usual one
+    # drops a cache entry or wakes a task. Writes the worker made itself are
+    # delivered too, flagged local, since the code that made them has
+    # usually updated its own state already.
+    #
+    # Notifications sent while the connection was down are lost, so every
+    # (re)connect is followed by a resync: each subscriber gets a remote
+    # change for its table with ids None and starts over from the database.
+
+    def __init__(self, channel=CHANGE_CHANNEL):
+        self.channel = channel
+        self.subscribers = {}
+        self.connected = False
+        self.last_error = None
+        self.counters = {"received": 0, "local": 0, "connects": 0, "resyncs": 0, "callback_errors": 0, "bad_payloads": 0}
+
+    def subscribe(self, tables, callback):
+        for table in tables:
+            self.subscribers.setdefault(table, []).append(callback)
+
+    def dispatch(self, change):
+        for callback in self.subscribers.get(change.table, ()):
+            try:
+                callback(change)
+            except Exception as exc:
+                self.counters["callback_errors"] += 1
+                print(f"[change-feed] {change.table} subscriber failed: {exc}")
+
+    def resync(self):
+        self.counters["resyncs"] += 1
+        for table in list(self.subscribers):
+            self.dispatch(Change(table, "resync", None, False))
+
+    def _receive(self, notify, origin):
+        try:
+            data = json.loads(notify.payload)
+            change = Change(data["table"], data["op"], data.get("ids"), data.get("origin") == origin)
+        except (ValueError, KeyError, TypeError):
+            self.counters["bad_payloads"] += 1
+            return
+        self.counters["received"] += 1
+        if change.local:
+            self.counters["local"] += 1
+        self.dispatch(change)
+
+    async def _connect(self):
+        raw = await psycopg.AsyncConnection.connect(autocommit=True, **connect_kwargs())
+        try:
+            await raw.execute(f"LISTEN {self.channel}")
+        except BaseException:
+            await raw.close()
+            raise
+        return raw
+
+    async def _listen(self, raw):
+        origin = worker_origin()
+        while True:
+            # notifies() returns every ping interval, so a dead connection is
+            # noticed; notifications arriving during the ping are kept for
+            # the next round
+            async for notify in raw.notifies(timeout=CHANGE_FEED_PING):
+                self._receive(notify, origin)
+            await asyncio.wait_for(raw.execute("SELECT 1"), CHANGE_FEED_PING)
+
+    async def run(self):
+        while True:
+            raw = None
+            try:
+                raw = await self._connect()
+                self.connected = True
+                self.counters["connects"] += 1
+                self.resync()
+                await self._listen(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.last_error = str(exc)
+                print(f"[change-feed] listener down, retrying in {CHANGE_FEED_RETRY:g} s: {exc}")
+            finally:
+                self.connected = False
+                if raw is not None and not raw.closed:
+                    await raw.close()
+            await asyncio.sleep(CHANGE_FEED_RETRY)
+
+    def stats(self):
+        return {
+            **self.counters,
+            "connected": self.connected,
+            "channel": self.channel,
+            "tables": sorted(self.subscribers),
+            "last_error": self.last_error,
+        }
+
+change_feed = ChangeFeed()
@@ -1,16 +1,201 @@
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
 import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from fastapi import HTTPException
 from dotenv import load_dotenv
+from metrics import record_query
 
 load_dotenv()
 
-def get_connection(cursor_factory=None):
-    return psycopg2.connect(
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+# Seconds to wait for a free connection before giving up with a 503
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+
+def worker_origin():
+    # Names this process in change feed payloads; read at connect time, so
+    # each forked worker gets its own
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def connect_kwargs():
+    return dict(
         host=os.getenv("DB_HOST"),
         port=os.getenv("DB_PORT"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         dbname=os.getenv("DB_NAME"),
-        cursor_factory=cursor_factory
-    ) 
\ No newline at end of file
+        options=f"-c mes.origin={worker_origin()}",
+    )
+
+def get_connection(cursor_factory=None):
+    # Unpooled connection, for scripts and one-off maintenance jobs
+    return psycopg2.connect(cursor_factory=cursor_factory, **connect_kwargs())
+
+class _TimedCursor:
+    # Mixed into whatever cursor class the caller asked for; reports each
+    # statement to the current request's metrics
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - started, self.rowcount if self.description else 0)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - started, 0)
+
+_timed_cursors = {}
+
+def _timed_cursor(base):
+    cls = _timed_cursors.get(base)
+    if cls is None:
+        cls = _timed_cursors[base] = type("Timed" + base.__name__, (_TimedCursor, base), {})
+    return cls
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    # Pooled connections hand out timed cursors, including for explicit
+    # cursor_factory=RealDictCursor calls
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _timed_cursor(base)
+        return super().cursor(*args, **kwargs)
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+_last_used = {}
+_stats_lock = threading.Lock()
+_stats = {
+    "in_use": 0,
+    "waiting": 0,
+    "checkouts": 0,
+    "timeouts": 0,
+    "discarded": 0,
+    "checkout_seconds_total": 0.0,
+    "checkout_seconds_max": 0.0,
+}
+
+def get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _slots = threading.BoundedSemaphore(DB_POOL_MAX)
+                _pool = psycopg2.pool.ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, connection_factory=InstrumentedConnection, **connect_kwargs()
+                )
+    return _pool
+
+def close_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _slots = None
+        _last_used.clear()
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def checkout(timeout=DB_POOL_TIMEOUT):
+    pool = get_pool()
+    started = time.monotonic()
+    with _stats_lock:
+        _stats["waiting"] += 1
+    acquired = _slots.acquire(timeout=timeout)
+    with _stats_lock:
+        _stats["waiting"] -= 1
+        if not acquired:
+            _stats["timeouts"] += 1
+    if not acquired:
+        raise HTTPException(status_code=503, detail="Database connection pool exhausted")
+    try:
+        conn = pool.getconn()
+        while not _is_healthy(conn):
+            with _stats_lock:
+                _stats["discarded"] += 1
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        _slots.release()
+        raise
+    elapsed = time.monotonic() - started
+    with _stats_lock:
+        _stats["in_use"] += 1
+        _stats["checkouts"] += 1
+        _stats["checkout_seconds_total"] += elapsed
+        _stats["checkout_seconds_max"] = max(_stats["checkout_seconds_max"], elapsed)
+    return conn
+
+def release(conn, discard=False):
+    pool = _pool
+    try:
+        if pool is None:
+            conn.close()
+            return
+        discard = discard or conn.closed
+        if discard:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        # putconn rolls back anything left open and closes broken connections
+        pool.putconn(conn, close=discard)
+    finally:
+        with _stats_lock:
+            _stats["in_use"] -= 1
+        if _slots is not None:
+            _slots.release()
+
+@contextmanager
+def connection():
+    conn = checkout()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        release(conn, discard=broken)
+
+def get_db():
+    # FastAPI dependency: one pooled connection per request, shared by every
+    # dependency that asks for it. get_current_user does not: it reads the
+    # principal cache and only checks out a connection of its own, briefly,
+    # on a miss, so async handlers and cached principals take no sync slot.
+    with connection() as conn:
+        yield conn
+
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    checkouts = stats["checkouts"]
+    stats["checkout_seconds_avg"] = stats["checkout_seconds_total"] / checkouts if checkouts else 0.0
+    stats["min_size"] = DB_POOL_MIN
+    stats["max_size"] = DB_POOL_MAX
+    stats["open"] = len(_pool._pool) + len(_pool._used) if _pool is not None else 0
+    return stats
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from db import connect_kwargs, DB_POOL_MIN, DB_POOL_TIMEOUT, DB_POOL_PING_AFTER
+from metrics import record_query
+
+# Connections for the async routes; they never occupy a threadpool worker
+ASYNC_DB_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", "20"))
+
+class AsyncConnection:
+    # psycopg 3 async connection in autocommit; use transaction() to group
+    # statements. psycopg serializes statements on one connection, so
+    # concurrent calls on it queue rather than interleave.
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    async def _run(self, query, params, fetch):
+        async with self.raw.cursor(row_factory=dict_row) as cur:
+            started = time.perf_counter()
+            try:
+                await cur.execute(query, params)
+                if fetch == "all":
+                    return await cur.fetchall()
+                if fetch == "one":
+                    return await cur.fetchone()
+                return cur.rowcount
+            finally:
+                record_query(query, time.perf_counter() - started, cur.rowcount if cur.description else 0)
+
+    async def fetch(self, query, params=None):
+        return await self._run(query, params, "all")
+
+    async def fetchrow(self, query, params=None):
+        return await self._run(query, params, "one")
+
+    async def fetchval(self, query, params=None):
+        row = await self._run(query, params, "one")
+        return next(iter(row.values())) if row else None
+
+    async def execute(self, query, params=None):
+        return await self._run(query, params, None)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.raw.transaction():
+            yield self
+
+class AsyncPool:
+    # psycopg_pool's AsyncConnectionPool with the contract of the sync pool in
+    # db.py: at most max_size connections, a 503 after timeout seconds of
+    # waiting, and a ping for connections that sat idle longer than
+    # ping_after. Opened on first use, from the event loop.
+
+    def __init__(self, max_size=ASYNC_DB_POOL_MAX, timeout=DB_POOL_TIMEOUT, ping_after=DB_POOL_PING_AFTER, min_size=DB_POOL_MIN):
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.pool = None
+        self.opening = None
+        self.last_used = {}
+
+    async def _check(self, raw):
+        # Raising makes the pool discard the connection and hand out another
+        if time.monotonic() - self.last_used.get(id(raw), 0) >= self.ping_after:
+            await raw.execute("SELECT 1")
+
+    async def _open(self):
+        pool = AsyncConnectionPool(
+            kwargs={**connect_kwargs(), "autocommit": True},
+            min_size=self.min_size,
+            max_size=self.max_size,
+            timeout=self.timeout,
+            check=self._check,
+            name="mes-async",
+            open=False,
+        )
+        await pool.open()
+        self.pool = pool
+        return pool
+
+    async def _get_pool(self):
+        if self.pool is not None:
+            return self.pool
+        if self.opening is None:
+            self.opening = asyncio.ensure_future(self._open())
+        try:
+            return await asyncio.shield(self.opening)
+        except Exception:
+            self.opening = None
+            raise
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = await self._get_pool()
+        try:
+            raw = await pool.getconn()
+        except PoolTimeout:
+            raise HTTPException(status_code=503, detail="Database connection pool exhausted")
+        try:
+            yield AsyncConnection(raw)
+        finally:
+            # The pool rolls back or discards a connection returned mid-statement
+            self.last_used[id(raw)] = time.monotonic()
+            await pool.putconn(raw)
+
+    async def close(self):
+        pool, self.pool, self.opening = self.pool, None, None
+        self.last_used.clear()
+        if pool is not None:
+            await pool.close()
+
+    def stats(self):
+        stats = self.pool.get_stats() if self.pool is not None else {}
+        size = stats.get("pool_size", 0)
+        idle = stats.get("pool_available", 0)
+        return {
+            "in_use": size - idle,
+            "waiting": stats.get("requests_waiting", 0),
+            "checkouts": stats.get("requests_num", 0),
+            "timeouts": stats.get("requests_errors", 0),
+            "discarded": stats.get("connections_lost", 0) + stats.get("returns_bad", 0),
+            "opened": stats.get("connections_num", 0),
+            "idle": idle,
+            "max_size": self.max_size,
+        }
+
+async_pool = AsyncPool()
+
+async def get_adb():
+    # FastAPI dependency for async routes: one AsyncConnection per request
+    async with async_pool.connection() as conn:
+        yield conn
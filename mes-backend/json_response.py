@@ -0,0 +1,48 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from time import perf_counter
+from fastapi.responses import Response
+from metrics import record_serialization
+
+# Route handlers return FastJSONResponse(payload) instead of a plain dict, so
+# FastAPI skips jsonable_encoder (a recursive walk over every row and field)
+# and the payload goes straight to one serializer call. orjson is used when
+# installed; otherwise the stdlib encoder with the same fallback hook.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    # Only called for types the serializer does not handle natively; output
+    # matches what jsonable_encoder produced before
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode("utf-8", "replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+_stdlib_encoder = json.JSONEncoder(default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+if orjson is not None:
+    def dumps(payload):
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(payload):
+        return _stdlib_encoder.encode(payload).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        started = perf_counter()
+        body = dumps(content)
+        record_serialization(perf_counter() - started)
+        return body
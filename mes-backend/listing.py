@@ -0,0 +1,81 @@
+from fastapi import HTTPException
+from psycopg import sql
+import os
+import psycopg2.extras
+
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "500"))
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "5000"))
+
+def parse_fields(fields, allowed):
+    # "a,b,c" -> validated column list; id is always included for the cursor
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return requested
+
+def time_range(column, since=None, until=None):
+    where = []
+    if since is not None:
+        where.append((sql.SQL("{} >= %s").format(sql.Identifier(column)), since))
+    if until is not None:
+        where.append((sql.SQL("{} < %s").format(sql.Identifier(column)), until))
+    return where
+
+def machine_scope(machine_id=None, line_id=None):
+    # For tables keyed by machine_id; line_id filters through machines.line_id
+    where = []
+    if machine_id is not None:
+        where.append((sql.SQL("machine_id = %s"), machine_id))
+    if line_id is not None:
+        where.append((sql.SQL("machine_id IN (SELECT id FROM machines WHERE line_id = %s)"), line_id))
+    return where
+
+def page_query(table, allowed, fields=None, after_id=None, limit=LIST_DEFAULT_LIMIT, where=(), default_columns=None, before_id=None, descending=False):
+    # Keyset pagination on id: memory per request is bounded by limit no
+    # matter how large the table grows. One extra row tells us a next page
+    # exists. Descending pages walk from the newest row back with before_id.
+    columns = parse_fields(fields, allowed) or default_columns
+    if columns:
+        select = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    else:
+        select = sql.SQL("*")
+    clauses = [clause for clause, _ in where]
+    params = [value for _, value in where]
+    if after_id is not None:
+        clauses.append(sql.SQL("id > %s"))
+        params.append(after_id)
+    if before_id is not None:
+        clauses.append(sql.SQL("id < %s"))
+        params.append(before_id)
+    query = sql.SQL("SELECT {} FROM {}").format(select, sql.Identifier(table))
+    if clauses:
+        query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(clauses)
+    query += sql.SQL(" ORDER BY id DESC LIMIT %s" if descending else " ORDER BY id LIMIT %s")
+    params.append(limit + 1)
+    return query, params
+
+def _trim(rows, limit):
+    # The cursor for the next page is the last id returned, in either direction
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]["id"]
+    return rows, None
+
+def fetch_page(conn, table, allowed, fields=None, after_id=None, limit=LIST_DEFAULT_LIMIT, where=(), default_columns=None, before_id=None, descending=False):
+    # Returns (rows, next cursor). The query is built with psycopg's sql
+    # module for the async routes; psycopg2 takes it as a string.
+    query, params = page_query(table, allowed, fields, after_id, limit, where, default_columns, before_id, descending)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(query.as_string(), params)
+    rows = cur.fetchall()
+    cur.close()
+    return _trim(rows, limit)
+
+async def fetch_page_async(aconn, table, allowed, fields=None, after_id=None, limit=LIST_DEFAULT_LIMIT, where=(), default_columns=None, before_id=None, descending=False):
+    query, params = page_query(table, allowed, fields, after_id, limit, where, default_columns, before_id, descending)
+    return _trim(await aconn.fetch(query, params), limit)
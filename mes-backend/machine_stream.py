@@ -0,0 +1,141 @@
+import asyncio
+import os
+from starlette.concurrency import run_in_threadpool
+from db import connection
+from json_response import dumps
+from change_feed import change_feed
+import metrics
+
+STREAM_INTERVAL = float(os.getenv("STREAM_INTERVAL", "5"))
+# Least seconds between two refreshes when the change feed asks for one early,
+# so a burst of writes costs one reload
+STREAM_MIN_INTERVAL = float(os.getenv("STREAM_MIN_INTERVAL", "0.5"))
+# Messages buffered per client before it is considered slow and resynced
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "16"))
+
+# Fields pushed to clients; anything else on the machine row is not streamed
+TRACKED_FIELDS = ("name", "line_id", "status", "type", "counter_type", "oee", "availability", "performance", "quality")
+
+def _encode(message):
+    return dumps(message).decode("utf-8")
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.needs_snapshot = True
+        self.resyncs = 0
+
+    def offer(self, payload, snapshot_payload):
+        if self.needs_snapshot:
+            payload = snapshot_payload
+            self.needs_snapshot = False
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and replace it with one fresh snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(snapshot_payload)
+            self.resyncs += 1
+
+class MachineBroker:
+    # One producer polls the database and fans deltas out to every subscriber,
+    # so DB load does not depend on how many screens are connected. A write
+    # to a machine or stop on any worker wakes it through the change feed;
+    # the interval is the fallback for KPIs that drift without a write.
+
+    def __init__(self, loader, interval=STREAM_INTERVAL, queue_size=STREAM_QUEUE_SIZE, min_interval=STREAM_MIN_INTERVAL):
+        self.loader = loader
+        self.interval = interval
+        self.min_interval = min_interval
+        self.queue_size = queue_size
+        self.changed = asyncio.Event()
+        self.wakeups = 0
+        self.subscribers = set()
+        self.snapshot = {}
+        self.ready = False
+        self.task = None
+
+    async def subscribe(self):
+        sub = Subscriber(self.queue_size)
+        self.subscribers.add(sub)
+        if self.ready:
+            sub.offer(None, self._snapshot_payload())
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+
+    def wake(self, change=None):
+        if self.task is not None and not self.task.done():
+            self.changed.set()
+            self.wakeups += 1
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "machines": len(self.snapshot),
+            "resyncs": sum(sub.resyncs for sub in self.subscribers),
+            "wakeups": self.wakeups,
+            "running": self.task is not None and not self.task.done(),
+        }
+
+    def _snapshot_payload(self):
+        return ("snapshot", _encode({"type": "snapshot", "machines": list(self.snapshot.values())}))
+
+    def _apply(self, machines):
+        current = {m["id"]: {"id": m["id"], **{f: m.get(f) for f in TRACKED_FIELDS}} for m in machines}
+        changed = []
+        for machine_id, machine in current.items():
+            previous = self.snapshot.get(machine_id)
+            if previous is None:
+                changed.append(machine)
+                continue
+            diff = {f: machine[f] for f in TRACKED_FIELDS if machine[f] != previous[f]}
+            if diff:
+                changed.append({"id": machine_id, **diff})
+        removed = [machine_id for machine_id in self.snapshot if machine_id not in current]
+        self.snapshot = current
+        return changed, removed
+
+    async def _run(self):
+        # Started from a subscriber's request; the polling is not part of it
+        metrics.detach()
+        try:
+            while self.subscribers:
+                # Cleared before loading: a write landing during the load
+                # triggers another one
+                self.changed.clear()
+                try:
+                    machines = await run_in_threadpool(self.loader)
+                except Exception as exc:
+                    print(f"[stream] machine refresh failed: {exc}")
+                else:
+                    changed, removed = self._apply(machines)
+                    self.ready = True
+                    snapshot_payload = self._snapshot_payload()
+                    delta_payload = None
+                    if changed or removed:
+                        delta_payload = ("delta", _encode({"type": "delta", "machines": changed, "removed": removed}))
+                    for sub in list(self.subscribers):
+                        if delta_payload is not None or sub.needs_snapshot:
+                            sub.offer(delta_payload, snapshot_payload)
+                await asyncio.sleep(self.min_interval)
+                try:
+                    await asyncio.wait_for(self.changed.wait(), max(0.0, self.interval - self.min_interval))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Nobody listening: the next subscriber restarts from a fresh snapshot
+            self.ready = False
+            self.snapshot = {}
+
+def _load_machines():
+    from routers.machines import fetch_machines
+    with connection() as conn:
+        return fetch_machines(conn)
+
+machine_broker = MachineBroker(_load_machines)
+change_feed.subscribe(("machines", "stops"), machine_broker.wake)
@@ -1,7 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
 from routers import work_orders, users, production_lines, machines, shifts, stops, alarms, events, auth, products
 from fastapi.middleware.cors import CORSMiddleware
-from routers import settings
+from routers import settings, stream, ingest, exports, analytics, dashboard
+from db import close_pool, pool_stats, get_db, connection
+from db_async import async_pool
+from auth import principal_cache
+from password_pool import password_pool
+from response_cache import RESOURCE_CACHES
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import shift_oee
+import partitions
+import migrate
+from metrics import InstrumentationMiddleware, registry
+from status_buffer import status_buffer, run_flusher
+from change_feed import change_feed
+from alarm_index import alarm_index, run_flusher as run_alarm_flusher
 
 app = FastAPI()
 
@@ -12,6 +27,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the timings include CORS handling
+app.add_middleware(InstrumentationMiddleware)
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(work_orders.router, prefix="/api/workorders", tags=["Work Orders"])
@@ -24,7 +41,115 @@ app.include_router(alarms.router, prefix="/api/alarms", tags=["Alarms"])
 app.include_router(events.router, prefix="/api/events", tags=["Events"])
 app.include_router(settings.router)
 app.include_router(products.router, prefix="/api/products", tags=["Products"])
+app.include_router(stream.router, prefix="/api/stream", tags=["Stream"])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["Ingest"])
+app.include_router(exports.router, prefix="/api/export", tags=["Export"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Dashboard"])
 
 @app.get("/")
 def read_root():
-    return {"message": "MES Backend API"} 
\ No newline at end of file
+    return {"message": "MES Backend API"}
+
+@app.get("/api/health/db")
+def db_pool_health():
+    return {"pool": pool_stats(), "async_pool": async_pool.stats(), "exports": exports.export_slots.stats()}
+
+@app.get("/api/health/auth")
+def auth_cache_health():
+    return {"principal_cache": principal_cache.stats(), "password_pool": password_pool.stats()}
+
+@app.get("/api/health/cache")
+def response_cache_health():
+    return {cache.name: cache.stats() for cache in RESOURCE_CACHES}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    pool = pool_stats()
+    apool = async_pool.stats()
+    gauges = [
+        ("mes_db_pool_in_use", "Sync pool connections checked out", pool["in_use"]),
+        ("mes_db_pool_waiting", "Threads waiting for a sync pool connection", pool["waiting"]),
+        ("mes_db_pool_timeouts", "Sync pool checkouts that gave up", pool["timeouts"]),
+        ("mes_async_pool_in_use", "Async pool connections checked out", apool["in_use"]),
+        ("mes_async_pool_waiting", "Requests waiting for an async pool connection", apool["waiting"]),
+        ("mes_async_pool_timeouts", "Async pool checkouts that gave up", apool["timeouts"]),
+        ("mes_change_feed_connected", "Whether this worker is listening for changes", int(change_feed.connected)),
+        ("mes_change_feed_received", "Change notifications received by this worker", change_feed.counters["received"]),
+    ]
+    return PlainTextResponse(registry.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/health/schema")
+def schema_health():
+    return app.state.schema_report
+
+@app.get("/api/health/status-buffer")
+def status_buffer_health():
+    return status_buffer.stats()
+
+@app.get("/api/health/alarms")
+def alarm_index_health():
+    return alarm_index.stats()
+
+@app.get("/api/health/change-feed")
+def change_feed_health():
+    return change_feed.stats()
+
+@app.get("/api/health/partitions")
+def partitions_health(conn=Depends(get_db)):
+    return partitions.status(conn)
+
+def check_schema():
+    # Pending migrations or missing hot-query indexes are logged, not fatal,
+    # unless MIGRATE_ON_STARTUP=1 asked for them to be applied and that failed
+    try:
+        with connection() as conn:
+            report = migrate.startup_report(conn)
+    except Exception as exc:
+        if migrate.MIGRATE_ON_STARTUP:
+            raise
+        print(f"[schema] check failed: {exc}")
+        return {"error": str(exc)}
+    if report["applied_now"]:
+        print(f"[schema] applied {', '.join(report['applied_now'])}")
+    if report["pending"]:
+        print(f"[schema] pending migrations: {', '.join(report['pending'])}; run python migrate.py")
+    if report["modified"]:
+        print(f"[schema] applied migrations changed on disk: {', '.join(report['modified'])}")
+    for name in report["missing_indexes"]:
+        print(f"[schema] missing index: {name}")
+    return report
+
+@app.on_event("startup")
+async def start_background_jobs():
+    app.state.schema_report = await run_in_threadpool(check_schema)
+    app.state.shift_oee_task = asyncio.create_task(shift_oee.run_refresher())
+    app.state.partitions_task = asyncio.create_task(partitions.run_maintainer())
+    try:
+        recovered = await run_in_threadpool(status_buffer.recover)
+        if recovered:
+            print(f"[status-buffer] replayed {recovered} status reports from unflushed logs")
+    except Exception as exc:
+        print(f"[status-buffer] recovery failed, logs kept for the next start: {exc}")
+    app.state.status_flush_task = asyncio.create_task(run_flusher(status_buffer))
+    app.state.change_feed_task = asyncio.create_task(change_feed.run())
+    app.state.alarm_flush_task = asyncio.create_task(run_alarm_flusher(alarm_index))
+
+@app.on_event("shutdown")
+async def shutdown_background_jobs():
+    app.state.shift_oee_task.cancel()
+    app.state.partitions_task.cancel()
+    app.state.status_flush_task.cancel()
+    app.state.change_feed_task.cancel()
+    app.state.alarm_flush_task.cancel()
+    try:
+        await run_in_threadpool(status_buffer.close)
+    except Exception as exc:
+        print(f"[status-buffer] final flush failed, log kept for recovery: {exc}")
+    try:
+        await run_in_threadpool(alarm_index.flush)
+    except Exception as exc:
+        print(f"[alarms] final occurrence flush failed: {exc}")
+    close_pool()
+    await async_pool.close()
+    password_pool.shutdown()
@@ -0,0 +1,205 @@
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+# Requests slower than this many seconds are logged with the SQL they ran;
+# 0 turns the log off
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1"))
+# Statements remembered per request for the slow log
+SLOW_LOG_MAX_STATEMENTS = int(os.getenv("SLOW_LOG_MAX_STATEMENTS", "200"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class RequestStats:
+    # What one request did, filled in by the instrumented cursors and the
+    # JSON response while it runs
+    __slots__ = ("queries", "db_seconds", "rows", "serialize_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+        self.statements = []
+
+    def add_query(self, sql, seconds, rows):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.rows += rows
+        if len(self.statements) < SLOW_LOG_MAX_STATEMENTS:
+            self.statements.append((sql, seconds, rows))
+
+_current = ContextVar("request_stats", default=None)
+
+def record_query(sql, seconds, rows):
+    stats = _current.get()
+    if stats is not None:
+        stats.add_query(sql, seconds, rows)
+
+def record_serialization(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.serialize_seconds += seconds
+
+def detach():
+    # For background tasks started from inside a request: their queries are
+    # not that request's
+    _current.set(None)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+class RouteMetrics:
+    __slots__ = ("latency", "queries", "db_seconds", "serialize_seconds", "rows", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = Histogram(LATENCY_BUCKETS)
+        self.serialize_seconds = Histogram(LATENCY_BUCKETS)
+        self.rows = 0
+        self.statuses = Counter()
+
+# (name, type, help, RouteMetrics attribute) for the per-route series
+ROUTE_SERIES = (
+    ("mes_http_request_duration_seconds", "histogram", "Request latency", "latency"),
+    ("mes_db_queries_per_request", "histogram", "SQL statements executed per request", "queries"),
+    ("mes_db_seconds_per_request", "histogram", "Time spent in SQL per request", "db_seconds"),
+    ("mes_serialize_seconds_per_request", "histogram", "Time spent encoding JSON per request", "serialize_seconds"),
+)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _sql_text(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    elif not isinstance(sql, str):
+        sql = repr(sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+class Registry:
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def observe(self, method, route, status, seconds, stats):
+        with self.lock:
+            metrics = self.routes.get((method, route))
+            if metrics is None:
+                metrics = self.routes[(method, route)] = RouteMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(stats.queries)
+            metrics.db_seconds.observe(stats.db_seconds)
+            metrics.serialize_seconds.observe(stats.serialize_seconds)
+            metrics.rows += stats.rows
+            metrics.statuses[status] += 1
+
+    def render(self, gauges=()):
+        # Prometheus text exposition format. gauges: (name, help, value)
+        out = []
+        with self.lock:
+            routes = sorted(self.routes.items())
+            for name, kind, help_text, attr in ROUTE_SERIES:
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} {kind}")
+                for (method, route), metrics in routes:
+                    out.extend(getattr(metrics, attr).lines(name, f'method="{method}",route="{_label(route)}"'))
+            out.append("# HELP mes_db_rows_total Rows returned by SQL statements")
+            out.append("# TYPE mes_db_rows_total counter")
+            for (method, route), metrics in routes:
+                out.append(f'mes_db_rows_total{{method="{method}",route="{_label(route)}"}} {metrics.rows}')
+            out.append("# HELP mes_http_requests_total Requests by status code")
+            out.append("# TYPE mes_http_requests_total counter")
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    out.append(f'mes_http_requests_total{{method="{method}",route="{_label(route)}",status="{status}"}} {count}')
+        for name, help_text, value in gauges:
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} gauge")
+            out.append(f"{name} {value}")
+        return "\n".join(out) + "\n"
+
+registry = Registry()
+
+def log_slow_request(method, path, status, seconds, stats):
+    # Statements are grouped by text, most repeated first, so an N+1 loop
+    # shows up as one line with a large count
+    print(
+        f"[slow] {method} {path} {status} {seconds * 1000:.1f} ms: {stats.queries} queries, "
+        f"{stats.db_seconds * 1000:.1f} ms db, {stats.rows} rows, {stats.serialize_seconds * 1000:.1f} ms serialize"
+    )
+    grouped = {}
+    for sql, query_seconds, rows in stats.statements:
+        text = _sql_text(sql)
+        count, total, total_rows = grouped.get(text, (0, 0.0, 0))
+        grouped[text] = (count + 1, total + query_seconds, total_rows + rows)
+    for text, (count, total, rows) in sorted(grouped.items(), key=lambda item: (-item[1][0], -item[1][1])):
+        print(f"[slow]   x{count:<4} {total * 1000:8.1f} ms {rows:6d} rows  {text[:300]}")
+    if stats.queries > len(stats.statements):
+        print(f"[slow]   ... {stats.queries - len(stats.statements)} more statements not kept")
+
+class InstrumentationMiddleware:
+    # Pure ASGI, so streamed responses pass through untouched. Times every
+    # HTTP request and files it under its route template; event streams are
+    # left out since their duration is the client's connection time.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if not streaming:
+                seconds = time.perf_counter() - started
+                route = scope.get("route")
+                # Unmatched paths share one series to keep label cardinality bounded
+                template = getattr(route, "path", None) or "unmatched"
+                registry.observe(scope["method"], template, status, seconds, stats)
+                if 0 < SLOW_REQUEST_SECONDS <= seconds:
+                    log_slow_request(scope["method"], scope["path"], status, seconds, stats)
@@ -0,0 +1,273 @@
+"""Versioned schema migrations for the MES database.
+
+Migrations are the numbered files in migrations/ (NNNN_name.sql), applied
+in order, each in its own transaction, and recorded in schema_migrations.
+
+    python migrate.py            apply pending migrations
+    python migrate.py --status   applied, pending and locally modified migrations
+    python migrate.py --check    indexes the hot queries need that are missing
+    python migrate.py --explain  EXPLAIN every hot query; exit 1 if one cannot use its index
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+# pg_advisory_lock key, so several workers starting at once migrate only once
+MIGRATION_LOCK = 48151623
+# Apply pending migrations when the API starts instead of only reporting them
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0") == "1"
+
+# (table, leading key columns, partial) for every index a hot query relies
+# on. Matched by shape rather than name, so equivalent indexes count.
+EXPECTED_INDEXES = [
+    ("stops", ("machine_id", "start_time"), False),
+    ("stops", ("start_time",), False),
+    ("stops", ("machine_id", "start_time"), True),
+    ("machines", ("line_id",), False),
+    ("alarms", ("machine_id", "occurred_at"), False),
+    ("alarms", ("machine_id",), True),
+    ("events", ("machine_id", "occurred_at"), False),
+    ("events", ("occurred_at",), False),
+    ("production_history", ("line_id", "id"), False),
+    ("batches", ("line_id", "id"), False),
+    ("shifts", ("line_id",), False),
+    ("work_orders", ("assigned_line_id",), False),
+    ("users", ("username",), False),
+    ("machine_status_segments", ("machine_id", "start_time"), False),
+    ("shift_oee", ("machine_id", "shift_start"), True),
+]
+
+INDEX_SHAPES_SQL = """
+    SELECT t.relname AS table_name,
+           array_agg(a.attname ORDER BY k.ord) AS columns,
+           i.indpred IS NOT NULL AS partial
+    FROM pg_index i
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace AND n.nspname = current_schema()
+    CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    GROUP BY i.indexrelid, t.relname, i.indpred
+"""
+
+def discover():
+    # [(version, name, sql, checksum)] in version order
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = re.match(r"^(\d{4})_(\w+)\.sql$", path.name)
+        if not match:
+            continue
+        sql = path.read_text(encoding="utf-8")
+        checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), sql, checksum))
+    return migrations
+
+def _ensure_table(cur):
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name TEXT NOT NULL,"
+        " checksum TEXT NOT NULL,"
+        " applied_at TIMESTAMP NOT NULL DEFAULT NOW())"
+    )
+
+def _applied(cur):
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return {}
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cur.fetchall())
+
+def status(conn):
+    cur = conn.cursor()
+    done = _applied(cur)
+    cur.close()
+    conn.rollback()
+    migrations = discover()
+    return {
+        "applied": [f"{v:04d}_{n}" for v, n, _, _ in migrations if v in done],
+        "pending": [f"{v:04d}_{n}" for v, n, _, _ in migrations if v not in done],
+        "modified": [f"{v:04d}_{n}" for v, n, _, c in migrations if v in done and done[v] != c],
+    }
+
+def apply_pending(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK,))
+    applied = []
+    try:
+        _ensure_table(cur)
+        conn.commit()
+        done = _applied(cur)
+        for version, name, sql, checksum in discover():
+            if version in done:
+                continue
+            cur.execute(sql)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (version, name, checksum),
+            )
+            conn.commit()
+            applied.append(f"{version:04d}_{name}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK,))
+        conn.commit()
+        cur.close()
+    return applied
+
+def missing_indexes(conn):
+    cur = conn.cursor()
+    cur.execute(INDEX_SHAPES_SQL)
+    existing = cur.fetchall()
+    cur.close()
+    conn.rollback()
+    missing = []
+    for table, columns, partial in EXPECTED_INDEXES:
+        found = any(
+            name == table and tuple(cols[:len(columns)]) == columns and is_partial == partial
+            for name, cols, is_partial in existing
+        )
+        if not found:
+            missing.append(f"{table} ({', '.join(columns)}){' partial' if partial else ''}")
+    return missing
+
+def hot_queries():
+    # (label, sql, params, table, index name or None for any index on table),
+    # built from the SQL the application itself runs where it is shared
+    from oee import downtime_query
+    from alarm_index import OPEN_ALARMS_SQL
+    from shift_oee import CURRENT_SQL
+    from timeline_store import SEGMENTS_SQL
+    now = datetime.now()
+    downtime_sql, downtime_params = downtime_query(now - timedelta(hours=8), [1])
+    return [
+        ("downtime window", downtime_sql, downtime_params, "stops", None),
+        ("open stop per machine",
+         "SELECT id FROM stops WHERE machine_id = %s AND end_time IS NULL ORDER BY start_time DESC LIMIT 1",
+         (1,), "stops", "stops_open_idx"),
+        ("recent stops", "SELECT id FROM stops ORDER BY start_time DESC LIMIT 8", None, "stops", "stops_start_time_idx"),
+        ("machines on a line", "SELECT id, name FROM machines WHERE line_id = %s ORDER BY id", (1,), "machines", None),
+        ("open alarms", OPEN_ALARMS_SQL, None, "alarms", "alarms_open_idx"),
+        ("alarms per machine and time",
+         "SELECT id FROM alarms WHERE machine_id = %s AND occurred_at >= %s", (1, now - timedelta(days=1)),
+         "alarms", "alarms_machine_occurred_idx"),
+        ("events per machine and time",
+         "SELECT id FROM events WHERE machine_id = %s AND occurred_at >= %s", (1, now - timedelta(days=1)),
+         "events", "events_machine_occurred_idx"),
+        ("latest production history",
+         "SELECT label FROM production_history WHERE line_id = %s ORDER BY id DESC LIMIT 10", (1,),
+         "production_history", "production_history_line_id_idx"),
+        ("latest batch",
+         "SELECT id FROM batches WHERE line_id = %s ORDER BY id DESC LIMIT 1", (1,), "batches", "batches_line_id_idx"),
+        ("login lookup", "SELECT * FROM users WHERE username = %s", ("admin",), "users", None),
+        ("status segments", SEGMENTS_SQL, {"ids": [1], "start": now - timedelta(hours=8), "end": now},
+         "machine_status_segments", None),
+        ("running shift OEE", CURRENT_SQL, ([1], now), "shift_oee", None),
+    ]
+
+def _family(cur, relation):
+    # The relation plus, for a partitioned table or index, its partitions
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s)",
+        (relation,),
+    )
+    return {relation} | {name for (name,) in cur.fetchall()}
+
+def _scans(plan, relations):
+    # (node type, index name) for every plan node that reads one of relations
+    found = []
+    if plan.get("Relation Name") in relations:
+        found.append((plan["Node Type"], plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        found.extend(_scans(child, relations))
+    return found
+
+def explain_hot_queries(conn):
+    # Seq scans are disabled for the check: on a small or empty database the
+    # planner rightly prefers them, and we only ask whether an index can serve
+    results = []
+    cur = conn.cursor()
+    try:
+        for label, sql, params, table, index in hot_queries():
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            # On a partitioned table the plan names partitions and their
+            # indexes; scanning fewer partitions than exist shows pruning
+            tables = _family(cur, table)
+            indexes = _family(cur, index) if index else set()
+            scans = _scans(plan[0]["Plan"], tables)
+            # Bitmap heap scans name their index on a child Bitmap Index Scan
+            ok = bool(scans) and all(node != "Seq Scan" for node, _ in scans) and (
+                index is None or any(name in indexes for _, name in scans) or _bitmap_uses(plan[0]["Plan"], indexes)
+            )
+            results.append({
+                "query": label, "table": table, "ok": ok, "scans": scans,
+                "partitions": len(tables) - 1 or None,
+            })
+            conn.rollback()
+    finally:
+        cur.close()
+        conn.rollback()
+    return results
+
+def _bitmap_uses(plan, indexes):
+    if plan.get("Node Type") == "Bitmap Index Scan" and plan.get("Index Name") in indexes:
+        return True
+    return any(_bitmap_uses(child, indexes) for child in plan.get("Plans", []))
+
+def startup_report(conn):
+    # Called when the API starts: optionally migrate, then report what is
+    # still pending and which hot-query indexes are missing
+    applied = apply_pending(conn) if MIGRATE_ON_STARTUP else []
+    report = status(conn)
+    report["applied_now"] = applied
+    report["missing_indexes"] = missing_indexes(conn) if not report["pending"] else []
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true")
+    group.add_argument("--check", action="store_true")
+    group.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    from db import get_connection
+    conn = get_connection()
+    try:
+        if args.status:
+            for key, names in status(conn).items():
+                print(f"{key + ':':<10} {', '.join(names) or '-'}")
+        elif args.check:
+            missing = missing_indexes(conn)
+            for name in missing:
+                print(f"missing index: {name}")
+            print("all expected indexes present" if not missing else f"{len(missing)} missing")
+            sys.exit(1 if missing else 0)
+        elif args.explain:
+            results = explain_hot_queries(conn)
+            for r in results:
+                scans = ", ".join(f"{node}{' ' + name if name else ''}" for node, name in r["scans"]) or "no scan"
+                if r["partitions"]:
+                    scans = f"[{len(r['scans'])}/{r['partitions']} partitions] {scans}"
+                print(f"{'ok  ' if r['ok'] else 'FAIL'} {r['query']:<30} {scans}")
+            sys.exit(0 if all(r["ok"] for r in results) else 1)
+        else:
+            applied = apply_pending(conn)
+            print("applied: " + (", ".join(applied) if applied else "nothing, schema is current"))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+-- Baseline: every table the backend reads or writes, in the shape the code
+-- uses. IF NOT EXISTS keeps this a no-op on databases created earlier from
+-- mes_schema.sql; 0002 brings those up to the same columns.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    full_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'Active',
+    role VARCHAR(20) NOT NULL DEFAULT 'User',
+    joined TIMESTAMP DEFAULT NOW(),
+    last_active TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS production_lines (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'RUNNING',
+    oee NUMERIC(5,2) DEFAULT 0,
+    shift_quantity INTEGER DEFAULT 0,
+    alarms INTEGER DEFAULT 0,
+    last_production DATE,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS products (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'Active',
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS work_orders (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    due_date DATE,
+    assigned_line_id INTEGER REFERENCES production_lines(id),
+    progress NUMERIC(3,2) DEFAULT 0,
+    alarms INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS machines (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    line_id INTEGER REFERENCES production_lines(id),
+    status VARCHAR(20) NOT NULL,
+    type VARCHAR(50),
+    counter_type VARCHAR(20) DEFAULT 'status',
+    avg_pieces_per_sec NUMERIC(10,3),
+    product_id INTEGER REFERENCES products(id),
+    last_maintenance DATE,
+    next_maintenance DATE,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS shifts (
+    id SERIAL PRIMARY KEY,
+    line_id INTEGER REFERENCES production_lines(id),
+    name VARCHAR(50) NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    shift_quantity INTEGER DEFAULT 0,
+    operator VARCHAR(100),
+    duration NUMERIC(5,2),
+    status VARCHAR(20) NOT NULL DEFAULT 'Scheduled',
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS stops (
+    id SERIAL PRIMARY KEY,
+    machine_id INTEGER REFERENCES machines(id),
+    line_id INTEGER REFERENCES production_lines(id),
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP,
+    reason VARCHAR(255),
+    resolved BOOLEAN DEFAULT FALSE,
+    recurring BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS alarms (
+    id SERIAL PRIMARY KEY,
+    machine_id INTEGER REFERENCES machines(id),
+    code VARCHAR(50) NOT NULL,
+    description TEXT,
+    occurred_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    cleared_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id SERIAL PRIMARY KEY,
+    machine_id INTEGER REFERENCES machines(id),
+    work_order_id INTEGER REFERENCES work_orders(id),
+    event_type VARCHAR(50) NOT NULL,
+    description TEXT,
+    occurred_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    created_by INTEGER REFERENCES users(id),
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS batches (
+    id SERIAL PRIMARY KEY,
+    line_id INTEGER REFERENCES production_lines(id) ON DELETE CASCADE,
+    name VARCHAR(100),
+    current INTEGER DEFAULT 0,
+    target INTEGER DEFAULT 0,
+    elapsed VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS production_history (
+    id SERIAL PRIMARY KEY,
+    line_id INTEGER REFERENCES production_lines(id) ON DELETE CASCADE,
+    code VARCHAR(50),
+    label VARCHAR(255),
+    qty VARCHAR(50)
+);
+
+-- Run-length encoded status history, append-only
+CREATE TABLE IF NOT EXISTS machine_status_segments (
+    id BIGSERIAL PRIMARY KEY,
+    machine_id INTEGER NOT NULL REFERENCES machines(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL,
+    start_time TIMESTAMP NOT NULL DEFAULT NOW(),
+    end_time TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS machine_status_segments_machine_start_idx ON machine_status_segments (machine_id, start_time);
+CREATE UNIQUE INDEX IF NOT EXISTS machine_status_segments_open_idx ON machine_status_segments (machine_id) WHERE end_time IS NULL;
+
+-- Closed stops folded per machine per hour / per day
+CREATE TABLE IF NOT EXISTS stop_rollups_hourly (
+    machine_id INTEGER NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    stop_count INTEGER NOT NULL DEFAULT 0,
+    downtime_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (machine_id, bucket)
+);
+CREATE TABLE IF NOT EXISTS stop_rollups_daily (
+    machine_id INTEGER NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    stop_count INTEGER NOT NULL DEFAULT 0,
+    downtime_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (machine_id, bucket)
+);
+
+-- Materialized per machine per shift occurrence; frozen once the shift ends
+CREATE TABLE IF NOT EXISTS shift_oee (
+    machine_id INTEGER NOT NULL REFERENCES machines(id) ON DELETE CASCADE,
+    shift_id INTEGER NOT NULL REFERENCES shifts(id) ON DELETE CASCADE,
+    shift_start TIMESTAMP NOT NULL,
+    shift_end TIMESTAMP NOT NULL,
+    planned_seconds DOUBLE PRECISION NOT NULL,
+    downtime_seconds DOUBLE PRECISION NOT NULL,
+    good_count INTEGER NOT NULL DEFAULT 0,
+    reject_count INTEGER NOT NULL DEFAULT 0,
+    ideal_rate DOUBLE PRECISION,
+    availability NUMERIC(5,2),
+    performance NUMERIC(5,2),
+    quality NUMERIC(5,2),
+    oee NUMERIC(5,1),
+    frozen BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (machine_id, shift_id, shift_start)
+);
+CREATE INDEX IF NOT EXISTS shift_oee_machine_start_idx ON shift_oee (machine_id, shift_start);
+CREATE INDEX IF NOT EXISTS shift_oee_shift_start_idx ON shift_oee (shift_id, shift_start);
+CREATE INDEX IF NOT EXISTS shift_oee_open_idx ON shift_oee (machine_id, shift_start DESC) WHERE NOT frozen;
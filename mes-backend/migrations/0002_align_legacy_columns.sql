@@ -0,0 +1,85 @@
+-- Databases created from the old mes_schema.sql used different column names
+-- and an entity_type/entity_id shape for alarms and events. Rename or add
+-- what the code uses and backfill from the legacy columns. Every step checks
+-- the catalog first, so this is a no-op on a database built by 0001.
+
+CREATE OR REPLACE FUNCTION pg_temp.has_column(tbl TEXT, col TEXT) RETURNS BOOLEAN AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = tbl AND column_name = col
+    )
+$$ LANGUAGE sql;
+
+DO $$
+BEGIN
+    IF pg_temp.has_column('machines', 'production_line_id') AND NOT pg_temp.has_column('machines', 'line_id') THEN
+        ALTER TABLE machines RENAME COLUMN production_line_id TO line_id;
+    END IF;
+    IF pg_temp.has_column('shifts', 'assigned_line_id') AND NOT pg_temp.has_column('shifts', 'line_id') THEN
+        ALTER TABLE shifts RENAME COLUMN assigned_line_id TO line_id;
+    END IF;
+END $$;
+
+ALTER TABLE machines ADD COLUMN IF NOT EXISTS line_id INTEGER REFERENCES production_lines(id);
+ALTER TABLE machines ADD COLUMN IF NOT EXISTS type VARCHAR(50);
+ALTER TABLE machines ADD COLUMN IF NOT EXISTS avg_pieces_per_sec NUMERIC(10,3);
+ALTER TABLE machines ADD COLUMN IF NOT EXISTS product_id INTEGER REFERENCES products(id);
+
+ALTER TABLE shifts ADD COLUMN IF NOT EXISTS line_id INTEGER REFERENCES production_lines(id);
+ALTER TABLE shifts ADD COLUMN IF NOT EXISTS shift_quantity INTEGER DEFAULT 0;
+ALTER TABLE shifts ADD COLUMN IF NOT EXISTS operator VARCHAR(100);
+ALTER TABLE shifts ADD COLUMN IF NOT EXISTS duration NUMERIC(5,2);
+
+ALTER TABLE production_lines ADD COLUMN IF NOT EXISTS description TEXT;
+ALTER TABLE production_lines ADD COLUMN IF NOT EXISTS oee NUMERIC(5,2) DEFAULT 0;
+ALTER TABLE production_lines ADD COLUMN IF NOT EXISTS shift_quantity INTEGER DEFAULT 0;
+
+ALTER TABLE work_orders ADD COLUMN IF NOT EXISTS product_id INTEGER REFERENCES products(id);
+
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS machine_id INTEGER REFERENCES machines(id);
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS code VARCHAR(50);
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS description TEXT;
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS occurred_at TIMESTAMP DEFAULT NOW();
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS cleared_at TIMESTAMP;
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS machine_id INTEGER REFERENCES machines(id);
+ALTER TABLE events ADD COLUMN IF NOT EXISTS work_order_id INTEGER REFERENCES work_orders(id);
+ALTER TABLE events ADD COLUMN IF NOT EXISTS occurred_at TIMESTAMP DEFAULT NOW();
+
+DO $$
+BEGIN
+    -- Legacy text product name: keep the data, stop requiring it
+    IF pg_temp.has_column('work_orders', 'product') THEN
+        ALTER TABLE work_orders ALTER COLUMN product DROP NOT NULL;
+    END IF;
+
+    IF pg_temp.has_column('alarms', 'entity_id') THEN
+        UPDATE alarms SET
+            machine_id = COALESCE(machine_id, CASE WHEN entity_type = 'machine' THEN entity_id END),
+            code = COALESCE(code, type),
+            description = COALESCE(description, message),
+            occurred_at = COALESCE(created_at, occurred_at),
+            cleared_at = COALESCE(cleared_at, resolved_at)
+        WHERE code IS NULL;
+        ALTER TABLE alarms ALTER COLUMN entity_type DROP NOT NULL;
+        ALTER TABLE alarms ALTER COLUMN entity_id DROP NOT NULL;
+        ALTER TABLE alarms ALTER COLUMN type DROP NOT NULL;
+        ALTER TABLE alarms ALTER COLUMN severity DROP NOT NULL;
+    END IF;
+
+    IF pg_temp.has_column('events', 'entity_id') THEN
+        UPDATE events SET
+            machine_id = COALESCE(machine_id, CASE WHEN entity_type = 'machine' THEN entity_id END),
+            occurred_at = COALESCE(created_at, occurred_at)
+        WHERE machine_id IS NULL;
+        ALTER TABLE events ALTER COLUMN entity_type DROP NOT NULL;
+        ALTER TABLE events ALTER COLUMN entity_id DROP NOT NULL;
+    END IF;
+END $$;
+
+UPDATE alarms SET code = '' WHERE code IS NULL;
+ALTER TABLE alarms ALTER COLUMN code SET NOT NULL;
+UPDATE alarms SET occurred_at = NOW() WHERE occurred_at IS NULL;
+ALTER TABLE alarms ALTER COLUMN occurred_at SET NOT NULL;
+UPDATE events SET occurred_at = NOW() WHERE occurred_at IS NULL;
+ALTER TABLE events ALTER COLUMN occurred_at SET NOT NULL;
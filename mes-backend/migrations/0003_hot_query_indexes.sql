@@ -0,0 +1,42 @@
+-- Indexes for the queries the routers actually issue. The names are listed
+-- in migrate.EXPECTED_INDEXES so startup can report any that are missing.
+
+-- Downtime windows (oee.downtime_query, dashboard): machine_id = ANY(...) AND start_time >= ...
+CREATE INDEX IF NOT EXISTS stops_machine_start_idx ON stops (machine_id, start_time);
+-- Fleet-wide windows and "most recent stops"
+CREATE INDEX IF NOT EXISTS stops_start_time_idx ON stops (start_time);
+-- Open stops: stop tracker load/observe, rollup readers
+CREATE INDEX IF NOT EXISTS stops_open_idx ON stops (machine_id, start_time DESC) WHERE end_time IS NULL;
+
+-- Machines per line: line summaries, timelines, shift OEE, machine_scope()
+CREATE INDEX IF NOT EXISTS machines_line_idx ON machines (line_id);
+
+-- Alarm lists per machine and time range
+CREATE INDEX IF NOT EXISTS alarms_machine_occurred_idx ON alarms (machine_id, occurred_at);
+-- Open alarms per line in LINE_SUMMARY_SQL
+CREATE INDEX IF NOT EXISTS alarms_open_idx ON alarms (machine_id) WHERE cleared_at IS NULL;
+
+-- Event lists per machine and time range, shift OEE counter events
+CREATE INDEX IF NOT EXISTS events_machine_occurred_idx ON events (machine_id, occurred_at);
+CREATE INDEX IF NOT EXISTS events_occurred_idx ON events (occurred_at);
+
+-- Latest batch / production history per line: WHERE line_id = ? ORDER BY id DESC LIMIT n
+CREATE INDEX IF NOT EXISTS production_history_line_id_idx ON production_history (line_id, id DESC);
+CREATE INDEX IF NOT EXISTS batches_line_id_idx ON batches (line_id, id DESC);
+
+-- Shift and work order lists filtered by line
+CREATE INDEX IF NOT EXISTS shifts_line_idx ON shifts (line_id);
+CREATE INDEX IF NOT EXISTS work_orders_line_idx ON work_orders (assigned_line_id, id);
+
+-- Logins look users up by username. The UNIQUE constraint from 0001 already
+-- provides the index; only databases without one get it here.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'users'::regclass AND a.attname = 'username'
+    ) THEN
+        CREATE UNIQUE INDEX users_username_idx ON users (username);
+    END IF;
+END $$;
@@ -0,0 +1,86 @@
+-- events, stops and alarms become monthly range partitions on their time
+-- column, named <table>_pYYYY_MM, plus a <table>_default partition for rows
+-- outside every month (e.g. a device with a wrong clock). Months are created
+-- from 24 months back at most, so one row with a bogus old timestamp cannot
+-- turn into hundreds of partitions; older rows land in <table>_default, and
+-- partitions.ensure_partitions(..., since=...) splits them out later if they
+-- are real history. partitions.py creates future months and expires old
+-- ones from then on.
+--
+-- The existing table is renamed, its rows copied into the partitioned table
+-- and the old one dropped, all in this migration's transaction: the tables
+-- are locked for the duration of the copy, so apply it in a maintenance
+-- window on a large database. Tables that are already partitioned are left
+-- alone.
+
+CREATE OR REPLACE FUNCTION pg_temp.partition_by_month(tbl TEXT, col TEXT, months_back INTEGER, months_ahead INTEGER) RETURNS VOID AS $$
+DECLARE
+    old TEXT := tbl || '_unpartitioned';
+    rec RECORD;
+    seq TEXT;
+    first_month DATE;
+    last_month DATE := date_trunc('month', NOW())::date + make_interval(months => months_ahead);
+    month DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass(tbl)) = 'p' THEN
+        RETURN;
+    END IF;
+
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, old);
+    -- Free the index and constraint names for the new table
+    FOR rec IN
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = old::regclass
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', rec.relname, left(rec.relname, 48) || '_unpartitioned');
+    END LOOP;
+
+    -- The primary key of a partitioned table must include the partition key
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE, PRIMARY KEY (id, %I)) '
+        'PARTITION BY RANGE (%I)', tbl, old, col, col);
+    FOR rec IN
+        SELECT conname, pg_get_constraintdef(oid) AS def FROM pg_constraint
+        WHERE conrelid = old::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', tbl, rec.conname, rec.def);
+    END LOOP;
+    -- Keep the id sequence when the old table is dropped
+    seq := pg_get_serial_sequence(old, 'id');
+    IF seq IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, tbl);
+    END IF;
+
+    EXECUTE format('SELECT date_trunc(''month'', MIN(%I))::date FROM %I', col, old) INTO first_month;
+    month := GREATEST(
+        LEAST(COALESCE(first_month, last_month), date_trunc('month', NOW())::date),
+        date_trunc('month', NOW())::date - make_interval(months => months_back));
+    WHILE month <= last_month LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       tbl || '_p' || to_char(month, 'YYYY_MM'), tbl, month, month + INTERVAL '1 month');
+        month := month + INTERVAL '1 month';
+    END LOOP;
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', tbl || '_default', tbl);
+
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I', tbl, old);
+    EXECUTE format('DROP TABLE %I', old);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT pg_temp.partition_by_month('stops', 'start_time', 24, 3);
+SELECT pg_temp.partition_by_month('alarms', 'occurred_at', 24, 3);
+SELECT pg_temp.partition_by_month('events', 'occurred_at', 24, 3);
+
+-- Indexes from 0003, now declared on the parents so every partition
+-- (including the ones partitions.py adds later) gets its own copy
+CREATE INDEX IF NOT EXISTS stops_machine_start_idx ON stops (machine_id, start_time);
+CREATE INDEX IF NOT EXISTS stops_start_time_idx ON stops (start_time);
+CREATE INDEX IF NOT EXISTS stops_open_idx ON stops (machine_id, start_time DESC) WHERE end_time IS NULL;
+CREATE INDEX IF NOT EXISTS alarms_machine_occurred_idx ON alarms (machine_id, occurred_at);
+CREATE INDEX IF NOT EXISTS alarms_open_idx ON alarms (machine_id) WHERE cleared_at IS NULL;
+CREATE INDEX IF NOT EXISTS events_machine_occurred_idx ON events (machine_id, occurred_at);
+CREATE INDEX IF NOT EXISTS events_occurred_idx ON events (occurred_at);
+
+ANALYZE stops;
+ANALYZE alarms;
+ANALYZE events;
@@ -0,0 +1,60 @@
+-- Change feed: every committed write to the tables below sends one NOTIFY
+-- on the mes_changes channel per statement, which change_feed.py in each
+-- API worker listens for. Triggers rather than calls in the handlers, so
+-- ingest, the status buffer, maintenance scripts and manual SQL are seen
+-- too. NOTIFY is transactional: nothing is sent for a rolled back write.
+--
+-- Payload: {"table", "op", "ids", "origin"}. ids lists the changed rows, or
+-- is null for truncates and statements touching more than 100 rows. origin
+-- is the writing session's mes.origin setting (db.connect_kwargs sets it to
+-- the worker's id), so a worker can tell its own writes from others'.
+-- High-volume tables (events, machine_status_segments) are left out.
+
+CREATE OR REPLACE FUNCTION notify_change() RETURNS TRIGGER AS $$
+DECLARE
+    ids INTEGER[];
+BEGIN
+    IF TG_OP <> 'TRUNCATE' THEN
+        SELECT array_agg(id) INTO ids FROM (SELECT id FROM changed_rows LIMIT 101) AS r;
+        IF ids IS NULL THEN
+            RETURN NULL;
+        END IF;
+        IF cardinality(ids) > 100 THEN
+            ids := NULL;
+        END IF;
+    END IF;
+    PERFORM pg_notify('mes_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', lower(TG_OP),
+        'ids', ids,
+        'origin', NULLIF(current_setting('mes.origin', true), '')
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pg_temp.add_change_triggers(tbl TEXT) RETURNS VOID AS $$
+BEGIN
+    -- One trigger per event: a trigger with a transition table can only
+    -- fire on one kind of statement
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_insert', tbl);
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION notify_change()', tbl || '_notify_insert', tbl);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_update', tbl);
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION notify_change()', tbl || '_notify_update', tbl);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_delete', tbl);
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION notify_change()', tbl || '_notify_delete', tbl);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_truncate', tbl);
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+        'FOR EACH STATEMENT EXECUTE FUNCTION notify_change()', tbl || '_notify_truncate', tbl);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT pg_temp.add_change_triggers(tbl)
+FROM unnest(ARRAY['machines', 'production_lines', 'stops', 'alarms', 'products', 'shifts', 'users']) AS tbl;
@@ -0,0 +1,8 @@
+-- Alarm storms: a code a machine keeps resending while its alarm is open is
+-- folded into that alarm (alarm_index.py) instead of becoming a row per
+-- report. occurrences counts the reports, last_seen_at is the latest one;
+-- rows written before this migration read as a single report at
+-- occurred_at. Both are metadata-only changes, no table rewrite.
+
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP;
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+import psycopg2.extras
+
+# Planned production time for the rolling OEE window (8h shift)
+PLANNED_TIME = 8 * 60 * 60
+
+def downtime_query(window_start, machine_ids=None):
+    # Downtime per machine over the window, in one grouped query
+    sql = (
+        "SELECT machine_id, SUM(EXTRACT(EPOCH FROM (COALESCE(end_time, NOW()) - start_time))) AS seconds "
+        "FROM stops WHERE start_time >= %s"
+    )
+    params = [window_start]
+    if machine_ids is not None:
+        sql += " AND machine_id = ANY(%s)"
+        params.append(list(machine_ids))
+    sql += " GROUP BY machine_id"
+    return sql, params
+
+def fetch_downtime(conn, window_start, machine_ids=None):
+    cur = conn.cursor()
+    cur.execute(*downtime_query(window_start, machine_ids))
+    downtime = {machine_id: float(seconds or 0) for machine_id, seconds in cur.fetchall()}
+    cur.close()
+    return downtime
+
+async def fetch_downtime_async(aconn, window_start, machine_ids=None):
+    rows = await aconn.fetch(*downtime_query(window_start, machine_ids))
+    return {row["machine_id"]: float(row["seconds"] or 0) for row in rows}
+
+def score(planned, downtime, good=0, reject=0, ideal_rate=0.0):
+    # The one OEE definition, used for shifts and the rolling window alike:
+    # OEE = availability x performance x quality. Performance is counted
+    # output against ideal_rate over operating time; with no counted output
+    # (no counter events, and the rolling window reads none) the machine is
+    # scored on availability alone. Quality is the good share of counted
+    # pieces, 1 when nothing was counted.
+    downtime = min(downtime, planned)
+    operating = planned - downtime
+    total = good + reject
+    availability = operating / planned if planned > 0 else 0.0
+    if total == 0:
+        performance = 1.0 if operating > 0 else 0.0
+    elif ideal_rate > 0 and operating > 0:
+        performance = min(total / (ideal_rate * operating), 1.0)
+    else:
+        performance = 0.0
+    quality = good / total if total else 1.0
+    return {
+        "oee": round(availability * performance * quality * 100, 1),
+        "availability": round(availability * 100, 2),
+        "performance": round(performance * 100, 2),
+        "quality": round(quality * 100, 2),
+    }
+
+def compute_kpis(machines, downtime, planned_time=PLANNED_TIME):
+    # Availability, performance, quality and OEE for a batch of machine rows
+    # over planned_time, from their downtime alone
+    return [score(planned_time, downtime.get(machine["id"], 0.0)) for machine in machines]
+
+def _rolling_window(machines, current, planned_time, now):
+    # Machines without a running shift, and the stops query that covers them
+    rolling = [m for m in machines if m["id"] not in current]
+    window_start = (now or datetime.now()) - timedelta(seconds=planned_time)
+    machine_ids = [m["id"] for m in rolling] if len(rolling) == 1 else None
+    return rolling, window_start, machine_ids
+
+def _merge_kpis(machines, current, rolling, downtime, planned_time):
+    for machine, kpis in zip(rolling, compute_kpis(rolling, downtime, planned_time)):
+        machine.update(kpis)
+    for machine in machines:
+        row = current.get(machine["id"])
+        if row:
+            machine.update({
+                "oee": float(row["oee"]),
+                "availability": float(row["availability"]),
+                "performance": float(row["performance"]),
+                "quality": float(row["quality"]),
+                "shift_id": row["shift_id"],
+            })
+    return machines
+
+def attach_oee(conn, machines, planned_time=PLANNED_TIME, now=None, use_shifts=True):
+    # Adds oee/availability/performance/quality to each machine row in place.
+    # Machines on a running shift get that shift's materialized OEE; the rest
+    # fall back to the rolling planned_time window.
+    if not machines:
+        return machines
+    current = {}
+    if use_shifts:
+        from shift_oee import current_by_machine
+        current = current_by_machine(conn, [m["id"] for m in machines], now)
+    rolling, window_start, machine_ids = _rolling_window(machines, current, planned_time, now)
+    downtime = fetch_downtime(conn, window_start, machine_ids) if rolling else {}
+    return _merge_kpis(machines, current, rolling, downtime, planned_time)
+
+async def attach_oee_async(aconn, machines, planned_time=PLANNED_TIME, now=None, use_shifts=True):
+    if not machines:
+        return machines
+    current = {}
+    if use_shifts:
+        from shift_oee import current_by_machine_async
+        current = await current_by_machine_async(aconn, [m["id"] for m in machines], now)
+    rolling, window_start, machine_ids = _rolling_window(machines, current, planned_time, now)
+    downtime = await fetch_downtime_async(aconn, window_start, machine_ids) if rolling else {}
+    return _merge_kpis(machines, current, rolling, downtime, planned_time)
+
+LINE_MACHINES_SQL = "SELECT id, line_id, counter_type, avg_pieces_per_sec FROM machines"
+
+def _mean_by_line(machines):
+    per_line = {}
+    for machine in machines:
+        per_line.setdefault(machine["line_id"], []).append(machine["oee"])
+    return {line_id: round(sum(values) / len(values), 1) for line_id, values in per_line.items()}
+
+def line_oee(conn, planned_time=PLANNED_TIME, now=None):
+    # Mean machine OEE per production line, from two set-based queries
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(LINE_MACHINES_SQL)
+    machines = cur.fetchall()
+    cur.close()
+    attach_oee(conn, machines, planned_time, now)
+    return _mean_by_line(machines)
+
+async def line_oee_async(aconn, planned_time=PLANNED_TIME, now=None):
+    machines = await aconn.fetch(LINE_MACHINES_SQL)
+    await attach_oee_async(aconn, machines, planned_time, now)
+    return _mean_by_line(machines)
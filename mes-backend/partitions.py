@@ -0,0 +1,179 @@
+import asyncio
+import os
+import re
+from datetime import date, datetime
+from starlette.concurrency import run_in_threadpool
+from db import connection
+
+# History tables partitioned by month on their time column (migration 0004).
+# Partitions are named <table>_pYYYY_MM; <table>_default catches the rest.
+PARTITIONED_TABLES = {"events": "occurred_at", "stops": "start_time", "alarms": "occurred_at"}
+# Months of empty partitions kept ready ahead of the current one
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Whole months of raw history kept per table, e.g. EVENTS_RETENTION_MONTHS=6;
+# RETENTION_MONTHS sets the default for all three and 0 keeps everything
+RETENTION_MONTHS = {
+    table: int(os.getenv(f"{table.upper()}_RETENTION_MONTHS", os.getenv("RETENTION_MONTHS", "0")))
+    for table in PARTITIONED_TABLES
+}
+# "archive" detaches expired partitions and moves them to ARCHIVE_SCHEMA,
+# where they can be dumped and dropped by hand; "drop" deletes them
+PARTITION_EXPIRY = os.getenv("PARTITION_EXPIRY", "archive")
+ARCHIVE_SCHEMA = os.getenv("ARCHIVE_SCHEMA", "archive")
+# Seconds between maintenance runs
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "3600"))
+# pg_try_advisory_lock key, so one worker does the maintenance per run
+PARTITION_LOCK = 48151624
+
+PARTITIONS_SQL = """
+    SELECT c.relname FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(%s)
+"""
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+def is_partitioned(cur, table):
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+def partitions(cur, table):
+    # {first day of month: partition name}, oldest first
+    cur.execute(PARTITIONS_SQL, (table,))
+    months = {}
+    for (name,) in cur.fetchall():
+        match = re.fullmatch(rf"{table}_p(\d{{4}})_(\d{{2}})", name)
+        if match:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return dict(sorted(months.items()))
+
+def _create_partition(cur, table, column, month):
+    name = partition_name(table, month)
+    bounds = (month, _add_months(month, 1))
+    # Partition bounds must be plain literals, not the ::date casts psycopg2 sends
+    values = f"FROM ('{bounds[0].isoformat()}') TO ('{bounds[1].isoformat()}')"
+    cur.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {column} >= %s AND {column} < %s)", bounds
+    )
+    if not cur.fetchone()[0]:
+        cur.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {values}")
+        return name
+    # Rows for this month already landed in the default partition: move them
+    # into a standalone table first, since attaching checks the default
+    cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(
+        f"WITH moved AS (DELETE FROM {table}_default WHERE {column} >= %s AND {column} < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        bounds,
+    )
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {values}")
+    return name
+
+def ensure_partitions(cur, table, column, today, since=None):
+    # Current month plus PARTITION_MONTHS_AHEAD, so inserts never hit the
+    # default partition in normal operation; since also covers past months
+    # (for backfills)
+    existing = partitions(cur, table)
+    month = (since or today).replace(day=1)
+    last = _add_months(today.replace(day=1), PARTITION_MONTHS_AHEAD)
+    created = []
+    while month <= last:
+        if month not in existing:
+            created.append(_create_partition(cur, table, column, month))
+        month = _add_months(month, 1)
+    return created
+
+def expire_partitions(cur, table, today):
+    # Partitions whose whole month is older than the retention window
+    retention = RETENTION_MONTHS[table]
+    if retention <= 0:
+        return []
+    cutoff = _add_months(today.replace(day=1), -retention)
+    expired = []
+    for month, name in partitions(cur, table).items():
+        if _add_months(month, 1) > cutoff:
+            break
+        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if PARTITION_EXPIRY == "drop":
+            cur.execute(f"DROP TABLE {name}")
+        else:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            cur.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+        expired.append(name)
+    return expired
+
+def maintain(conn, today=None):
+    # {table: {"created": [...], "expired": [...]}}, or None when another
+    # worker holds the maintenance lock
+    today = today or datetime.now().date()
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(%s)", (PARTITION_LOCK,))
+    if not cur.fetchone()[0]:
+        conn.rollback()
+        cur.close()
+        return None
+    result = {}
+    try:
+        for table, column in PARTITIONED_TABLES.items():
+            if not is_partitioned(cur, table):
+                continue
+            # One transaction per table keeps the parent's lock short
+            result[table] = {
+                "created": ensure_partitions(cur, table, column, today),
+                "expired": expire_partitions(cur, table, today),
+            }
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (PARTITION_LOCK,))
+        conn.commit()
+        cur.close()
+    return result
+
+def run_once():
+    with connection() as conn:
+        result = maintain(conn)
+    for table, changes in (result or {}).items():
+        if changes["created"]:
+            print(f"[partitions] {table}: created {', '.join(changes['created'])}")
+        if changes["expired"]:
+            action = "dropped" if PARTITION_EXPIRY == "drop" else f"archived to {ARCHIVE_SCHEMA}"
+            print(f"[partitions] {table}: {action} {', '.join(changes['expired'])}")
+    return result
+
+def status(conn):
+    # Partitions per table with their estimated row counts
+    cur = conn.cursor()
+    report = {}
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(cur, table):
+            report[table] = None
+            continue
+        cur.execute(
+            "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            (table,),
+        )
+        report[table] = {
+            "retention_months": RETENTION_MONTHS[table] or None,
+            "partitions": {name: max(rows, 0) for name, rows in cur.fetchall()},
+        }
+    cur.close()
+    conn.rollback()
+    return report
+
+async def run_maintainer(interval=PARTITION_MAINTENANCE_INTERVAL):
+    while True:
+        try:
+            await run_in_threadpool(run_once)
+        except Exception as exc:
+            print(f"[partitions] maintenance failed: {exc}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+# Hash/verify jobs allowed in flight (running + queued); beyond this we shed load
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+
+LOGIN_USER_LIMIT = int(os.getenv("LOGIN_USER_LIMIT", "10"))
+LOGIN_IP_LIMIT = int(os.getenv("LOGIN_IP_LIMIT", "200"))
+LOGIN_WINDOW = float(os.getenv("LOGIN_WINDOW", "60"))
+
+_context = None
+
+def _crypt_context():
+    # Built lazily inside each worker process
+    global _context
+    if _context is None:
+        from passlib.context import CryptContext
+        _context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _context
+
+def _hash(password):
+    return _crypt_context().hash(password)
+
+def _verify(password, hashed):
+    return _crypt_context().verify(password, hashed)
+
+class PasswordPool:
+    # bcrypt runs in dedicated processes so a login storm burns those cores
+    # instead of the threadpool and event loop that serve every other route
+
+    def __init__(self, workers=PASSWORD_WORKERS, max_pending=PASSWORD_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.seconds_total = 0.0
+
+    def _get_executor(self):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    ctx = multiprocessing.get_context("spawn")
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self.executor
+
+    def _submit(self, fn, *args):
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Password service busy, please retry", headers={"Retry-After": "1"})
+            self.pending += 1
+        started = time.monotonic()
+        future = self._get_executor().submit(fn, *args)
+
+        def done(_):
+            with self.lock:
+                self.pending -= 1
+                self.completed += 1
+                self.seconds_total += time.monotonic() - started
+
+        future.add_done_callback(done)
+        return future
+
+    def hash(self, password):
+        # For sync handlers: the worker thread waits but does no hashing itself
+        return self._submit(_hash, password).result()
+
+    def verify(self, password, hashed):
+        return self._submit(_verify, password, hashed).result()
+
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self._submit(_hash, password))
+
+    async def verify_async(self, password, hashed):
+        return await asyncio.wrap_future(self._submit(_verify, password, hashed))
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queued": max(self.pending - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "seconds_avg": self.seconds_total / self.completed if self.completed else 0.0,
+            }
+
+class LoginRateLimiter:
+    # Sliding-window attempt counters per username and per client IP
+
+    def __init__(self, user_limit=LOGIN_USER_LIMIT, ip_limit=LOGIN_IP_LIMIT, window=LOGIN_WINDOW):
+        self.limits = {"user": user_limit, "ip": ip_limit}
+        self.window = window
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def check(self, username, ip):
+        now = time.monotonic()
+        keys = [("user", username.lower()), ("ip", ip)]
+        with self.lock:
+            if len(self.attempts) > 10000:
+                self.attempts = {k: v for k, v in self.attempts.items() if v and v[-1] > now - self.window}
+            for key in keys:
+                hits = self.attempts.setdefault(key, deque())
+                while hits and hits[0] <= now - self.window:
+                    hits.popleft()
+                if len(hits) >= self.limits[key[0]]:
+                    retry_after = int(hits[0] + self.window - now) + 1
+                    raise HTTPException(
+                        status_code=429,
+                        detail="Too many login attempts, please wait",
+                        headers={"Retry-After": str(retry_after)},
+                    )
+            for key in keys:
+                self.attempts[key].append(now)
+
+    def reset_user(self, username):
+        with self.lock:
+            self.attempts.pop(("user", username.lower()), None)
+
+password_pool = PasswordPool()
+login_limiter = LoginRateLimiter()
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from fastapi import Response
+from json_response import dumps
+from metrics import record_serialization
+from change_feed import change_feed
+
+# Query-string variants kept per resource (pages, field selections, filters)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "64"))
+# Line summaries embed machine status and OEE, which drift with time as well
+# as with writes, so they are also rebuilt after this many seconds
+LINES_CACHE_TTL = float(os.getenv("LINES_CACHE_TTL", "5"))
+# The machine listing carries live OEE; screens polling it within this many
+# seconds of each other share one computation
+MACHINES_CACHE_TTL = float(os.getenv("MACHINES_CACHE_TTL", "2"))
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+class ResourceCache:
+    # Serialized GET responses for one resource, keyed by query string. Each
+    # entry remembers the resource version it was built at; a mutation bumps
+    # the version, so the next read rebuilds. Hits answer If-None-Match with
+    # 304 and otherwise return the stored bytes without touching the DB.
+    # Writes to `tables` made by other workers arrive through the change feed
+    # and bump the version here too. On the async path, concurrent misses
+    # for the same entry share one build.
+
+    def __init__(self, name, ttl=None, max_entries=RESPONSE_CACHE_SIZE, tables=()):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        # Misses that waited on another request's build instead of their own
+        self.coalesced = 0
+        self.remote_invalidations = 0
+        self.inflight = {}
+        change_feed.subscribe(tables, self._on_change)
+
+    def invalidate(self):
+        # Call after the mutating transaction has committed
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+
+    def _on_change(self, change):
+        # This worker's own writes were invalidated by their handlers
+        if not change.local:
+            self.invalidate()
+            self.remote_invalidations += 1
+
+    def _lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != self.version or (entry[1] is not None and entry[1] <= time.monotonic()):
+                self.misses += 1
+                return None, self.version
+            self.hits += 1
+            return entry, self.version
+
+    def _store(self, key, version, etag, body):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            # A mutation that landed while we were building wins
+            if version != self.version:
+                return
+            if key not in self.entries and len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = (version, expires, etag, body)
+
+    def _build(self, key, version, payload):
+        started = time.perf_counter()
+        body = dumps(payload)
+        record_serialization(time.perf_counter() - started)
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self._store(key, version, etag, body)
+        return etag, body
+
+    def _response(self, request, etag, body, cache_control):
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if _matches(request.headers.get("if-none-match"), etag):
+            with self.lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def respond(self, request, build, cache_control="no-cache"):
+        # build() returns the payload; it only runs on a miss
+        key = str(sorted(request.query_params.multi_items()))
+        entry, version = self._lookup(key)
+        etag, body = self._build(key, version, build()) if entry is None else entry[2:]
+        return self._response(request, etag, body, cache_control)
+
+    async def _build_async(self, key, version, build):
+        return self._build(key, version, await build())
+
+    async def _build_shared(self, key, version, build):
+        # The first miss runs build() as a task; misses arriving while it
+        # runs wait for the same task. Shielded, so a client that disconnects
+        # does not cancel the build for the others.
+        flight = self.inflight.get((key, version))
+        if flight is None:
+            flight = asyncio.ensure_future(self._build_async(key, version, build))
+            self.inflight[(key, version)] = flight
+            flight.add_done_callback(lambda done: self._landed((key, version), done))
+        else:
+            with self.lock:
+                self.coalesced += 1
+        return await asyncio.shield(flight)
+
+    def _landed(self, flight_key, done):
+        self.inflight.pop(flight_key, None)
+        # Mark a failure as seen even when every waiter went away
+        if not done.cancelled():
+            done.exception()
+
+    async def respond_async(self, request, build, cache_control="no-cache"):
+        # Same, for a coroutine function build()
+        key = str(sorted(request.query_params.multi_items()))
+        entry, version = self._lookup(key)
+        etag, body = await self._build_shared(key, version, build) if entry is None else entry[2:]
+        return self._response(request, etag, body, cache_control)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "version": self.version,
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "not_modified": self.not_modified,
+                "remote_invalidations": self.remote_invalidations,
+            }
+
+products_cache = ResourceCache("products", tables=("products",))
+shifts_cache = ResourceCache("shifts", tables=("shifts",))
+users_cache = ResourceCache("users", tables=("users",))
+lines_cache = ResourceCache("production_lines", ttl=LINES_CACHE_TTL, tables=("production_lines", "machines", "alarms"))
+machines_cache = ResourceCache("machines", ttl=MACHINES_CACHE_TTL, tables=("machines", "stops"))
+
+RESOURCE_CACHES = (products_cache, shifts_cache, users_cache, lines_cache, machines_cache)
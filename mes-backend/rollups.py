@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+# Closed stops are folded into per-machine hourly and daily buckets as they
+# close, so analytics over long windows read rollup rows instead of raw stops.
+# Open stops are never rolled up; readers add them live.
+
+ROLLUP_TABLES = {"hour": "stop_rollups_hourly", "day": "stop_rollups_daily"}
+
+def _apply(cur, stop_ids, grain, sign):
+    table = ROLLUP_TABLES[grain]
+    # A stop's count goes to the bucket it started in; its duration is split
+    # across every bucket it overlaps
+    cur.execute(
+        f"""
+        INSERT INTO {table} (machine_id, bucket, stop_count, downtime_seconds)
+        SELECT s.machine_id, b.bucket,
+               SUM(CASE WHEN b.bucket = date_trunc(%(grain)s, s.start_time) THEN %(sign)s ELSE 0 END),
+               SUM(%(sign)s * EXTRACT(EPOCH FROM LEAST(s.end_time, b.bucket + %(step)s::interval) - GREATEST(s.start_time, b.bucket)))
+        FROM stops s
+        CROSS JOIN LATERAL generate_series(date_trunc(%(grain)s, s.start_time), s.end_time, %(step)s::interval) AS b(bucket)
+        WHERE s.id = ANY(%(ids)s) AND s.end_time IS NOT NULL AND s.end_time >= s.start_time
+        GROUP BY s.machine_id, b.bucket
+        ON CONFLICT (machine_id, bucket) DO UPDATE SET
+            stop_count = {table}.stop_count + EXCLUDED.stop_count,
+            downtime_seconds = {table}.downtime_seconds + EXCLUDED.downtime_seconds
+        """,
+        {"ids": list(stop_ids), "grain": grain, "step": f"1 {grain}", "sign": sign},
+    )
+
+def add_stops(cur, stop_ids):
+    # Call after the stops are closed, in the same transaction
+    if stop_ids:
+        for grain in ROLLUP_TABLES:
+            _apply(cur, stop_ids, grain, 1)
+
+def remove_stops(cur, stop_ids):
+    # Call before a closed stop is edited or deleted, in the same transaction
+    if stop_ids:
+        for grain in ROLLUP_TABLES:
+            _apply(cur, stop_ids, grain, -1)
+
+def rebuild(conn):
+    # Only buckets from the oldest month still in stops are rebuilt; months
+    # whose raw stops were expired by partitions.py keep their rollups
+    cur = conn.cursor()
+    cur.execute("SELECT date_trunc('month', MIN(start_time)) FROM stops")
+    since = cur.fetchone()[0]
+    for table in ROLLUP_TABLES.values():
+        if since is None:
+            cur.execute(f"TRUNCATE {table}")
+        else:
+            cur.execute(f"DELETE FROM {table} WHERE bucket >= %s", (since,))
+    cur.execute("SELECT id FROM stops WHERE end_time IS NOT NULL")
+    ids = [row[0] for row in cur.fetchall()]
+    add_stops(cur, ids)
+    conn.commit()
+    cur.close()
+    return len(ids)
+
+def _floor_hour(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def _floor_day(ts):
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def downtime_by_machine(conn, start, end, machine_ids=None):
+    # {machine_id: (stop_count, downtime_seconds)} for [start, end) at hour
+    # granularity: whole days from the daily table, ragged edges from the
+    # hourly table, open stops from stops (end_time IS NULL)
+    h_start = _floor_hour(start)
+    h_end = _floor_hour(end) + (timedelta(hours=1) if end != _floor_hour(end) else timedelta(0))
+    d_start = _floor_day(h_start) + (timedelta(days=1) if h_start != _floor_day(h_start) else timedelta(0))
+    d_end = _floor_day(h_end)
+    if d_start >= d_end:
+        d_start = d_end = h_end
+    machine_filter = " AND machine_id = ANY(%(ids)s)" if machine_ids is not None else ""
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT machine_id, SUM(stop_count), SUM(downtime_seconds) FROM (
+            SELECT machine_id, stop_count, downtime_seconds FROM stop_rollups_daily
+            WHERE bucket >= %(d_start)s AND bucket < %(d_end)s{machine_filter}
+            UNION ALL
+            SELECT machine_id, stop_count, downtime_seconds FROM stop_rollups_hourly
+            WHERE ((bucket >= %(h_start)s AND bucket < %(d_start)s) OR (bucket >= %(d_end)s AND bucket < %(h_end)s)){machine_filter}
+            UNION ALL
+            SELECT machine_id,
+                   CASE WHEN start_time >= %(start)s THEN 1 ELSE 0 END,
+                   GREATEST(EXTRACT(EPOCH FROM LEAST(NOW(), %(end)s) - GREATEST(start_time, %(start)s)), 0)
+            FROM stops WHERE end_time IS NULL AND start_time < %(end)s{machine_filter}
+        ) x GROUP BY machine_id
+        """,
+        {"start": start, "end": end, "h_start": h_start, "h_end": h_end, "d_start": d_start, "d_end": d_end,
+         "ids": list(machine_ids or [])},
+    )
+    result = {machine_id: (int(count or 0), float(seconds or 0)) for machine_id, count, seconds in cur.fetchall()}
+    cur.close()
+    return result
@@ -1,58 +1,80 @@
-from fastapi import APIRouter, HTTPException
-from db import get_connection
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from datetime import datetime
+from listing import fetch_page_async, time_range, machine_scope, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT
+from db import get_db
+from json_response import FastJSONResponse
+from db_async import async_pool, get_adb
 import psycopg2.extras
+from response_cache import lines_cache
+from alarm_index import alarm_index
 
 router = APIRouter()
 
+ALARMS_FIELDS = ("id", "machine_id", "code", "description", "occurred_at", "cleared_at", "occurrences", "last_seen_at")
+
+UPDATE_SQL = """
+    UPDATE alarms SET machine_id=%s, code=%s, description=%s, occurred_at=%s, cleared_at=%s WHERE id=%s
+    RETURNING id, machine_id, code, cleared_at, COALESCE(last_seen_at, occurred_at) AS last_seen,
+              (SELECT line_id FROM machines WHERE id = alarms.machine_id) AS line_id
+"""
+
 @router.get("/")
-def get_alarms():
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM alarms")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return {"alarms": rows}
+async def get_alarms(machine_id: Optional[int] = None, line_id: Optional[int] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, after_id: Optional[int] = None, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT), fields: Optional[str] = None, aconn=Depends(get_adb)):
+    where = machine_scope(machine_id, line_id) + time_range("occurred_at", since, until)
+    rows, next_after_id = await fetch_page_async(aconn, "alarms", ALARMS_FIELDS, fields, after_id, limit, where)
+    return FastJSONResponse({"alarms": rows, "next_after_id": next_after_id})
+
+@router.get("/active")
+async def get_active_alarms():
+    # Open alarm counts from the in-memory index, no alarm history scan; a
+    # connection is only checked out while the index loads
+    counts = alarm_index.cached_counts()
+    if counts is None:
+        async with async_pool.connection() as aconn:
+            counts = await alarm_index.open_counts_async(aconn)
+    by_line, by_machine = counts
+    return FastJSONResponse({"open": sum(by_machine.values()), "by_line": by_line, "by_machine": by_machine})
 
 @router.get("/{alarm_id}")
-def get_alarm(alarm_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM alarms WHERE id = %s", (alarm_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+async def get_alarm(alarm_id: int, aconn=Depends(get_adb)):
+    row = await aconn.fetchrow("SELECT * FROM alarms WHERE id = %s", (alarm_id,))
     if row:
-        return {"alarm": row}
+        return FastJSONResponse({"alarm": row})
     raise HTTPException(status_code=404, detail="Alarm not found")
 
 @router.post("/")
-def create_alarm(alarm: dict):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO alarms (machine_id, code, description, occurred_at, cleared_at) VALUES (%s, %s, %s, %s, %s) RETURNING id", (alarm["machine_id"], alarm["code"], alarm.get("description"), alarm["occurred_at"], alarm.get("cleared_at")))
-    alarm_id = cur.fetchone()["id"]
+def create_alarm(alarm: dict, conn=Depends(get_db)):
+    # A repeat of a code the machine has open is folded into that alarm;
+    # the response names the alarm it was counted against
+    alarm_id, folded, change = alarm_index.observe(
+        conn, alarm["machine_id"], alarm["code"], alarm.get("description"), alarm["occurred_at"], alarm.get("cleared_at")
+    )
     conn.commit()
-    cur.close()
-    conn.close()
-    return {"id": alarm_id}
+    alarm_index.apply(change)
+    if not folded:
+        # Line summaries count open alarms
+        lines_cache.invalidate()
+    return {"id": alarm_id, "deduplicated": folded}
 
 @router.put("/{alarm_id}")
-def update_alarm(alarm_id: int, alarm: dict):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("UPDATE alarms SET machine_id=%s, code=%s, description=%s, occurred_at=%s, cleared_at=%s WHERE id=%s", (alarm["machine_id"], alarm["code"], alarm.get("description"), alarm["occurred_at"], alarm.get("cleared_at"), alarm_id))
+def update_alarm(alarm_id: int, alarm: dict, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(UPDATE_SQL, (alarm["machine_id"], alarm["code"], alarm.get("description"), alarm["occurred_at"], alarm.get("cleared_at"), alarm_id))
+    row = cur.fetchone()
     conn.commit()
     cur.close()
-    conn.close()
+    if row:
+        alarm_index.updated(row)
+    lines_cache.invalidate()
     return {"message": "Alarm updated"}
 
 @router.delete("/{alarm_id}")
-def delete_alarm(alarm_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def delete_alarm(alarm_id: int, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("DELETE FROM alarms WHERE id = %s", (alarm_id,))
     conn.commit()
     cur.close()
-    conn.close()
+    alarm_index.forget(alarm_id)
+    lines_cache.invalidate()
     return {"message": "Alarm deleted"} 
\ No newline at end of file
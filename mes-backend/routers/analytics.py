@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from datetime import datetime
+import psycopg2.extras
+from db import get_db
+from json_response import FastJSONResponse
+from auth import require_role
+from oee import compute_kpis
+from routers.shifts import resolve_window
+import rollups
+
+router = APIRouter()
+
+def reliability(planned, stops, downtime):
+    uptime = max(planned - downtime, 0.0)
+    return {
+        "stops": stops,
+        "downtime_seconds": round(downtime, 1),
+        "uptime_seconds": round(uptime, 1),
+        "mtbf_seconds": round(uptime / stops if stops else uptime, 1),
+        "mttr_seconds": round(downtime / stops, 1) if stops else 0.0,
+    }
+
+@router.get("/")
+def get_analytics(
+    group_by: str = Query("machine", pattern="^(machine|line)$"),
+    line_id: Optional[int] = None,
+    shift_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    conn=Depends(get_db),
+):
+    # MTBF, MTTR, availability and TRS per machine or per line over a window
+    # (explicit start/end, a shift, or the last 8 hours), read from the stop
+    # rollups at hour granularity plus any stops still open
+    now = datetime.now()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        start, end = resolve_window(cur, start, end, shift_id, now)
+        if line_id is not None:
+            cur.execute("SELECT id, name, line_id, counter_type, avg_pieces_per_sec FROM machines WHERE line_id = %s ORDER BY id", (line_id,))
+        else:
+            cur.execute("SELECT id, name, line_id, counter_type, avg_pieces_per_sec FROM machines ORDER BY id")
+        machines = cur.fetchall()
+    finally:
+        cur.close()
+    # Planned time only runs up to now for windows that are still in progress
+    planned = (min(end, now) - start).total_seconds()
+    machine_ids = [m["id"] for m in machines] if line_id is not None else None
+    stops = rollups.downtime_by_machine(conn, start, end, machine_ids)
+    downtime = {machine_id: seconds for machine_id, (_, seconds) in stops.items()}
+    kpis = compute_kpis(machines, downtime, planned) if planned > 0 else [{"availability": 0, "oee": 0}] * len(machines)
+
+    per_machine = []
+    for machine, kpi in zip(machines, kpis):
+        count, seconds = stops.get(machine["id"], (0, 0.0))
+        per_machine.append({
+            "machine_id": machine["id"],
+            "name": machine["name"],
+            "line_id": machine["line_id"],
+            **reliability(planned, count, seconds),
+            "availability": kpi["availability"],
+            "trs": kpi["oee"],
+        })
+
+    window = {"start": start, "end": end, "planned_seconds": planned}
+    if group_by == "machine":
+        return FastJSONResponse({"window": window, "machines": per_machine})
+
+    lines = {}
+    for row in per_machine:
+        lines.setdefault(row["line_id"], []).append(row)
+    per_line = []
+    for lid, rows in lines.items():
+        count = sum(r["stops"] for r in rows)
+        seconds = sum(r["downtime_seconds"] for r in rows)
+        summary = reliability(planned * len(rows), count, seconds)
+        summary["line_id"] = lid
+        summary["machines"] = len(rows)
+        summary["availability"] = round(sum(r["availability"] for r in rows) / len(rows), 2)
+        summary["trs"] = round(sum(r["trs"] for r in rows) / len(rows), 1)
+        per_line.append(summary)
+    return FastJSONResponse({"window": window, "lines": per_line})
+
+@router.post("/rebuild")
+def rebuild_rollups(user=Depends(require_role("Admin")), conn=Depends(get_db)):
+    # Recomputes every rollup bucket from the closed stops
+    return {"stops": rollups.rebuild(conn)}
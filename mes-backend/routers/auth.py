@@ -1,24 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from auth import create_access_token, verify_password
-from db import get_connection
+from starlette.concurrency import run_in_threadpool
+from auth import create_access_token, verify_password_async
+from db import connection
+from password_pool import login_limiter
 
 router = APIRouter()
 
+def fetch_login_user(username):
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+        user = cur.fetchone()
+        columns = [desc[0] for desc in cur.description]
+        cur.close()
+    return dict(zip(columns, user)) if user else None
+
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    conn = get_connection(cursor_factory=None)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = %s", (form_data.username,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
-    if not user or not verify_password(form_data.password, user[2]):  # password_hash is 3rd col
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # Async so a login storm only occupies the password process pool; the DB
+    # lookup still goes through the threadpool
+    client_ip = request.client.host if request.client else "unknown"
+    login_limiter.check(form_data.username, client_ip)
+    user_dict = await run_in_threadpool(fetch_login_user, form_data.username)
+    if not user_dict or not await verify_password_async(form_data.password, user_dict["password_hash"]):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    # Convert to dict if needed
-    columns = [desc[0] for desc in cur.description]
-    user_dict = dict(zip(columns, user))
     if user_dict["status"].lower() == "banned":
         raise HTTPException(status_code=403, detail="User is banned")
+    login_limiter.reset_user(form_data.username)
     access_token = create_access_token(data={"sub": user_dict["username"], "role": user_dict["role"]})
-    return {"access_token": access_token, "token_type": "bearer", "user": {"id": user_dict["id"], "username": user_dict["username"], "role": user_dict["role"], "email": user_dict["email"], "full_name": user_dict["full_name"]}} 
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer", "user": {"id": user_dict["id"], "username": user_dict["username"], "role": user_dict["role"], "email": user_dict["email"], "full_name": user_dict["full_name"]}}
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Query
+import psycopg2.extras
+from db import connection
+from json_response import FastJSONResponse
+from oee import attach_oee, compute_kpis
+from routers.shifts import shift_window
+import rollups
+from status_buffer import status_buffer
+
+router = APIRouter()
+
+# Seconds a computed summary is reused for the same range
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+RANGE_DAYS = {"7d": 7, "30d": 30}
+RECENT_STOPS = 8
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _mean(values, digits=1):
+    return round(sum(values) / len(values), digits) if values else None
+
+def _current_shift(shifts, now):
+    for shift in shifts:
+        if shift["start_time"] is None or shift["end_time"] is None:
+            continue
+        start, end = shift_window(shift, now)
+        if start <= now < end:
+            return {"id": shift["id"], "name": shift["name"], "line_id": shift["line_id"], "start": start, "end": end}
+    return None
+
+def build_summary(conn, days, now):
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    range_start = midnight - timedelta(days=days - 1)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute("SELECT id, name, line_id, status, counter_type, avg_pieces_per_sec FROM machines ORDER BY id")
+        machines = status_buffer.overlay(cur.fetchall())
+        cur.execute("SELECT COUNT(*) AS active FROM work_orders WHERE status ILIKE %s", ("%active%",))
+        active_orders = cur.fetchone()["active"]
+        cur.execute("SELECT id, name, line_id, start_time, end_time FROM shifts ORDER BY id")
+        shifts = cur.fetchall()
+        cur.execute(
+            "SELECT EXTRACT(HOUR FROM start_time)::int AS hour, COUNT(*) AS count FROM stops "
+            "WHERE start_time >= %s AND start_time < %s GROUP BY 1",
+            (midnight, midnight + timedelta(days=1)),
+        )
+        per_hour = {row["hour"]: row["count"] for row in cur.fetchall()}
+        cur.execute(
+            "SELECT s.id, s.machine_id, m.name AS machine_name, s.start_time, s.end_time, s.reason "
+            "FROM stops s LEFT JOIN machines m ON m.id = s.machine_id "
+            "ORDER BY s.start_time DESC LIMIT %s",
+            (RECENT_STOPS,),
+        )
+        recent_stops = cur.fetchall()
+        cur.execute(
+            "SELECT bucket, SUM(downtime_seconds) AS downtime FROM stop_rollups_daily "
+            "WHERE bucket >= %s AND bucket < %s GROUP BY bucket",
+            (range_start, midnight),
+        )
+        daily_downtime = {row["bucket"].date(): float(row["downtime"] or 0) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+    attach_oee(conn, machines, now=now)
+    oee_values = [float(m["oee"]) for m in machines]
+
+    # Reliability for today from the stop rollups, same definitions as /api/analytics
+    planned_today = (now - midnight).total_seconds()
+    today_stops = rollups.downtime_by_machine(conn, midnight, now)
+    downtime_today = {machine_id: seconds for machine_id, (_, seconds) in today_stops.items()}
+    mtbf, trs = [], []
+    if planned_today > 0:
+        for machine, kpi in zip(machines, compute_kpis(machines, downtime_today, planned_today)):
+            count, seconds = today_stops.get(machine["id"], (0, 0.0))
+            mtbf.append(max(planned_today - seconds, 0.0) / count if count else planned_today - seconds)
+            trs.append(kpi["oee"])
+
+    # Fleet availability per day of the range; today comes from the live numbers
+    availability_by_day = []
+    fleet = len(machines)
+    for offset in range(days):
+        day = (range_start + timedelta(days=offset)).date()
+        if day == midnight.date():
+            value = _mean([float(m["availability"]) for m in machines], 2)
+        else:
+            value = round(max(1 - daily_downtime.get(day, 0.0) / (fleet * 86400), 0.0) * 100, 2) if fleet else None
+        availability_by_day.append({"day": day.isoformat(), "value": value})
+
+    return {
+        "generated_at": now,
+        "range": {"days": days, "start": range_start, "end": now},
+        "machines": {"total": fleet, "running": sum(1 for m in machines if m["status"] == "RUNNING")},
+        "active_orders": active_orders,
+        "current_shift": _current_shift(shifts, now),
+        "oee": {
+            "avg": _mean(oee_values),
+            "max": max(oee_values) if oee_values else None,
+            "min": min(oee_values) if oee_values else None,
+            "quality": _mean([float(m["quality"]) for m in machines], 2),
+            "performance": _mean([float(m["performance"]) for m in machines], 2),
+            "availability": _mean([float(m["availability"]) for m in machines], 2),
+        },
+        "today": {
+            "mtbf_minutes": round(_mean(mtbf, 3) / 60, 1) if mtbf else None,
+            "trs": _mean(trs),
+            "avg_downtime_minutes": round(_mean(list(downtime_today.values()), 3) / 60, 1) if downtime_today else None,
+            "stops_per_hour": [{"hour": f"{h}:00", "count": per_hour.get(h, 0)} for h in range(24)],
+        },
+        "availability_by_day": availability_by_day,
+        "recent_stops": recent_stops,
+    }
+
+@router.get("/summary")
+def get_summary(date_range: str = Query("7d", alias="range", pattern="^(7d|30d)$")):
+    # Every aggregate the dashboard renders, from one DB session and reused
+    # for DASHBOARD_CACHE_TTL seconds per range; only a miss checks out a
+    # connection
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(date_range)
+        if hit and hit[0] > now:
+            return FastJSONResponse(hit[1])
+    with connection() as conn:
+        summary = build_summary(conn, RANGE_DAYS[date_range], datetime.now())
+    with _cache_lock:
+        _cache[date_range] = (now + DASHBOARD_CACHE_TTL, summary)
+    return FastJSONResponse(summary)
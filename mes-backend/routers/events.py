@@ -1,58 +1,50 @@
-from fastapi import APIRouter, HTTPException
-from db import get_connection
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from datetime import datetime
+from listing import fetch_page_async, time_range, machine_scope, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT
+from db import get_db
+from json_response import FastJSONResponse
+from db_async import get_adb
 import psycopg2.extras
 
 router = APIRouter()
 
+EVENTS_FIELDS = ("id", "machine_id", "work_order_id", "event_type", "description", "occurred_at")
+
 @router.get("/")
-def get_events():
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM events")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return {"events": rows}
+async def get_events(machine_id: Optional[int] = None, line_id: Optional[int] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, after_id: Optional[int] = None, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT), fields: Optional[str] = None, aconn=Depends(get_adb)):
+    where = machine_scope(machine_id, line_id) + time_range("occurred_at", since, until)
+    rows, next_after_id = await fetch_page_async(aconn, "events", EVENTS_FIELDS, fields, after_id, limit, where)
+    return FastJSONResponse({"events": rows, "next_after_id": next_after_id})
 
 @router.get("/{event_id}")
-def get_event(event_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+async def get_event(event_id: int, aconn=Depends(get_adb)):
+    row = await aconn.fetchrow("SELECT * FROM events WHERE id = %s", (event_id,))
     if row:
-        return {"event": row}
+        return FastJSONResponse({"event": row})
     raise HTTPException(status_code=404, detail="Event not found")
 
 @router.post("/")
-def create_event(event: dict):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def create_event(event: dict, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("INSERT INTO events (machine_id, work_order_id, event_type, description, occurred_at) VALUES (%s, %s, %s, %s, %s) RETURNING id", (event["machine_id"], event["work_order_id"], event["event_type"], event.get("description"), event["occurred_at"]))
     event_id = cur.fetchone()["id"]
     conn.commit()
     cur.close()
-    conn.close()
     return {"id": event_id}
 
 @router.put("/{event_id}")
-def update_event(event_id: int, event: dict):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def update_event(event_id: int, event: dict, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("UPDATE events SET machine_id=%s, work_order_id=%s, event_type=%s, description=%s, occurred_at=%s WHERE id=%s", (event["machine_id"], event["work_order_id"], event["event_type"], event.get("description"), event["occurred_at"], event_id))
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Event updated"}
 
 @router.delete("/{event_id}")
-def delete_event(event_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def delete_event(event_id: int, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("DELETE FROM events WHERE id = %s", (event_id,))
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Event deleted"} 
\ No newline at end of file
@@ -0,0 +1,132 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from psycopg import sql
+from typing import Optional
+from datetime import datetime
+import csv
+import io
+import os
+import threading
+import uuid
+import weakref
+from db import get_connection
+from json_response import dumps
+from listing import time_range, machine_scope
+from routers.events import EVENTS_FIELDS
+from routers.stops import STOPS_FIELDS
+from routers.alarms import ALARMS_FIELDS
+
+router = APIRouter()
+
+# Rows fetched per round trip from the server-side cursor, and rows per HTTP chunk
+EXPORT_FETCH_ROWS = int(os.getenv("EXPORT_FETCH_ROWS", "5000"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+# Exports streaming at once per worker; more are turned away with a 503
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+# resource -> (table, time column, exported columns)
+EXPORTS = {
+    "events": ("events", "occurred_at", EVENTS_FIELDS),
+    "stops": ("stops", "start_time", STOPS_FIELDS),
+    "alarms": ("alarms", "occurred_at", ALARMS_FIELDS),
+}
+
+def _csv_rows(columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(rows)
+    return buf.getvalue()
+
+def _ndjson_rows(columns, rows):
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+class ExportSlots:
+    # An export lasts as long as the download, so it runs on a connection of
+    # its own rather than one from the pool, and only a few run at once
+
+    def __init__(self, max_running=EXPORT_MAX_CONCURRENT):
+        self.max_running = max_running
+        self.running = 0
+        self.started = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Returns the release function; calling it more than once is harmless
+        with self.lock:
+            if self.running >= self.max_running:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Too many exports running, please retry", headers={"Retry-After": "5"})
+            self.running += 1
+            self.started += 1
+        released = []
+
+        def release():
+            with self.lock:
+                if not released:
+                    released.append(True)
+                    self.running -= 1
+
+        return release
+
+    def stats(self):
+        with self.lock:
+            return {"running": self.running, "max_running": self.max_running, "started": self.started, "rejected": self.rejected}
+
+export_slots = ExportSlots()
+
+def stream_rows(query, params, columns, fmt, release_slot):
+    # Sync generator, iterated by Starlette in the threadpool. The named
+    # cursor keeps only EXPORT_FETCH_ROWS rows in memory at a time.
+    encode = _csv_rows if fmt == "csv" else _ndjson_rows
+    conn = None
+    try:
+        if fmt == "csv":
+            yield _csv_rows(columns, [columns])
+        conn = get_connection()
+        cur = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+        cur.itersize = EXPORT_FETCH_ROWS
+        cur.execute(query.as_string(), params)
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield encode(columns, rows)
+        cur.close()
+        conn.rollback()
+    finally:
+        if conn is not None:
+            conn.close()
+        release_slot()
+
+@router.get("/{resource}")
+def export_rows(
+    resource: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    machine_id: Optional[int] = None,
+    line_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    if resource not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export {resource!r}")
+    table, time_column, columns = EXPORTS[resource]
+    where = machine_scope(machine_id, line_id) + time_range(time_column, since, until)
+    query = sql.SQL("SELECT {} FROM {}").format(
+        sql.SQL(", ").join(sql.Identifier(c) for c in columns), sql.Identifier(table)
+    )
+    if where:
+        query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(clause for clause, _ in where)
+    query += sql.SQL(" ORDER BY id")
+    params = [value for _, value in where]
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"{resource}.{format}"
+    release_slot = export_slots.acquire()
+    body = stream_rows(query, params, list(columns), format, release_slot)
+    # A download dropped before its first chunk never runs the generator
+    weakref.finalize(body, release_slot)
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
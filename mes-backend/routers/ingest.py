@@ -0,0 +1,158 @@
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+import json
+import os
+import psycopg2
+import psycopg2.extras
+from db import connection
+from stop_tracker import stop_tracker
+from alarm_index import alarm_index
+from response_cache import lines_cache, machines_cache
+import rollups
+
+router = APIRouter()
+
+INGEST_MAX_RECORDS = int(os.getenv("INGEST_MAX_RECORDS", "50000"))
+
+# kind -> (table, required columns, optional columns)
+RECORD_KINDS = {
+    "event": ("events", ("machine_id", "work_order_id", "event_type", "occurred_at"), ("description",)),
+    "alarm": ("alarms", ("machine_id", "code", "occurred_at"), ("description", "cleared_at")),
+    "stop": ("stops", ("machine_id", "start_time"), ("reason", "end_time")),
+}
+# Columns filled in by the writer rather than taken from the record
+DERIVED_COLUMNS = {"alarm": ("occurrences", "last_seen_at")}
+
+# Open stops (no end_time) go in with the stop tracker's guard: a machine
+# never gets a second open stop
+OPEN_STOPS_SQL = """
+    INSERT INTO stops (machine_id, start_time, reason)
+    SELECT v.machine_id, v.start_time, v.reason FROM (VALUES %s) AS v(machine_id, start_time, reason)
+    WHERE NOT EXISTS (SELECT 1 FROM stops s WHERE s.machine_id = v.machine_id AND s.end_time IS NULL)
+    RETURNING machine_id, id
+"""
+
+def parse_records(body, content_type):
+    # Accepts a JSON array, {"records": [...]}, or NDJSON (one record per line)
+    text = body.decode("utf-8")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("records", [])
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of records")
+    return data
+
+def validate(record):
+    if not isinstance(record, dict):
+        return None, "Record must be an object"
+    kind = record.get("kind")
+    if kind not in RECORD_KINDS:
+        return None, f"Unknown kind {kind!r}, expected one of {', '.join(RECORD_KINDS)}"
+    table, required, optional = RECORD_KINDS[kind]
+    missing = [col for col in required if col not in record]
+    if missing:
+        return None, f"Missing required field(s): {', '.join(missing)}"
+    return tuple(record.get(col) for col in required + optional), None
+
+def write_batch(records):
+    results = [None] * len(records)
+    grouped = {kind: [] for kind in RECORD_KINDS}
+    for index, record in enumerate(records):
+        values, error = validate(record)
+        if error:
+            results[index] = {"index": index, "status": "error", "error": error}
+        else:
+            grouped[record["kind"]].append((index, values))
+    # At most one open stop per machine in the batch; closed stops are
+    # inserted with the other records
+    open_stops, closed = {}, []
+    for index, values in grouped["stop"]:
+        machine_id, start_time, reason, end_time = values
+        if end_time is not None:
+            closed.append((index, values))
+        elif machine_id in open_stops:
+            results[index] = {"index": index, "status": "error", "error": f"Machine {machine_id} has another open stop in this batch"}
+        else:
+            open_stops[machine_id] = (index, (machine_id, start_time, reason))
+    grouped["stop"] = closed
+    opened_stops = []
+    closed_stops = []
+    folded, alarm_counts = [], {}
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            if grouped["alarm"]:
+                # Repeats of open alarms, and of each other within the batch,
+                # are counted instead of inserted
+                alarm_index.ensure_loaded(conn)
+                grouped["alarm"], folded, alarm_counts = alarm_index.collapse(grouped["alarm"])
+            for kind, rows in grouped.items():
+                if not rows:
+                    continue
+                table, required, optional = RECORD_KINDS[kind]
+                columns = ", ".join(required + optional + DERIVED_COLUMNS.get(kind, ()))
+                # One multi-row INSERT per kind; RETURNING keeps VALUES order
+                ids = psycopg2.extras.execute_values(
+                    cur,
+                    f"INSERT INTO {table} ({columns}) VALUES %s RETURNING id",
+                    [values for _, values in rows],
+                    page_size=len(rows),
+                    fetch=True,
+                )
+                for (index, values), (record_id,) in zip(rows, ids):
+                    results[index] = {"index": index, "status": "ok", "kind": kind, "id": record_id}
+                    if kind == "stop":
+                        closed_stops.append(record_id)
+            if open_stops:
+                inserted = dict(psycopg2.extras.execute_values(
+                    cur,
+                    OPEN_STOPS_SQL,
+                    [values for _, values in open_stops.values()],
+                    template="(%s::int, %s::timestamp, %s)",
+                    page_size=len(open_stops),
+                    fetch=True,
+                ))
+                for machine_id, (index, _) in open_stops.items():
+                    stop_id = inserted.get(machine_id)
+                    if stop_id is None:
+                        results[index] = {"index": index, "status": "error", "error": f"Machine {machine_id} already has an open stop"}
+                    else:
+                        results[index] = {"index": index, "status": "ok", "kind": "stop", "id": stop_id}
+                        opened_stops.append((machine_id, stop_id))
+            for index, target, target_is_row in folded:
+                alarm_id = results[target]["id"] if target_is_row else target
+                results[index] = {"index": index, "status": "ok", "kind": "alarm", "id": alarm_id, "deduplicated": True}
+            rollups.add_stops(cur, closed_stops)
+            conn.commit()
+        except psycopg2.Error as exc:
+            conn.rollback()
+            raise HTTPException(status_code=400, detail=f"Batch rejected, nothing was written: {exc.pgerror or exc}")
+        finally:
+            cur.close()
+    for machine_id, stop_id in opened_stops:
+        stop_tracker.stop_changed(machine_id, stop_id, True)
+    alarm_index.count(alarm_counts)
+    if grouped["alarm"]:
+        # New rows: reload the open alarms rather than track each one here
+        alarm_index.invalidate()
+        lines_cache.invalidate()
+    if closed_stops or opened_stops:
+        machines_cache.invalidate()
+    return results
+
+@router.post("/")
+async def ingest(request: Request):
+    # Bulk ingest for PLC gateways: mixed events, alarms and stops written in
+    # one transaction. Invalid records are reported per index and skipped.
+    body = await request.body()
+    try:
+        records = parse_records(body, request.headers.get("content-type", ""))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {exc}")
+    if len(records) > INGEST_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {INGEST_MAX_RECORDS} records per request")
+    results = await run_in_threadpool(write_batch, records)
+    accepted = sum(1 for r in results if r["status"] == "ok")
+    return {"accepted": accepted, "rejected": len(results) - accepted, "results": results}
@@ -1,107 +1,54 @@
-from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
+from fastapi import APIRouter, HTTPException, Depends, Request
+from db import get_db
+from json_response import FastJSONResponse
+from db_async import get_adb, async_pool
 import psycopg2.extras
 from auth import require_role
-from datetime import datetime, timedelta
+from oee import attach_oee, attach_oee_async
+from stop_tracker import stop_tracker
+from timeline_store import timeline_store
+from response_cache import lines_cache, machines_cache
+from status_buffer import status_buffer
+from alarm_index import alarm_index
+from datetime import datetime
 
 router = APIRouter()
 
-@router.get("/")
-def get_machines():
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def fetch_machines(conn):
+    # Sync variant for threads outside the request cycle (the SSE broker)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("SELECT * FROM machines")
     machines = cur.fetchall()
-    # For each machine, calculate OEE dynamically
-    for machine in machines:
-        machine_id = machine["id"]
-        # Get planned production time (assume 8h shift = 28800s for now)
-        planned_time = 8 * 60 * 60
-        # Get downtime from stops
-        shift_start = datetime.now() - timedelta(hours=8)
-        cur.execute(
-            "SELECT SUM(EXTRACT(EPOCH FROM (COALESCE(end_time, NOW()) - start_time))) as downtime "
-            "FROM stops WHERE machine_id = %s AND start_time >= %s",
-            (machine_id, shift_start)
-        )
-        downtime = cur.fetchone()["downtime"] or 0
-        operating_time = planned_time - downtime
-        if operating_time < 0:
-            operating_time = 0
-        # Get actual output (pieces produced)
-        if machine["counter_type"] == "status":
-            actual_output = operating_time  # 1 piece/sec
-        else:
-            actual_output = (machine["avg_pieces_per_sec"] or 0) * operating_time
-        # Theoretical output (ideal)
-        if machine["counter_type"] == "status":
-            theoretical_output = planned_time  # 1 piece/sec
-        else:
-            theoretical_output = (machine["avg_pieces_per_sec"] or 0) * planned_time
-        # OEE components
-        availability = operating_time / planned_time if planned_time > 0 else 0
-        performance = (actual_output / theoretical_output) if theoretical_output > 0 else 0
-        quality = 1  # Assume 100% good pieces
-        # Ensure all are float for multiplication
-        oee = float(availability) * float(performance) * float(quality) * 100
-        print(f"[OEE DEBUG] Machine {machine_id}: planned_time={planned_time}, downtime={downtime}, operating_time={operating_time}, actual_output={actual_output}, theoretical_output={theoretical_output}, availability={availability}, performance={performance}, oee={oee}")
-        machine["oee"] = round(oee, 1)
-        machine["availability"] = round(float(availability) * 100, 2)
-        machine["performance"] = round(float(performance) * 100, 2)
-        machine["quality"] = round(float(quality) * 100, 2)
     cur.close()
-    conn.close()
-    return {"machines": machines}
+    return attach_oee(conn, status_buffer.overlay(machines))
+
+async def fetch_machines_async(aconn):
+    machines = await aconn.fetch("SELECT * FROM machines")
+    return await attach_oee_async(aconn, status_buffer.overlay(machines))
+
+@router.get("/")
+async def get_machines(request: Request):
+    # Polled by every shop-floor screen: requests within MACHINES_CACHE_TTL
+    # of each other, or arriving while one is computing, share one result
+    async def build():
+        async with async_pool.connection() as aconn:
+            return {"machines": await fetch_machines_async(aconn)}
+    return await machines_cache.respond_async(request, build)
 
 @router.get("/{machine_id}")
-def get_machine(machine_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM machines WHERE id = %s", (machine_id,))
-    machine = cur.fetchone()
+async def get_machine(machine_id: int, aconn=Depends(get_adb)):
+    machine = await aconn.fetchrow("SELECT * FROM machines WHERE id = %s", (machine_id,))
     if not machine:
-        cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Machine not found")
-    # Calculate OEE dynamically for this machine
-    planned_time = 8 * 60 * 60
-    shift_start = datetime.now() - timedelta(hours=8)
-    cur.execute(
-        "SELECT SUM(EXTRACT(EPOCH FROM (COALESCE(end_time, NOW()) - start_time))) as downtime "
-        "FROM stops WHERE machine_id = %s AND start_time >= %s",
-        (machine_id, shift_start)
-    )
-    downtime = cur.fetchone()["downtime"] or 0
-    operating_time = planned_time - downtime
-    if operating_time < 0:
-        operating_time = 0
-    if machine["counter_type"] == "status":
-        actual_output = operating_time
-    else:
-        actual_output = (machine["avg_pieces_per_sec"] or 0) * operating_time
-    if machine["counter_type"] == "status":
-        theoretical_output = planned_time
-    else:
-        theoretical_output = (machine["avg_pieces_per_sec"] or 0) * planned_time
-    availability = operating_time / planned_time if planned_time > 0 else 0
-    performance = (actual_output / theoretical_output) if theoretical_output > 0 else 0
-    quality = 1
-    oee = float(availability) * float(performance) * float(quality) * 100
-    machine["oee"] = round(oee, 1)
-    machine["availability"] = round(float(availability) * 100, 2)
-    machine["performance"] = round(float(performance) * 100, 2)
-    machine["quality"] = round(float(quality) * 100, 2)
-    cur.close()
-    conn.close()
-    return {"machine": machine}
+    await attach_oee_async(aconn, status_buffer.overlay([machine]))
+    return FastJSONResponse({"machine": machine})
 
 @router.post("/")
-def create_machine(machine: dict, user=Depends(require_role("Admin", "Moderator"))):
+def create_machine(machine: dict, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
     avg_pieces_per_sec = machine.get("avg_pieces_per_sec")
     if avg_pieces_per_sec == "":
         avg_pieces_per_sec = None
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("INSERT INTO machines (name, line_id, status, type, counter_type, avg_pieces_per_sec, product_id) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id", (
         machine["name"],
         machine["line_id"],
@@ -112,18 +59,20 @@ def create_machine(machine: dict, user=Depends(require_role("Admin", "Moderator"
         machine.get("productId")
     ))
     machine_id = cur.fetchone()["id"]
-    conn.commit()
     cur.close()
-    conn.close()
+    status_change = timeline_store.record(conn, machine_id, machine["status"])
+    conn.commit()
+    timeline_store.apply(status_change)
+    lines_cache.invalidate()
+    machines_cache.invalidate()
     return {"id": machine_id}
 
 @router.put("/{machine_id}")
-def update_machine(machine_id: int, machine: dict, user=Depends(require_role("Admin", "Moderator"))):
+def update_machine(machine_id: int, machine: dict, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
     avg_pieces_per_sec = machine.get("avg_pieces_per_sec")
     if avg_pieces_per_sec == "":
         avg_pieces_per_sec = None
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("UPDATE machines SET name=%s, line_id=%s, status=%s, type=%s, counter_type=%s, avg_pieces_per_sec=%s, product_id=%s WHERE id=%s", (
         machine["name"],
         machine["line_id"],
@@ -134,17 +83,51 @@ def update_machine(machine_id: int, machine: dict, user=Depends(require_role("Ad
         machine.get("productId"),
         machine_id
     ))
-    conn.commit()
     cur.close()
-    conn.close()
+    # Stops and status history are written in the same transaction as the status
+    stop_change = stop_tracker.observe(conn, machine_id, machine["status"])
+    status_change = timeline_store.record(conn, machine_id, machine["status"])
+    # Superseded before the commit, so a flush racing this update drops the
+    # older reports instead of overwriting it
+    status_buffer.forget_machine(machine_id)
+    conn.commit()
+    stop_tracker.apply(stop_change)
+    timeline_store.apply(status_change)
+    alarm_index.machine_moved(machine_id, machine["line_id"])
+    # Line summaries carry machine counts and running status
+    lines_cache.invalidate()
+    machines_cache.invalidate()
     return {"message": "Machine updated"}
 
+@router.put("/{machine_id}/status", status_code=202)
+def report_status(machine_id: int, report: dict, user=Depends(require_role("Admin", "Moderator"))):
+    # High-frequency status path for gateways and the simulator: buffered in
+    # memory and written in batches by status_buffer, visible to reads at once
+    status = report.get("status")
+    if not isinstance(status, str) or not status:
+        raise HTTPException(status_code=400, detail="status is required")
+    at = None
+    if report.get("at"):
+        try:
+            at = datetime.fromisoformat(report["at"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="at must be an ISO 8601 timestamp")
+        if at.tzinfo is not None:
+            # The buffer, the trackers and the tables use naive local time
+            at = at.astimezone().replace(tzinfo=None)
+    changed = status_buffer.report(machine_id, status, at)
+    return {"id": machine_id, "status": status, "changed": changed}
+
 @router.delete("/{machine_id}")
-def delete_machine(machine_id: int, user=Depends(require_role("Admin"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def delete_machine(machine_id: int, user=Depends(require_role("Admin")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("DELETE FROM machines WHERE id = %s", (machine_id,))
     conn.commit()
     cur.close()
-    conn.close()
+    stop_tracker.forget_machine(machine_id)
+    timeline_store.forget_machine(machine_id)
+    status_buffer.forget_machine(machine_id)
+    alarm_index.forget_machine(machine_id)
+    lines_cache.invalidate()
+    machines_cache.invalidate()
     return {"message": "Machine deleted"} 
\ No newline at end of file
@@ -1,124 +1,106 @@
-from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
+from fastapi import APIRouter, HTTPException, Depends, Request
+from db import get_db
+from json_response import FastJSONResponse
+from db_async import get_adb, async_pool
 import psycopg2.extras
 from auth import require_role
+from oee import line_oee_async
+from timeline_store import timeline_store, grid_rows
+from routers.shifts import resolve_window_async
+from response_cache import lines_cache
+from alarm_index import alarm_index
+from status_buffer import status_buffer
+from typing import Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/api/production-lines", tags=["production-lines"])
 
-@router.get("/")
-def get_lines():
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM production_lines")
-    rows = cur.fetchall()
-    # For each line, add dummy/default values for oee, machines, alarms, lastProduction
+LINE_SUMMARY_SQL = """
+    SELECT pl.*, ph.label AS last_production_label
+    FROM production_lines pl
+    LEFT JOIN LATERAL (
+        SELECT label FROM production_history WHERE line_id = pl.id ORDER BY id DESC LIMIT 1
+    ) ph ON TRUE
+    ORDER BY pl.id
+"""
+
+# Machine status is aggregated after the status buffer overlay, so a line
+# reads the same statuses as /api/machines/ before the next flush
+LINE_MACHINES_SQL = "SELECT id, line_id, status FROM machines WHERE line_id IS NOT NULL"
+
+async def load_lines(aconn):
+    # Lines with their last production in one query, machine counts and
+    # status from one scan of machines, plus a set-based OEE pass, so cost
+    # does not grow with the number of lines. Open alarms come from the
+    # in-memory alarm index.
+    rows = await aconn.fetch(LINE_SUMMARY_SQL)
+    machine_count, running = {}, set()
+    for machine in status_buffer.overlay(await aconn.fetch(LINE_MACHINES_SQL)):
+        machine_count[machine["line_id"]] = machine_count.get(machine["line_id"], 0) + 1
+        if machine["status"] == "RUNNING":
+            running.add(machine["line_id"])
+    oee_by_line = await line_oee_async(aconn)
+    alarms_by_line, _ = await alarm_index.open_counts_async(aconn)
     for line in rows:
-        # OEE: dummy value or fetch real if available
-        line["oee"] = 85  # Replace with real calculation if available
-        # Machines: count of machines assigned to this line
-        cur.execute("SELECT COUNT(*) as count FROM machines WHERE line_id = %s", (line["id"],))
-        line["machines"] = cur.fetchone()["count"]
-        # Alarms: count of alarms for this line's machines
-        cur.execute("SELECT COUNT(*) as count FROM alarms WHERE machine_id IN (SELECT id FROM machines WHERE line_id = %s)", (line["id"],))
-        line["alarms"] = cur.fetchone()["count"]
-        # Last Production: dummy value or fetch real if available
-        line["lastProduction"] = "-"  # Replace with real value if available
-        # Set line status based on machines
-        cur.execute("SELECT status FROM machines WHERE line_id = %s", (line["id"],))
-        machine_statuses = [row["status"] for row in cur.fetchall()]
-        if any(status == "RUNNING" for status in machine_statuses):
-            line["status"] = "RUNNING"
-        else:
-            line["status"] = "STOPPED"
-    cur.close()
-    conn.close()
+        line["oee"] = oee_by_line.get(line["id"], 0)
+        line["machines"] = machine_count.get(line["id"], 0)
+        line["alarms"] = alarms_by_line.get(line["id"], 0)
+        line["lastProduction"] = line.pop("last_production_label") or "-"
+        line["status"] = "RUNNING" if line["id"] in running else "STOPPED"
     return {"production_lines": rows}
 
+@router.get("/")
+async def get_lines(request: Request):
+    async def build():
+        # Only a cache miss checks out a connection
+        async with async_pool.connection() as aconn:
+            return await load_lines(aconn)
+    return await lines_cache.respond_async(request, build)
+
 @router.get("/{line_id}")
-def get_production_line(line_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, oee, shift_quantity, description, status, created_at FROM production_lines WHERE id = %s", (line_id,))
-    row = cur.fetchone()
-    if not row:
+async def get_production_line(line_id: int, aconn=Depends(get_adb)):
+    line = await aconn.fetchrow("SELECT id, name, oee, shift_quantity, description, status, created_at FROM production_lines WHERE id = %s", (line_id,))
+    if not line:
         raise HTTPException(status_code=404, detail="Production line not found")
-    line = {
-        "id": row[0],
-        "name": row[1],
-        "oee": row[2],
-        "shift_quantity": row[3],
-        "description": row[4],
-        "status": row[5],
-        "created_at": row[6],
-    }
-    # Fetch batch info
-    cur.execute("SELECT id, name, current, target, elapsed FROM batches WHERE line_id = %s ORDER BY id DESC LIMIT 1", (line_id,))
-    batch = cur.fetchone()
-    if batch:
-        line["batch"] = {
-            "id": batch[0], "name": batch[1], "current": batch[2], "target": batch[3], "elapsed": batch[4]
-        }
-    else:
-        line["batch"] = None
-    # Fetch history
-    cur.execute("SELECT code, label, qty FROM production_history WHERE line_id = %s ORDER BY id DESC LIMIT 10", (line_id,))
-    history = [{"code": h[0], "label": h[1], "qty": h[2]} for h in cur.fetchall()]
-    line["history"] = history
-    cur.close()
-    conn.close()
-    return {"production_line": line}
+    line["batch"] = await aconn.fetchrow("SELECT id, name, current, target, elapsed FROM batches WHERE line_id = %s ORDER BY id DESC LIMIT 1", (line_id,))
+    line["history"] = await aconn.fetch("SELECT code, label, qty FROM production_history WHERE line_id = %s ORDER BY id DESC LIMIT 10", (line_id,))
+    return FastJSONResponse({"production_line": line})
 
 @router.get("/{line_id}/timeline")
-def get_production_line_timeline(line_id: int):
-    # This should return the rows/segments/markers for the timeline grid
-    # For now, return dummy data similar to your frontend
-    rows = [
-        {
-            "id": "08",
-            "kpi": "24/43",
-            "kpiColor": "text-white",
-            "segments": [
-                {"start": 0, "end": 180, "status": "STOP", "label": "Product changeover"},
-                {"start": 180, "end": 300, "status": "RUNNING"},
-                {"start": 300, "end": 330, "status": "STOP", "label": "Unplanned"},
-                {"start": 330, "end": 360, "status": "SPEED_LOSS"},
-                {"start": 360, "end": 480, "status": "STOP", "label": "Material shortage"},
-            ],
-            "markers": [{"time": 200, "tooltip": ""}, {"time": 220, "tooltip": ""}]
-        },
-        # ... more rows can be added here ...
-    ]
-    return {"rows": rows}
+async def get_production_line_timeline(line_id: int, shift_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, aconn=Depends(get_adb)):
+    now = datetime.now()
+    start, end = await resolve_window_async(aconn, start, end, shift_id, now)
+    machines = await aconn.fetch("SELECT id, name FROM machines WHERE line_id = %s ORDER BY id", (line_id,))
+    segments = await timeline_store.segments_async(aconn, [m["id"] for m in machines], start, end) if machines else {}
+    rows, total_minutes = grid_rows(machines, segments, start, end, now)
+    return FastJSONResponse({"rows": rows, "start": start, "end": end, "total_minutes": total_minutes})
 
 @router.post("/")
-def create_line(line: dict, user=Depends(require_role("Admin", "Moderator"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def create_line(line: dict, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("INSERT INTO production_lines (name, description, status) VALUES (%s, %s, %s) RETURNING id", (line["name"], line.get("description"), line["status"]))
     line_id = cur.fetchone()["id"]
     conn.commit()
     cur.close()
-    conn.close()
+    lines_cache.invalidate()
     return {"id": line_id}
 
 @router.put("/{line_id}")
-def update_line(line_id: int, line: dict, user=Depends(require_role("Admin", "Moderator"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def update_line(line_id: int, line: dict, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("UPDATE production_lines SET name=%s, description=%s, status=%s WHERE id=%s", (line["name"], line.get("description"), line["status"], line_id))
     conn.commit()
     cur.close()
-    conn.close()
+    lines_cache.invalidate()
     return {"message": "Production line updated"}
 
 @router.delete("/{line_id}")
-def delete_line(line_id: int, user=Depends(require_role("Admin"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def delete_line(line_id: int, user=Depends(require_role("Admin")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("DELETE FROM production_lines WHERE id = %s", (line_id,))
     conn.commit()
     cur.close()
-    conn.close()
+    lines_cache.invalidate()
     return {"message": "Production line deleted"}
 
 @router.get("/simulate")
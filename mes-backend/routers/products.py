@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException
-from db import get_connection
+from fastapi import APIRouter, Depends, HTTPException, Request
+from db import get_db, connection
+from response_cache import products_cache
 from auth import require_role
 from pydantic import BaseModel
 from typing import Optional
@@ -17,20 +18,21 @@ class ProductOut(ProductIn):
     created_at: datetime
     updated_at: datetime
 
-@router.get("/")
-def get_products():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, description, status, created_at, updated_at FROM products")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+def load_products():
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, name, description, status, created_at, updated_at FROM products")
+        rows = cur.fetchall()
+        cur.close()
     keys = ["id", "name", "description", "status", "created_at", "updated_at"]
     return {"products": [dict(zip(keys, row)) for row in rows]}
 
+@router.get("/")
+def get_products(request: Request):
+    return products_cache.respond(request, load_products)
+
 @router.post("/")
-def create_product(product: ProductIn, user=Depends(require_role("Admin", "Moderator"))):
-    conn = get_connection()
+def create_product(product: ProductIn, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
     cur = conn.cursor()
     now = datetime.now()
     cur.execute(
@@ -43,18 +45,16 @@ def create_product(product: ProductIn, user=Depends(require_role("Admin", "Moder
     row = cur.fetchone()
     conn.commit()
     cur.close()
-    conn.close()
+    products_cache.invalidate()
     return {"id": row[0], "created_at": row[1], "updated_at": row[2]}
 
 @router.put("/{product_id}")
-def update_product(product_id: int, product: ProductIn, user=Depends(require_role("Admin", "Moderator"))):
-    conn = get_connection()
+def update_product(product_id: int, product: ProductIn, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
     cur = conn.cursor()
     now = datetime.now()
     cur.execute("SELECT id FROM products WHERE id=%s", (product_id,))
     if not cur.fetchone():
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Product not found")
     cur.execute(
         """
@@ -64,19 +64,17 @@ def update_product(product_id: int, product: ProductIn, user=Depends(require_rol
     )
     conn.commit()
     cur.close()
-    conn.close()
+    products_cache.invalidate()
     return {"message": "Product updated"}
 
 @router.delete("/{product_id}")
-def delete_product(product_id: int, user=Depends(require_role("Admin"))):
-    conn = get_connection()
+def delete_product(product_id: int, user=Depends(require_role("Admin")), conn=Depends(get_db)):
     cur = conn.cursor()
     cur.execute("DELETE FROM products WHERE id=%s", (product_id,))
     if cur.rowcount == 0:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Product not found")
     conn.commit()
     cur.close()
-    conn.close()
+    products_cache.invalidate()
     return {"message": "Product deleted"} 
\ No newline at end of file
@@ -1,16 +1,24 @@
 from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
-import psycopg2.extras
-import bcrypt
-from auth import get_current_user
+from starlette.concurrency import run_in_threadpool
+from db import connection
+from auth import get_current_user, get_password_hash_async, principal_cache
+from response_cache import users_cache
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
+def apply_profile(user_id, fields, values):
+    with connection() as conn:
+        cur = conn.cursor()
+        sql = f"UPDATE users SET {', '.join(fields)} WHERE id=%s"
+        cur.execute(sql, tuple(values) + (user_id,))
+        conn.commit()
+        cur.close()
+
 @router.put("/profile")
-def update_profile(data: dict, current_user: dict = Depends(get_current_user)):
+async def update_profile(data: dict, current_user: dict = Depends(get_current_user)):
+    # Async so a password change only occupies the password process pool;
+    # the update goes through the threadpool
     user_id = current_user["id"]
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
     fields = []
     values = []
     if "full_name" in data and data["full_name"]:
@@ -23,17 +31,12 @@ def update_profile(data: dict, current_user: dict = Depends(get_current_user)):
         fields.append("email=%s")
         values.append(data["email"])
     if "password" in data and data["password"]:
-        password_hash = bcrypt.hashpw(data["password"].encode(), bcrypt.gensalt()).decode()
+        password_hash = await get_password_hash_async(data["password"])
         fields.append("password_hash=%s")
         values.append(password_hash)
     if not fields:
-        cur.close()
-        conn.close()
         return {"message": "No fields to update"}
-    sql = f"UPDATE users SET {', '.join(fields)} WHERE id=%s"
-    values.append(user_id)
-    cur.execute(sql, tuple(values))
-    conn.commit()
-    cur.close()
-    conn.close()
-    return {"message": "Profile updated"} 
\ No newline at end of file
+    await run_in_threadpool(apply_profile, user_id, fields, values)
+    principal_cache.invalidate(user_id=user_id)
+    users_cache.invalidate()
+    return {"message": "Profile updated"}
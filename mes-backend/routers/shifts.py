@@ -1,41 +1,140 @@
-from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from typing import Optional
+from listing import fetch_page, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT
+from db import get_db, connection
+from json_response import FastJSONResponse
 import psycopg2.extras
+from psycopg import sql
+from datetime import datetime, time, timedelta
 from auth import require_role
+from response_cache import shifts_cache
 
 router = APIRouter()
 
+def shift_window(shift, now=None):
+    # Concrete [start, end) datetimes for a shift row. Shifts stored as times
+    # of day are placed on the occurrence that contains (or last ended before)
+    # now; an end at or before the start means the shift crosses midnight.
+    start, end = shift["start_time"], shift["end_time"]
+    if isinstance(start, str):
+        start = datetime.fromisoformat(start) if "T" in start or "-" in start else time.fromisoformat(start)
+    if isinstance(end, str):
+        end = datetime.fromisoformat(end) if "T" in end or "-" in end else time.fromisoformat(end)
+    if isinstance(start, datetime) and isinstance(end, datetime):
+        return start, end
+    now = now or datetime.now()
+    start_dt = datetime.combine(now.date(), start)
+    end_dt = datetime.combine(now.date(), end)
+    if end_dt <= start_dt:
+        end_dt += timedelta(days=1)
+    if start_dt > now:
+        start_dt -= timedelta(days=1)
+        end_dt -= timedelta(days=1)
+    return start_dt, end_dt
+
+def _local_naive(ts):
+    # Stored timestamps are naive local time; clients may send UTC ("...Z")
+    return ts.astimezone().replace(tzinfo=None) if ts is not None and ts.tzinfo else ts
+
+def window_for(start, end, shift, now):
+    # Report window: the shift's boundaries if a shift row is given, else
+    # start/end, defaulting to the 8 hours up to now
+    start, end = _local_naive(start), _local_naive(end)
+    if shift is not None:
+        start, end = shift_window(shift, now)
+    end = end or now
+    start = start or end - timedelta(hours=8)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    return start, end
+
+def resolve_window(cur, start, end, shift_id, now):
+    shift = None
+    if shift_id is not None:
+        cur.execute("SELECT start_time, end_time FROM shifts WHERE id = %s", (shift_id,))
+        shift = cur.fetchone()
+        if not shift:
+            raise HTTPException(status_code=404, detail="Shift not found")
+    return window_for(start, end, shift, now)
+
+async def resolve_window_async(aconn, start, end, shift_id, now):
+    shift = None
+    if shift_id is not None:
+        shift = await aconn.fetchrow("SELECT start_time, end_time FROM shifts WHERE id = %s", (shift_id,))
+        if not shift:
+            raise HTTPException(status_code=404, detail="Shift not found")
+    return window_for(start, end, shift, now)
+
+SHIFTS_FIELDS = ("id", "line_id", "name", "start_time", "end_time", "shift_quantity", "operator", "duration")
+
 @router.get("/")
-def get_shifts():
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM shifts")
+def get_shifts(request: Request, line_id: Optional[int] = None, after_id: Optional[int] = None, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT), fields: Optional[str] = None):
+    def build():
+        where = [(sql.SQL("line_id = %s"), line_id)] if line_id is not None else []
+        with connection() as conn:
+            rows, next_after_id = fetch_page(conn, "shifts", SHIFTS_FIELDS, fields, after_id, limit, where)
+        return {"shifts": rows, "next_after_id": next_after_id}
+    return shifts_cache.respond(request, build)
+
+OEE_FIELDS = "machine_id, shift_id, shift_start, shift_end, planned_seconds, downtime_seconds, good_count, reject_count, ideal_rate, availability, performance, quality, oee, frozen, updated_at"
+
+@router.get("/oee")
+def get_shift_oee_history(machine_id: Optional[int] = None, line_id: Optional[int] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT), conn=Depends(get_db)):
+    # Materialized per-machine-per-shift OEE, newest first
+    where, params = [], []
+    if machine_id is not None:
+        where.append("machine_id = %s")
+        params.append(machine_id)
+    if line_id is not None:
+        where.append("machine_id IN (SELECT id FROM machines WHERE line_id = %s)")
+        params.append(line_id)
+    if since is not None:
+        where.append("shift_start >= %s")
+        params.append(since)
+    if until is not None:
+        where.append("shift_start < %s")
+        params.append(until)
+    query = f"SELECT {OEE_FIELDS} FROM shift_oee"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY shift_start DESC, machine_id LIMIT %s"
+    params.append(limit)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    cur.close()
+    return FastJSONResponse({"shift_oee": rows})
+
+@router.get("/{shift_id}/oee")
+def get_shift_oee(shift_id: int, shift_start: Optional[datetime] = None, conn=Depends(get_db)):
+    # One occurrence of a shift (the latest materialized one by default)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    if shift_start is None:
+        cur.execute("SELECT MAX(shift_start) AS shift_start FROM shift_oee WHERE shift_id = %s", (shift_id,))
+        shift_start = cur.fetchone()["shift_start"]
+    cur.execute(f"SELECT {OEE_FIELDS} FROM shift_oee WHERE shift_id = %s AND shift_start = %s ORDER BY machine_id", (shift_id, shift_start))
     rows = cur.fetchall()
     cur.close()
-    conn.close()
-    return {"shifts": rows}
+    return FastJSONResponse({"shift_id": shift_id, "shift_start": shift_start, "machines": rows})
 
 @router.get("/{shift_id}")
-def get_shift(shift_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def get_shift(shift_id: int, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("SELECT * FROM shifts WHERE id = %s", (shift_id,))
     row = cur.fetchone()
     cur.close()
-    conn.close()
     if row:
-        return {"shift": row}
+        return FastJSONResponse({"shift": row})
     raise HTTPException(status_code=404, detail="Shift not found")
 
 @router.post("/")
-def create_shift(shift: dict, user=Depends(require_role("Admin", "Moderator", "User"))):
+def create_shift(shift: dict, user=Depends(require_role("Admin", "Moderator", "User")), conn=Depends(get_db)):
     # Validation: require start_time and end_time
     if not shift.get("start_time"):
         raise HTTPException(status_code=400, detail="start_time is required")
     if not shift.get("end_time"):
         raise HTTPException(status_code=400, detail="end_time is required")
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     # Convert empty string time fields to None
     start_time = shift.get("start_time") or None
     end_time = shift.get("end_time") or None
@@ -51,18 +150,17 @@ def create_shift(shift: dict, user=Depends(require_role("Admin", "Moderator", "U
     shift_id = cur.fetchone()["id"]
     conn.commit()
     cur.close()
-    conn.close()
+    shifts_cache.invalidate()
     return {"id": shift_id}
 
 @router.put("/{shift_id}")
-def update_shift(shift_id: int, shift: dict, user=Depends(require_role("Admin", "Moderator", "User"))):
+def update_shift(shift_id: int, shift: dict, user=Depends(require_role("Admin", "Moderator", "User")), conn=Depends(get_db)):
     # Validation: require start_time and end_time
     if not shift.get("start_time"):
         raise HTTPException(status_code=400, detail="start_time is required")
     if not shift.get("end_time"):
         raise HTTPException(status_code=400, detail="end_time is required")
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     # Convert empty string time fields to None
     start_time = shift.get("start_time") or None
     end_time = shift.get("end_time") or None
@@ -78,15 +176,14 @@ def update_shift(shift_id: int, shift: dict, user=Depends(require_role("Admin",
     ))
     conn.commit()
     cur.close()
-    conn.close()
+    shifts_cache.invalidate()
     return {"message": "Shift updated"}
 
 @router.delete("/{shift_id}")
-def delete_shift(shift_id: int, user=Depends(require_role("Admin"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def delete_shift(shift_id: int, user=Depends(require_role("Admin")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("DELETE FROM shifts WHERE id = %s", (shift_id,))
     conn.commit()
     cur.close()
-    conn.close()
+    shifts_cache.invalidate()
     return {"message": "Shift deleted"} 
\ No newline at end of file
@@ -1,50 +1,75 @@
-from fastapi import APIRouter, HTTPException
-from db import get_connection
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from datetime import datetime
+from listing import fetch_page_async, time_range, machine_scope, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT
+from db import get_db
+from json_response import FastJSONResponse
+from db_async import get_adb
 import psycopg2.extras
+from stop_tracker import stop_tracker
+from response_cache import machines_cache
+import rollups
 
 router = APIRouter()
 
+STOPS_FIELDS = ("id", "machine_id", "reason", "start_time", "end_time", "resolved")
+
 @router.get("/")
-def get_stops():
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM stops")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return {"stops": rows}
+async def get_stops(machine_id: Optional[int] = None, line_id: Optional[int] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, after_id: Optional[int] = None, before_id: Optional[int] = None, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT), fields: Optional[str] = None, aconn=Depends(get_adb)):
+    # Newest first, paged back in time with before_id; after_id pages oldest
+    # first instead, for clients syncing forward
+    where = machine_scope(machine_id, line_id) + time_range("start_time", since, until)
+    if after_id is not None:
+        rows, next_after_id = await fetch_page_async(aconn, "stops", STOPS_FIELDS, fields, after_id, limit, where)
+        return FastJSONResponse({"stops": rows, "next_after_id": next_after_id})
+    rows, next_before_id = await fetch_page_async(aconn, "stops", STOPS_FIELDS, fields, None, limit, where, before_id=before_id, descending=True)
+    return FastJSONResponse({"stops": rows, "next_before_id": next_before_id})
+
+@router.get("/open")
+async def get_open_stop(machine_id: int, aconn=Depends(get_adb)):
+    if not stop_tracker.loaded:
+        # The tracker loads on the first status write; until then ask the table
+        row = await aconn.fetchrow(
+            "SELECT * FROM stops WHERE machine_id = %s AND end_time IS NULL ORDER BY start_time DESC LIMIT 1",
+            (machine_id,),
+        )
+        return FastJSONResponse({"stop": row})
+    stop_id = stop_tracker.open_stop(machine_id)
+    if stop_id is None:
+        return {"stop": None}
+    row = await aconn.fetchrow("SELECT * FROM stops WHERE id = %s", (stop_id,))
+    return FastJSONResponse({"stop": row})
 
 @router.get("/{stop_id}")
-def get_stop(stop_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM stops WHERE id = %s", (stop_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+async def get_stop(stop_id: int, aconn=Depends(get_adb)):
+    row = await aconn.fetchrow("SELECT * FROM stops WHERE id = %s", (stop_id,))
     if row:
-        return {"stop": row}
+        return FastJSONResponse({"stop": row})
     raise HTTPException(status_code=404, detail="Stop not found")
 
 @router.post("/")
-def create_stop(stop: dict):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def create_stop(stop: dict, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("INSERT INTO stops ( machine_id, reason, start_time, end_time) VALUES (%s, %s, %s, %s) RETURNING id", ( stop["machine_id"], stop.get("reason"), stop["start_time"], stop.get("end_time")))
     stop_id = cur.fetchone()["id"]
+    rollups.add_stops(cur, [stop_id])
     conn.commit()
     cur.close()
-    conn.close()
+    if stop.get("end_time") is None:
+        stop_tracker.stop_changed(stop["machine_id"], stop_id, True)
+    # Machine OEE is computed from stops
+    machines_cache.invalidate()
     return {"id": stop_id}
 
 @router.put("/{stop_id}")
-def update_stop(stop_id: int, stop: dict):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def update_stop(stop_id: int, stop: dict, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     # If end_time is set, mark as resolved
     resolved = stop.get("resolved")
     if resolved is None:
         resolved = stop.get("end_time") is not None
+    # Take the old version out of the rollups and fold the new one back in
+    rollups.remove_stops(cur, [stop_id])
     cur.execute("UPDATE stops SET machine_id=%s, reason=%s, start_time=%s, end_time=%s, resolved=%s WHERE id=%s", (
         stop["machine_id"],
         stop.get("reason"),
@@ -53,17 +78,20 @@ def update_stop(stop_id: int, stop: dict):
         resolved,
         stop_id
     ))
+    rollups.add_stops(cur, [stop_id])
     conn.commit()
     cur.close()
-    conn.close()
+    stop_tracker.stop_changed(stop["machine_id"], stop_id, stop.get("end_time") is None)
+    machines_cache.invalidate()
     return {"message": "Stop updated"}
 
 @router.delete("/{stop_id}")
-def delete_stop(stop_id: int):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def delete_stop(stop_id: int, conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    rollups.remove_stops(cur, [stop_id])
     cur.execute("DELETE FROM stops WHERE id = %s", (stop_id,))
     conn.commit()
     cur.close()
-    conn.close()
+    stop_tracker.stop_deleted(stop_id)
+    machines_cache.invalidate()
     return {"message": "Stop deleted"} 
\ No newline at end of file
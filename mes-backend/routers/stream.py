@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+from machine_stream import machine_broker
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+@router.get("/machines")
+async def stream_machines(request: Request):
+    # Server-sent events: a "snapshot" on connect, then "delta" messages
+    # carrying only the machines whose status or KPIs changed
+    sub = await machine_broker.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    kind, data = await asyncio.wait_for(sub.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {kind}\ndata: {data}\n\n"
+        finally:
+            machine_broker.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+@router.get("/stats")
+def stream_stats():
+    return {"machines": machine_broker.stats()}
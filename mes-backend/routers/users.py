@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from typing import Optional
+from listing import fetch_page, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT
+from db import get_db, connection
+from json_response import FastJSONResponse
 import psycopg2.extras
-from auth import require_role, get_password_hash
+from starlette.concurrency import run_in_threadpool
+from auth import require_role, get_password_hash_async, principal_cache
+from response_cache import users_cache
 import psycopg2
 
 router = APIRouter()
@@ -10,54 +15,58 @@ def get_current_user():
     # Placeholder: in real app, extract user from session/JWT
     return {"id": 1, "username": "admin", "role": "Admin"}
 
+# password_hash is deliberately not selectable
+USERS_FIELDS = ("id", "full_name", "username", "email", "role", "status", "joined", "last_active")
+
 @router.get("/")
-def get_users(user=Depends(require_role("Admin", "Moderator", "User"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return {"users": rows}
+def get_users(request: Request, after_id: Optional[int] = None, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT), fields: Optional[str] = None, user=Depends(require_role("Admin", "Moderator", "User"))):
+    def build():
+        with connection() as conn:
+            rows, next_after_id = fetch_page(conn, "users", USERS_FIELDS, fields, after_id, limit, default_columns=USERS_FIELDS)
+        return {"users": rows, "next_after_id": next_after_id}
+    return users_cache.respond(request, build, cache_control="private, no-cache")
 
 @router.get("/{user_id}")
-def get_user(user_id: int, user=Depends(require_role("Admin", "Moderator", "User"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def get_user(user_id: int, user=Depends(require_role("Admin", "Moderator", "User")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
     row = cur.fetchone()
     cur.close()
-    conn.close()
     if row:
-        return {"user": row}
+        return FastJSONResponse({"user": row})
     raise HTTPException(status_code=404, detail="User not found")
 
+def insert_user(user, password_hash):
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "INSERT INTO users (full_name, username, password_hash, email, role, status) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+                (user["full_name"], user["username"], password_hash, user["email"], user["role"], user.get("status", "Active"))
+            )
+            user_id = cur.fetchone()[0]
+            conn.commit()
+            return user_id
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            raise HTTPException(status_code=400, detail="A user with this email already exists.")
+        finally:
+            cur.close()
+
 @router.post("/")
-def create_user(user: dict, current_user: dict = Depends(require_role("Admin"))):
+async def create_user(user: dict, current_user: dict = Depends(require_role("Admin"))):
+    # Async so the bcrypt hash only occupies the password process pool; the
+    # insert goes through the threadpool
     if "password" not in user or not user["password"]:
         raise HTTPException(status_code=400, detail="Password is required")
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
-    try:
-        password_hash = get_password_hash(user["password"])
-        cur.execute(
-            "INSERT INTO users (full_name, username, password_hash, email, role, status) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
-            (user["full_name"], user["username"], password_hash, user["email"], user["role"], user.get("status", "Active"))
-        )
-        user_id = cur.fetchone()["id"]
-        conn.commit()
-        return {"id": user_id}
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail="A user with this email already exists.")
-    finally:
-        cur.close()
-        conn.close()
+    password_hash = await get_password_hash_async(user["password"])
+    user_id = await run_in_threadpool(insert_user, user, password_hash)
+    users_cache.invalidate()
+    return {"id": user_id}
 
 @router.put("/{user_id}")
-def update_user(user_id: int, user: dict, current_user: dict = Depends(require_role("Admin"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def update_user(user_id: int, user: dict, current_user: dict = Depends(require_role("Admin")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     fields = []
     values = []
     if "full_name" in user and user["full_name"]:
@@ -80,22 +89,22 @@ def update_user(user_id: int, user: dict, current_user: dict = Depends(require_r
         values.append(user["status"])
     if not fields:
         cur.close()
-        conn.close()
         return {"message": "No fields to update"}
     sql = f"UPDATE users SET {', '.join(fields)} WHERE id=%s"
     values.append(user_id)
     cur.execute(sql, tuple(values))
     conn.commit()
     cur.close()
-    conn.close()
+    principal_cache.invalidate(user_id=user_id)
+    users_cache.invalidate()
     return {"message": "User updated"}
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, current_user: dict = Depends(require_role("Admin"))):
-    conn = get_connection(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur = conn.cursor()
+def delete_user(user_id: int, current_user: dict = Depends(require_role("Admin")), conn=Depends(get_db)):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
     conn.commit()
     cur.close()
-    conn.close()
+    principal_cache.invalidate(user_id=user_id)
+    users_cache.invalidate()
     return {"message": "User deleted"} 
\ No newline at end of file
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
-from db import get_connection
+from fastapi import APIRouter, Depends, HTTPException, Query
+from db import get_db
+from json_response import FastJSONResponse
 from auth import require_role
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import date, datetime
+from psycopg import sql
+from listing import fetch_page, time_range, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT
 
 router = APIRouter()
 
@@ -24,20 +27,20 @@ class WorkOrderOut(WorkOrderIn):
     created_at: datetime
     updated_at: datetime
 
+WORK_ORDER_FIELDS = ("id", "product_id", "quantity", "status", "due_date", "assigned_line_id", "progress", "alarms", "created_at", "updated_at")
+
 @router.get("/")
-def get_work_orders():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, product_id, quantity, status, due_date, assigned_line_id, progress, alarms, created_at, updated_at FROM work_orders")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    keys = ["id", "product_id", "quantity", "status", "due_date", "assigned_line_id", "progress", "alarms", "created_at", "updated_at"]
-    return {"work_orders": [dict(zip(keys, row)) for row in rows]}
+def get_work_orders(line_id: Optional[int] = None, status: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, after_id: Optional[int] = None, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT), fields: Optional[str] = None, conn=Depends(get_db)):
+    where = time_range("created_at", since, until)
+    if line_id is not None:
+        where.append((sql.SQL("assigned_line_id = %s"), line_id))
+    if status is not None:
+        where.append((sql.SQL("status = %s"), status))
+    rows, next_after_id = fetch_page(conn, "work_orders", WORK_ORDER_FIELDS, fields, after_id, limit, where, default_columns=WORK_ORDER_FIELDS)
+    return FastJSONResponse({"work_orders": rows, "next_after_id": next_after_id})
 
 @router.post("/")
-def create_work_order(order: WorkOrderIn, user=Depends(require_role("Admin", "Moderator"))):
-    conn = get_connection()
+def create_work_order(order: WorkOrderIn, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
     cur = conn.cursor()
     now = datetime.now()
     cur.execute(
@@ -50,24 +53,20 @@ def create_work_order(order: WorkOrderIn, user=Depends(require_role("Admin", "Mo
     row = cur.fetchone()
     conn.commit()
     cur.close()
-    conn.close()
     return {"id": row[0], "created_at": row[1], "updated_at": row[2]}
 
 @router.put("/{order_id}")
-def update_work_order(order_id: int, order: WorkOrderIn, user=Depends(require_role("Admin", "Moderator"))):
+def update_work_order(order_id: int, order: WorkOrderIn, user=Depends(require_role("Admin", "Moderator")), conn=Depends(get_db)):
     # Enforce valid status transitions (example: can't go from Completed to Open)
-    conn = get_connection()
     cur = conn.cursor()
     cur.execute("SELECT status FROM work_orders WHERE id=%s", (order_id,))
     current = cur.fetchone()
     if not current:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Work order not found")
     current_status = current[0]
     if current_status == "Completed" and order.status != "Completed":
         cur.close()
-        conn.close()
         raise HTTPException(status_code=400, detail="Cannot revert a completed work order to another status")
     now = datetime.now()
     cur.execute(
@@ -78,19 +77,15 @@ def update_work_order(order_id: int, order: WorkOrderIn, user=Depends(require_ro
     )
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Work order updated"}
 
 @router.delete("/{order_id}")
-def delete_work_order(order_id: int, user=Depends(require_role("Admin"))):
-    conn = get_connection()
+def delete_work_order(order_id: int, user=Depends(require_role("Admin")), conn=Depends(get_db)):
     cur = conn.cursor()
     cur.execute("DELETE FROM work_orders WHERE id=%s", (order_id,))
     if cur.rowcount == 0:
         cur.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Work order not found")
     conn.commit()
     cur.close()
-    conn.close()
     return {"message": "Work order deleted"} 
\ No newline at end of file
@@ -0,0 +1,158 @@
+import asyncio
+import os
+from datetime import datetime
+import psycopg2.extras
+from starlette.concurrency import run_in_threadpool
+from db import connection
+from oee import score
+from routers.shifts import shift_window
+
+# Seconds between refreshes of the running shifts' materialized OEE
+SHIFT_OEE_INTERVAL = float(os.getenv("SHIFT_OEE_INTERVAL", "60"))
+# Counter events: one piece per event of these types
+GOOD_EVENT = os.getenv("GOOD_EVENT", "GOOD")
+REJECT_EVENT = os.getenv("REJECT_EVENT", "REJECT")
+# pg_try_advisory_lock key, so one worker refreshes per pass
+SHIFT_OEE_LOCK = 48151625
+
+# Inputs for every machine on the shift's line over [start, end), one row each
+INPUTS_SQL = """
+    SELECT m.id AS machine_id, m.counter_type, m.avg_pieces_per_sec,
+           COALESCE(d.downtime, 0) AS downtime,
+           COALESCE(c.good, 0) AS good, COALESCE(c.reject, 0) AS reject
+    FROM machines m
+    LEFT JOIN (
+        SELECT machine_id,
+               SUM(EXTRACT(EPOCH FROM LEAST(COALESCE(end_time, NOW()), %(end)s) - GREATEST(start_time, %(start)s))) AS downtime
+        FROM stops
+        WHERE start_time < %(end)s AND (end_time IS NULL OR end_time > %(start)s)
+          AND machine_id IN (SELECT id FROM machines WHERE line_id = %(line_id)s)
+        GROUP BY machine_id
+    ) d ON d.machine_id = m.id
+    LEFT JOIN (
+        SELECT machine_id,
+               COUNT(*) FILTER (WHERE event_type = %(good)s) AS good,
+               COUNT(*) FILTER (WHERE event_type = %(reject)s) AS reject
+        FROM events
+        WHERE occurred_at >= %(start)s AND occurred_at < %(end)s AND event_type IN (%(good)s, %(reject)s)
+          AND machine_id IN (SELECT id FROM machines WHERE line_id = %(line_id)s)
+        GROUP BY machine_id
+    ) c ON c.machine_id = m.id
+    WHERE m.line_id = %(line_id)s
+"""
+
+UPSERT_SQL = """
+    INSERT INTO shift_oee (machine_id, shift_id, shift_start, shift_end, planned_seconds, downtime_seconds,
+                           good_count, reject_count, ideal_rate, availability, performance, quality, oee, frozen, updated_at)
+    VALUES %s
+    ON CONFLICT (machine_id, shift_id, shift_start) DO UPDATE SET
+        shift_end = EXCLUDED.shift_end,
+        planned_seconds = EXCLUDED.planned_seconds,
+        downtime_seconds = EXCLUDED.downtime_seconds,
+        good_count = EXCLUDED.good_count,
+        reject_count = EXCLUDED.reject_count,
+        ideal_rate = EXCLUDED.ideal_rate,
+        availability = EXCLUDED.availability,
+        performance = EXCLUDED.performance,
+        quality = EXCLUDED.quality,
+        oee = EXCLUDED.oee,
+        frozen = EXCLUDED.frozen,
+        updated_at = EXCLUDED.updated_at
+    WHERE NOT shift_oee.frozen
+"""
+
+def shift_kpis(row, planned):
+    # oee.score() over the shift's downtime and counter events; status
+    # machines count as 1 piece/s
+    downtime = min(float(row["downtime"] or 0), planned)
+    ideal_rate = float(row["avg_pieces_per_sec"] or 0) or (1.0 if row["counter_type"] == "status" else 0.0)
+    return {
+        "downtime": downtime,
+        "ideal_rate": ideal_rate,
+        **score(planned, downtime, row["good"], row["reject"], ideal_rate),
+    }
+
+def materialize_shift(conn, shift, now=None):
+    # Upserts one row per machine on the shift's line for its current (or
+    # last) occurrence; a finished occurrence is written once more and frozen
+    now = now or datetime.now()
+    start, end = shift_window(shift, now)
+    frozen = now >= end
+    horizon = min(end, now)
+    planned = (horizon - start).total_seconds()
+    if planned <= 0:
+        return 0
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(
+        "SELECT 1 FROM shift_oee WHERE shift_id = %s AND shift_start = %s AND frozen LIMIT 1",
+        (shift["id"], start),
+    )
+    if cur.fetchone():
+        cur.close()
+        return 0
+    cur.execute(INPUTS_SQL, {"start": start, "end": horizon, "line_id": shift["line_id"], "good": GOOD_EVENT, "reject": REJECT_EVENT})
+    rows = cur.fetchall()
+    values = []
+    for row in rows:
+        k = shift_kpis(row, planned)
+        values.append((
+            row["machine_id"], shift["id"], start, end, planned, k["downtime"], row["good"], row["reject"],
+            k["ideal_rate"], k["availability"], k["performance"], k["quality"], k["oee"], frozen, now,
+        ))
+    if values:
+        psycopg2.extras.execute_values(cur, UPSERT_SQL, values)
+    conn.commit()
+    cur.close()
+    return len(values)
+
+def refresh_all(now=None):
+    # Rows written, or None when another worker holds the refresh lock
+    now = now or datetime.now()
+    with connection() as conn:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (SHIFT_OEE_LOCK,))
+        if not cur.fetchone()["locked"]:
+            conn.rollback()
+            cur.close()
+            return None
+        try:
+            cur.execute("SELECT id, line_id, start_time, end_time FROM shifts WHERE line_id IS NOT NULL")
+            shifts = cur.fetchall()
+            conn.commit()
+            written = sum(materialize_shift(conn, shift, now) for shift in shifts)
+            # Occurrences that ended while nobody refreshed them keep their last values
+            cur.execute("UPDATE shift_oee SET frozen = TRUE WHERE NOT frozen AND shift_end <= %s", (now,))
+            conn.commit()
+            return written
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (SHIFT_OEE_LOCK,))
+            conn.commit()
+            cur.close()
+
+# Running-shift row per machine, from the partial index on unfrozen rows
+CURRENT_SQL = (
+    "SELECT DISTINCT ON (machine_id) machine_id, shift_id, shift_start, shift_end, availability, performance, quality, oee "
+    "FROM shift_oee WHERE machine_id = ANY(%s) AND NOT frozen AND shift_end > %s ORDER BY machine_id, shift_start DESC"
+)
+
+def current_by_machine(conn, machine_ids, now=None):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(CURRENT_SQL, (list(machine_ids), now or datetime.now()))
+    rows = {row["machine_id"]: row for row in cur.fetchall()}
+    cur.close()
+    return rows
+
+async def current_by_machine_async(aconn, machine_ids, now=None):
+    rows = await aconn.fetch(CURRENT_SQL, (list(machine_ids), now or datetime.now()))
+    return {row["machine_id"]: row for row in rows}
+
+async def run_refresher(interval=SHIFT_OEE_INTERVAL):
+    while True:
+        try:
+            await run_in_threadpool(refresh_all)
+        except Exception as exc:
+            print(f"[shift-oee] refresh failed: {exc}")
+        await asyncio.sleep(interval)
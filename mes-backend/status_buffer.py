@@ -0,0 +1,340 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+import psycopg2.extras
+from starlette.concurrency import run_in_threadpool
+from db import connection
+from stop_tracker import stop_tracker
+from timeline_store import timeline_store
+from response_cache import lines_cache, machines_cache
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: run a single worker per STATUS_LOG_DIR there
+    fcntl = None
+
+# Seconds between flushes; each flush is one transaction, so this bounds the
+# commit rate of status reports per worker
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "1"))
+STATUS_LOG_DIR = Path(os.getenv("STATUS_LOG_DIR", Path(__file__).resolve().parent / "status_log"))
+# fsync every log append (survives power loss) instead of only flushing it to
+# the OS (survives a crashed or killed worker)
+STATUS_LOG_FSYNC = os.getenv("STATUS_LOG_FSYNC", "0") == "1"
+# Transitions kept per machine between flushes; a machine flapping faster
+# than this loses its oldest ones rather than growing the buffer
+STATUS_MAX_TRANSITIONS = int(os.getenv("STATUS_MAX_TRANSITIONS", "64"))
+
+UPDATE_SQL = (
+    "UPDATE machines SET status = v.status FROM (VALUES %s) AS v(id, status) "
+    "WHERE machines.id = v.id AND machines.status IS DISTINCT FROM v.status"
+)
+
+def _merge(older, newer):
+    # Transitions of one machine, with a repeat at the seam dropped
+    if older and newer and older[-1][0] == newer[0][0]:
+        newer = newer[1:]
+    return (older + newer)[-STATUS_MAX_TRANSITIONS:]
+
+def _after(transitions, cutoff):
+    # The transitions reported after cutoff (a supersede time), if any
+    if not transitions or cutoff is None:
+        return transitions or []
+    return [t for t in transitions if t[1] > cutoff]
+
+class StatusBuffer:
+    # Write-behind path for high-frequency status reports (PUT
+    # /api/machines/{id}/status). Reports are kept per machine in memory and
+    # written every STATUS_FLUSH_INTERVAL seconds in one transaction. A report
+    # repeating the machine's last buffered status costs nothing; real
+    # transitions are kept in order with their timestamps, so stops and the
+    # status timeline come out the same as with direct writes.
+    #
+    # Each transition is appended to this worker's log in STATUS_LOG_DIR
+    # before it is acknowledged. The log is rotated when a flush starts and
+    # removed once the flush has committed, so at startup any log not held by
+    # a live worker holds reports that never reached the table; recover()
+    # replays them.
+    #
+    # A full machine update or delete supersedes what is buffered for the
+    # machine: forget_machine() records when, and transitions reported before
+    # that are neither read, written nor replayed, including ones already
+    # taken by a running flush.
+
+    def __init__(self, log_dir=STATUS_LOG_DIR, interval=STATUS_FLUSH_INTERVAL):
+        self.log_dir = Path(log_dir)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+        self.flushing = {}
+        # machine_id -> when its buffered reports were last superseded
+        self.superseded = {}
+        self.log = None
+        self.log_path = None
+        self.counters = {"reports": 0, "coalesced": 0, "flushes": 0, "machines_written": 0, "failures": 0, "recovered": 0, "superseded": 0}
+
+    # Log files
+
+    def _own_log_path(self):
+        # Per worker process, resolved when first written
+        return self.log_dir / f"status-{os.getpid()}.log"
+
+    def _open_log(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.log_path = self._own_log_path()
+        self.log = open(self.log_path, "a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(self.log.fileno(), fcntl.LOCK_EX)
+
+    def _log_record(self, record):
+        if self.log is None:
+            self._open_log()
+        self.log.write(json.dumps(record) + "\n")
+        self.log.flush()
+        if STATUS_LOG_FSYNC:
+            os.fsync(self.log.fileno())
+
+    def _append(self, machine_id, status, at):
+        self._log_record({"machine_id": machine_id, "status": status, "at": at.isoformat()})
+
+    def _rotate(self):
+        # Under self.lock, at the start of a flush: the rotated log holds
+        # exactly the transitions being flushed. The flock stays on the open
+        # file across the rename, so recovery in another worker skips it.
+        if self.log is None:
+            return None
+        flushing_path = self.log_path.with_suffix(".flushing")
+        if fcntl is None:
+            self.log.close()
+        os.replace(self.log_path, flushing_path)
+        rotated = (self.log, flushing_path)
+        self.log = None
+        return rotated
+
+    def _discard(self, rotated):
+        if rotated is None:
+            return
+        log, path = rotated
+        path.unlink(missing_ok=True)
+        log.close()
+
+    # Reports and reads
+
+    def _buffered(self, machine_id):
+        # Under self.lock: the machine's transitions not in the table yet
+        return self.pending.get(machine_id) or _after(self.flushing.get(machine_id), self.superseded.get(machine_id))
+
+    def report(self, machine_id, status, at=None):
+        # True when the report is a transition, False when it repeats the
+        # machine's last buffered status or predates a supersede
+        at = at or datetime.now()
+        with self.lock:
+            self.counters["reports"] += 1
+            cutoff = self.superseded.get(machine_id)
+            if cutoff is not None and at <= cutoff:
+                self.counters["superseded"] += 1
+                return False
+            transitions = self._buffered(machine_id)
+            if transitions and transitions[-1][0] == status:
+                self.counters["coalesced"] += 1
+                return False
+            self._append(machine_id, status, at)
+            self.pending[machine_id] = _merge(self.pending.get(machine_id, []), [(status, at)])
+        # Cached listings overlay the buffer when built, so a transition
+        # rebuilds them instead of waiting for the flush
+        lines_cache.invalidate()
+        machines_cache.invalidate()
+        return True
+
+    def latest(self, machine_id):
+        with self.lock:
+            transitions = self._buffered(machine_id)
+            return transitions[-1][0] if transitions else None
+
+    def overlay(self, machines):
+        # Reported statuses that are not in the table yet win over the rows
+        with self.lock:
+            for machine in machines:
+                transitions = self._buffered(machine["id"])
+                if transitions:
+                    machine["status"] = transitions[-1][0]
+        return machines
+
+    def forget_machine(self, machine_id, at=None):
+        # A full machine update or delete supersedes buffered reports. The
+        # supersede is logged when a log may still hold earlier reports, so
+        # recover() drops them as well.
+        at = at or datetime.now()
+        with self.lock:
+            if machine_id in self.pending or machine_id in self.flushing:
+                self._log_record({"machine_id": machine_id, "superseded": at.isoformat()})
+            self.pending.pop(machine_id, None)
+            self.superseded[machine_id] = max(at, self.superseded.get(machine_id, at))
+
+    # Flushing
+
+    def _superseded(self, batch):
+        # Under self.lock: batch without the transitions superseded since
+        return {
+            machine_id: kept for machine_id, transitions in batch.items()
+            if (kept := _after(transitions, self.superseded.get(machine_id)))
+        }
+
+    def _write(self, conn, batch):
+        while True:
+            with self.lock:
+                batch = self._superseded(batch)
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT id FROM machines WHERE id = ANY(%s)", (list(batch),))
+                machine_ids = sorted(row[0] for row in cur.fetchall())
+                if not machine_ids:
+                    conn.commit()
+                    return 0
+                psycopg2.extras.execute_values(
+                    cur, UPDATE_SQL, [(machine_id, batch[machine_id][-1][0]) for machine_id in machine_ids]
+                )
+                # The trackers only look at their in-memory state, so later
+                # transitions of the same machine need the earlier ones applied
+                # now; on failure they are dropped and reloaded from the tables
+                for machine_id in machine_ids:
+                    for status, at in batch[machine_id]:
+                        stop_tracker.apply(stop_tracker.observe(conn, machine_id, status, at))
+                        timeline_store.apply(timeline_store.record(conn, machine_id, status, at))
+                # update_machine supersedes before it commits, so an update
+                # racing this batch shows up here; the batch is then written
+                # again without the superseded transitions
+                with self.lock:
+                    raced = self._superseded(batch) != batch
+                if not raced:
+                    conn.commit()
+                    return len(machine_ids)
+                conn.rollback()
+                stop_tracker.invalidate()
+                timeline_store.invalidate()
+            except Exception:
+                conn.rollback()
+                stop_tracker.invalidate()
+                timeline_store.invalidate()
+                raise
+            finally:
+                cur.close()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                batch, self.pending = self.pending, {}
+                self.flushing = batch
+                rotated = self._rotate()
+            try:
+                with connection() as conn:
+                    written = self._write(conn, batch)
+            except Exception:
+                with self.lock:
+                    # Put the batch back ahead of anything reported since and
+                    # log it again before the rotated log goes
+                    for machine_id, transitions in batch.items():
+                        transitions = _after(transitions, self.superseded.get(machine_id))
+                        for status, at in transitions:
+                            self._append(machine_id, status, at)
+                        if transitions:
+                            self.pending[machine_id] = _merge(transitions, self.pending.get(machine_id, []))
+                    self.flushing = {}
+                    self.counters["failures"] += 1
+                self._discard(rotated)
+                raise
+            with self.lock:
+                self.flushing = {}
+                self.counters["flushes"] += 1
+                self.counters["machines_written"] += written
+            self._discard(rotated)
+            if written:
+                lines_cache.invalidate()
+                machines_cache.invalidate()
+            return written
+
+    def recover(self):
+        # Replays logs left by workers that stopped before flushing. Logs
+        # still locked belong to live workers and are left alone.
+        if not self.log_dir.exists():
+            return 0
+        claimed, entries, superseded = [], [], {}
+        for path in sorted(self.log_dir.glob("status-*.*")):
+            if path.suffix not in (".log", ".flushing") or path == self._own_log_path():
+                continue
+            handle = open(path, "r", encoding="utf-8")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    handle.close()
+                    continue
+            claimed.append((handle, path))
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                    if "superseded" in record:
+                        at = datetime.fromisoformat(record["superseded"])
+                        superseded[record["machine_id"]] = max(at, superseded.get(record["machine_id"], at))
+                        continue
+                    entries.append((datetime.fromisoformat(record["at"]), record["machine_id"], record["status"]))
+                except (ValueError, KeyError):
+                    # A torn last line from a crash mid-write
+                    continue
+        entries = [entry for entry in entries if entry[0] > superseded.get(entry[1], datetime.min)]
+        replayed = False
+        try:
+            if entries:
+                batch = {}
+                for at, machine_id, status in sorted(entries, key=lambda entry: entry[0]):
+                    batch[machine_id] = _merge(batch.get(machine_id, []), [(status, at)])
+                with connection() as conn:
+                    self._write(conn, batch)
+                with self.lock:
+                    self.counters["recovered"] += len(entries)
+                lines_cache.invalidate()
+                machines_cache.invalidate()
+            replayed = True
+        finally:
+            # Logs that failed to replay stay for the next startup
+            for handle, path in claimed:
+                if replayed:
+                    path.unlink(missing_ok=True)
+                handle.close()
+        return len(entries)
+
+    def close(self):
+        # Final flush on shutdown; the log is only removed once it is empty
+        try:
+            self.flush()
+        finally:
+            with self.lock:
+                if self.log is not None and not self.pending:
+                    self.log.close()
+                    self.log = None
+                    self.log_path.unlink(missing_ok=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                "pending_machines": len(self.pending),
+                "pending_transitions": sum(len(t) for t in self.pending.values()),
+                "interval": self.interval,
+            }
+
+async def run_flusher(buffer, interval=STATUS_FLUSH_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(buffer.flush)
+        except Exception as exc:
+            print(f"[status-buffer] flush failed, will retry: {exc}")
+
+status_buffer = StatusBuffer()
@@ -0,0 +1,118 @@
+import threading
+import rollups
+from change_feed import change_feed
+
+STOP_STATUS = "STOPPED"
+RUN_STATUS = "RUNNING"
+
+class StopTracker:
+    # Opens a stops row when a machine goes STOPPED and closes it when the
+    # machine is RUNNING again. Keeps the open stop id per machine in memory so
+    # repeated status writes cost no stop queries; the SQL is guarded against
+    # the table as well, so concurrent workers still open each stop only once.
+
+    def __init__(self):
+        self.open_stops = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self, cur):
+        cur.execute(
+            "SELECT DISTINCT ON (machine_id) machine_id, id FROM stops "
+            "WHERE end_time IS NULL ORDER BY machine_id, start_time DESC"
+        )
+        with self.lock:
+            if not self.loaded:
+                self.open_stops = {row[0]: row[1] for row in cur.fetchall()}
+                self.loaded = True
+
+    def ensure_loaded(self, conn):
+        if not self.loaded:
+            cur = conn.cursor()
+            self._load(cur)
+            cur.close()
+
+    def observe(self, conn, machine_id, status, at=None):
+        # Call inside the transaction that changed the status, then pass the
+        # result to apply() once it has committed. at is when the status was
+        # reported, if not now.
+        cur = conn.cursor()
+        try:
+            if not self.loaded:
+                self._load(cur)
+            open_stop = self.open_stops.get(machine_id)
+            if status == STOP_STATUS and open_stop is None:
+                cur.execute(
+                    "INSERT INTO stops (machine_id, reason, start_time, end_time) "
+                    "SELECT %s, NULL, COALESCE(%s::timestamp, NOW()), NULL "
+                    "WHERE NOT EXISTS (SELECT 1 FROM stops WHERE machine_id = %s AND end_time IS NULL) "
+                    "RETURNING id",
+                    (machine_id, at, machine_id),
+                )
+                row = cur.fetchone()
+                if row is None:
+                    # Opened by another worker; adopt it
+                    cur.execute(
+                        "SELECT id FROM stops WHERE machine_id = %s AND end_time IS NULL ORDER BY start_time DESC LIMIT 1",
+                        (machine_id,),
+                    )
+                    row = cur.fetchone()
+                return (machine_id, row[0] if row else None)
+            if status == RUN_STATUS and open_stop is not None:
+                cur.execute(
+                    "UPDATE stops SET end_time = COALESCE(%s::timestamp, NOW()), resolved = TRUE "
+                    "WHERE machine_id = %s AND end_time IS NULL RETURNING id",
+                    (at, machine_id),
+                )
+                rollups.add_stops(cur, [row[0] for row in cur.fetchall()])
+                return (machine_id, None)
+            return None
+        finally:
+            cur.close()
+
+    def apply(self, change):
+        if change is None:
+            return
+        machine_id, stop_id = change
+        with self.lock:
+            if stop_id is None:
+                self.open_stops.pop(machine_id, None)
+            else:
+                self.open_stops[machine_id] = stop_id
+
+    def stop_changed(self, machine_id, stop_id, is_open):
+        # Keeps the table in step with manual edits through /api/stops
+        with self.lock:
+            if is_open:
+                self.open_stops[machine_id] = stop_id
+            elif self.open_stops.get(machine_id) == stop_id:
+                del self.open_stops[machine_id]
+
+    def stop_deleted(self, stop_id):
+        with self.lock:
+            for machine_id, open_id in list(self.open_stops.items()):
+                if open_id == stop_id:
+                    del self.open_stops[machine_id]
+
+    def invalidate(self):
+        # Drop the in-memory state after a failed transaction that may have
+        # applied changes early, or after another worker changed stops; it
+        # is reloaded from the table on next use
+        with self.lock:
+            self.open_stops = {}
+            self.loaded = False
+
+    def forget_machine(self, machine_id):
+        with self.lock:
+            self.open_stops.pop(machine_id, None)
+
+    def open_stop(self, machine_id):
+        return self.open_stops.get(machine_id)
+
+stop_tracker = StopTracker()
+
+def _on_stops_change(change):
+    if not change.local:
+        stop_tracker.invalidate()
+
+change_feed.subscribe(("stops",), _on_stops_change)
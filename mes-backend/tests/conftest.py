@@ -0,0 +1,55 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+import psycopg2
+import pytest
+
+# The backend modules import each other by top-level name
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Tests that need PostgreSQL run against a throwaway schema in this database
+# and are skipped when it is not set or not reachable
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def _connect(schema=None):
+    options = f"-c search_path={schema}" if schema else None
+    return psycopg2.connect(DATABASE_URL, connect_timeout=3, options=options)
+
+@pytest.fixture(scope="session")
+def scratch_schema():
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    try:
+        admin = _connect()
+    except psycopg2.OperationalError as exc:
+        pytest.skip(f"DATABASE_URL is unreachable: {exc}")
+    import migrate
+    admin.autocommit = True
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+    try:
+        conn = _connect(schema)
+        try:
+            migrate.apply_pending(conn)
+        finally:
+            conn.close()
+        yield schema
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+@pytest.fixture
+def db(scratch_schema):
+    # A connection on the migrated scratch schema; tables written by a test
+    # are emptied afterwards
+    conn = _connect(scratch_schema)
+    yield conn
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE machines, production_lines, stops, alarms, events, machine_status_segments,"
+                    " stop_rollups_hourly, stop_rollups_daily, shift_oee RESTART IDENTITY CASCADE")
+    conn.commit()
+    conn.close()
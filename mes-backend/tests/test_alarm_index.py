@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from alarm_index import AlarmIndex
+
+T0 = datetime(2024, 3, 1, 8, 0)
+
+def at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+def loaded_index(window=60, alarms=()):
+    # alarms: (id, machine_id, code, last_seen, line_id) of open alarms
+    index = AlarmIndex(window=window)
+    index._fill([
+        {"id": alarm_id, "machine_id": machine_id, "code": code, "last_seen": last_seen, "line_id": line_id}
+        for alarm_id, machine_id, code, last_seen, line_id in alarms
+    ])
+    return index
+
+def test_match_folds_repeats_within_the_window():
+    index = loaded_index(alarms=[(7, 1, "E1", at(0), 10)])
+    assert index.match(1, "E1", at(30)) == 7
+    assert index.match(1, "E1", at(61)) is None
+    assert index.match(1, "E2", at(30)) is None
+    assert index.match(2, "E1", at(30)) is None
+
+def test_match_needs_a_loaded_index_and_a_window():
+    assert AlarmIndex(window=60).match(1, "E1", at(0)) is None
+    assert loaded_index(window=0, alarms=[(7, 1, "E1", at(0), 10)]).match(1, "E1", at(0)) is None
+
+def test_absorb_moves_the_window_and_queues_the_count():
+    index = loaded_index(alarms=[(7, 1, "E1", at(0), 10)])
+    assert index.absorb(1, "E1", at(50)) == 7
+    # The window now runs from the last report
+    assert index.absorb(1, "E1", at(100)) == 7
+    assert index.pending == {7: (2, at(100))}
+    assert index.stats()["folded"] == 2
+
+def test_collapse_folds_into_open_alarms_and_earlier_rows():
+    index = loaded_index(alarms=[(7, 1, "E1", at(0), 10)])
+    rows = list(enumerate([
+        (1, "E1", at(10).isoformat(), "repeat of open alarm", None),
+        (2, "E3", at(0).isoformat(), "new", None),
+        (2, "E3", at(20).isoformat(), "repeat in batch", None),
+        (2, "E3", at(200).isoformat(), "outside window", None),
+        (2, "E3", at(210).isoformat(), "cleared", at(220).isoformat()),
+    ]))
+    keep, folded, counts = index.collapse(rows)
+    assert [(i, values[-2], values[-1]) for i, values in keep] == [
+        (1, 2, at(20).isoformat()),
+        (3, 1, at(200).isoformat()),
+        (4, 1, at(210).isoformat()),
+    ]
+    assert folded == [(0, 7, False), (2, 1, True)]
+    assert counts == {7: (1, at(10))}
+
+def test_counts_follow_forget_and_moves():
+    index = loaded_index(alarms=[(7, 1, "E1", at(0), 10), (8, 1, "E2", at(0), 10), (9, 2, "E1", at(0), 11)])
+    assert index.cached_counts() == ({10: 2, 11: 1}, {1: 2, 2: 1})
+    index.forget(8)
+    index.machine_moved(2, 10)
+    assert index.cached_counts() == ({10: 2}, {1: 1, 2: 1})
+    index.forget_machine(1)
+    assert index.cached_counts() == ({10: 1}, {2: 1})
+    index.invalidate()
+    assert index.cached_counts() is None
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+import rollups
+from routers.analytics import reliability
+
+def test_reliability_from_stops_and_downtime():
+    assert reliability(3600, 2, 600) == {
+        "stops": 2, "downtime_seconds": 600, "uptime_seconds": 3000, "mtbf_seconds": 1500, "mttr_seconds": 300,
+    }
+
+def test_reliability_without_stops_and_with_downtime_over_plan():
+    assert reliability(3600, 0, 0)["mtbf_seconds"] == 3600
+    assert reliability(3600, 0, 0)["mttr_seconds"] == 0.0
+    assert reliability(3600, 1, 7200)["uptime_seconds"] == 0.0
+
+def add_closed_stops(db, machine_id, spans):
+    cur = db.cursor()
+    ids = []
+    for start, end in spans:
+        cur.execute("INSERT INTO stops (machine_id, start_time, end_time) VALUES (%s, %s, %s) RETURNING id", (machine_id, start, end))
+        ids.append(cur.fetchone()[0])
+    rollups.add_stops(cur, ids)
+    db.commit()
+    cur.close()
+    return ids
+
+def test_rollups_match_raw_stops_across_hour_and_day_buckets(db):
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3)
+    cur = db.cursor()
+    cur.execute("INSERT INTO machines (name, status) VALUES ('M1', 'RUNNING') RETURNING id")
+    machine_id = cur.fetchone()[0]
+    cur.close()
+    ids = add_closed_stops(db, machine_id, [
+        (day + timedelta(hours=1, minutes=15), day + timedelta(hours=1, minutes=45)),
+        (day + timedelta(hours=23, minutes=30), day + timedelta(days=1, hours=2)),
+    ])
+    # Whole days from the daily table plus ragged hours from the hourly one
+    window = rollups.downtime_by_machine(db, day + timedelta(hours=1), day + timedelta(days=2, hours=5))
+    assert window[machine_id] == (2, 30 * 60 + 150 * 60)
+    # Only the part of the second stop inside the window is counted
+    window = rollups.downtime_by_machine(db, day + timedelta(days=1), day + timedelta(days=1, hours=1), [machine_id])
+    assert window[machine_id] == (0, 60 * 60)
+    cur = db.cursor()
+    rollups.remove_stops(cur, ids)
+    db.commit()
+    cur.close()
+    assert rollups.downtime_by_machine(db, day, day + timedelta(days=3))[machine_id] == (0, 0.0)
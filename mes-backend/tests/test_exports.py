@@ -0,0 +1,31 @@
+import gc
+import weakref
+import pytest
+from fastapi import HTTPException
+from routers.exports import ExportSlots, _csv_rows, _ndjson_rows, stream_rows
+
+def test_slots_turn_away_exports_beyond_the_limit():
+    slots = ExportSlots(max_running=2)
+    first = slots.acquire()
+    slots.acquire()
+    with pytest.raises(HTTPException) as exc:
+        slots.acquire()
+    assert exc.value.status_code == 503 and exc.value.headers["Retry-After"]
+    first()
+    first()
+    assert slots.stats()["running"] == 1
+    slots.acquire()
+    assert slots.stats() == {"running": 2, "max_running": 2, "started": 3, "rejected": 1}
+
+def test_an_export_dropped_before_streaming_frees_its_slot():
+    slots = ExportSlots(max_running=1)
+    release = slots.acquire()
+    body = stream_rows("SELECT 1", [], ["id"], "ndjson", release)
+    weakref.finalize(body, release)
+    del body
+    gc.collect()
+    assert slots.stats()["running"] == 0
+
+def test_row_encoders():
+    assert _csv_rows(["id", "reason"], [(1, "jam, belt")]) == '1,"jam, belt"\r\n'
+    assert _ndjson_rows(["id", "reason"], [(1, None), (2, "x")]) == b'{"id":1,"reason":null}\n{"id":2,"reason":"x"}\n'
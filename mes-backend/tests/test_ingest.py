@@ -0,0 +1,52 @@
+import json
+import pytest
+from routers.ingest import parse_records, validate
+
+def test_parse_json_array_and_wrapped_records():
+    records = [{"kind": "event"}, {"kind": "alarm"}]
+    assert parse_records(json.dumps(records).encode(), "application/json") == records
+    assert parse_records(json.dumps({"records": records}).encode(), "application/json") == records
+
+def test_parse_ndjson_skips_blank_lines():
+    body = b'{"kind": "event"}\n\n{"kind": "stop"}\n'
+    assert parse_records(body, "application/x-ndjson") == [{"kind": "event"}, {"kind": "stop"}]
+
+def test_parse_rejects_a_scalar_body():
+    with pytest.raises(ValueError):
+        parse_records(b"42", "application/json")
+
+def test_validate_orders_required_then_optional_columns():
+    row, error = validate({"kind": "alarm", "machine_id": 3, "code": "E1", "occurred_at": "2024-01-01T00:00:00", "cleared_at": None})
+    assert error is None
+    assert row == (3, "E1", "2024-01-01T00:00:00", None, None)
+
+def test_validate_reports_missing_fields_and_unknown_kinds():
+    assert validate({"kind": "stop"}) == (None, "Missing required field(s): machine_id, start_time")
+    row, error = validate({"kind": "reading"})
+    assert row is None and "Unknown kind 'reading'" in error
+    assert validate(["event"]) == (None, "Record must be an object")
+
+def test_write_batch_keeps_one_open_stop_per_machine(db, monkeypatch):
+    from contextlib import contextmanager
+    import routers.ingest as ingest
+
+    @contextmanager
+    def scratch_connection():
+        yield db
+
+    monkeypatch.setattr(ingest, "connection", scratch_connection)
+    cur = db.cursor()
+    cur.execute("INSERT INTO machines (name, status) VALUES ('M1', 'STOPPED'), ('M2', 'RUNNING') RETURNING id")
+    stopped, running = [row[0] for row in cur.fetchall()]
+    cur.execute("INSERT INTO stops (machine_id, start_time) VALUES (%s, '2024-03-01T07:00:00')", (stopped,))
+    db.commit()
+    results = ingest.write_batch([
+        {"kind": "stop", "machine_id": stopped, "start_time": "2024-03-01T08:00:00"},
+        {"kind": "stop", "machine_id": running, "start_time": "2024-03-01T08:00:00"},
+        {"kind": "stop", "machine_id": running, "start_time": "2024-03-01T08:05:00"},
+        {"kind": "stop", "machine_id": stopped, "start_time": "2024-03-01T06:00:00", "end_time": "2024-03-01T06:30:00"},
+    ])
+    assert [r["status"] for r in results] == ["error", "ok", "error", "ok"]
+    cur.execute("SELECT machine_id, COUNT(*) FROM stops WHERE end_time IS NULL GROUP BY machine_id ORDER BY machine_id")
+    assert cur.fetchall() == [(stopped, 1), (running, 1)]
+    cur.close()
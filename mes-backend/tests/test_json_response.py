@@ -0,0 +1,31 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import pytest
+import json_response
+from json_response import FastJSONResponse, _stdlib_encoder
+
+PAYLOAD = {
+    "machines": [
+        {"id": 1, "oee": Decimal("87.50"), "count": Decimal("12"), "updated": datetime(2024, 3, 1, 6, 30, 15, 250000),
+         "day": date(2024, 3, 1), "idle": timedelta(minutes=2), "tags": {"a"}, "note": "Presse n°1", "rate": None},
+    ],
+    "by_line": {2: 3},
+}
+
+EXPECTED = (
+    '{"machines":[{"id":1,"oee":87.5,"count":12,"updated":"2024-03-01T06:30:15.250000",'
+    '"day":"2024-03-01","idle":120.0,"tags":["a"],"note":"Presse n°1","rate":null}],"by_line":{"2":3}}'
+).encode("utf-8")
+
+def test_stdlib_fallback_output():
+    assert _stdlib_encoder.encode(PAYLOAD).encode("utf-8") == EXPECTED
+
+def test_orjson_output_matches_the_fallback():
+    if json_response.orjson is None:
+        pytest.skip("orjson is not installed")
+    assert json_response.dumps(PAYLOAD) == EXPECTED
+
+def test_response_renders_the_payload():
+    response = FastJSONResponse(PAYLOAD)
+    assert response.body == EXPECTED
+    assert response.media_type == "application/json"
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from listing import fetch_page, machine_scope, page_query, parse_fields, time_range
+
+FIELDS = ("id", "machine_id", "reason", "start_time")
+
+def test_parse_fields_adds_id_and_rejects_unknown_columns():
+    assert parse_fields(None, FIELDS) is None
+    assert parse_fields("reason, machine_id", FIELDS) == ["id", "reason", "machine_id"]
+    with pytest.raises(HTTPException) as exc:
+        parse_fields("reason,password_hash", FIELDS)
+    assert exc.value.status_code == 400
+
+def test_params_follow_filters_then_cursor_then_limit():
+    since = datetime(2024, 1, 1)
+    _, params = page_query("stops", FIELDS, after_id=10, limit=50, where=machine_scope(3) + time_range("start_time", since))
+    assert params == [3, since, 10, 51]
+    _, params = page_query("stops", FIELDS, limit=50, before_id=10, descending=True)
+    assert params == [10, 51]
+
+def test_sql_text():
+    query, _ = page_query("stops", FIELDS, "reason", after_id=1, limit=5)
+    assert query.as_string() == 'SELECT "id", "reason" FROM "stops" WHERE id > %s ORDER BY id LIMIT %s'
+    query, _ = page_query("stops", FIELDS, before_id=9, limit=5, descending=True)
+    assert query.as_string() == 'SELECT * FROM "stops" WHERE id < %s ORDER BY id DESC LIMIT %s'
+
+def walk(db, **kwargs):
+    pages, cursor = [], None
+    while True:
+        key = "before_id" if kwargs.get("descending") else "after_id"
+        rows, cursor = fetch_page(db, "stops", FIELDS, "id", limit=2, **{key: cursor}, **kwargs)
+        pages.append([row["id"] for row in rows])
+        if cursor is None:
+            return pages
+
+def test_pages_cover_every_row_once_in_both_directions(db):
+    cur = db.cursor()
+    cur.execute("INSERT INTO machines (name, status) VALUES ('M1', 'RUNNING') RETURNING id")
+    machine_id = cur.fetchone()[0]
+    start = datetime.now() - timedelta(hours=1)
+    for minute in range(5):
+        cur.execute("INSERT INTO stops (machine_id, start_time) VALUES (%s, %s)", (machine_id, start + timedelta(minutes=minute)))
+    db.commit()
+    cur.close()
+    assert walk(db) == [[1, 2], [3, 4], [5]]
+    assert walk(db, descending=True) == [[5, 4], [3, 2], [1]]
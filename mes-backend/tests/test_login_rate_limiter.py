@@ -0,0 +1,37 @@
+import pytest
+from fastapi import HTTPException
+from password_pool import LoginRateLimiter
+
+def test_user_limit_is_case_insensitive():
+    limiter = LoginRateLimiter(user_limit=2, ip_limit=100, window=60)
+    limiter.check("Ana", "10.0.0.1")
+    limiter.check("ana", "10.0.0.2")
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("ANA", "10.0.0.3")
+    assert exc.value.status_code == 429
+    assert 1 <= int(exc.value.headers["Retry-After"]) <= 61
+
+def test_ip_limit_spans_usernames():
+    limiter = LoginRateLimiter(user_limit=100, ip_limit=2, window=60)
+    limiter.check("a", "10.0.0.1")
+    limiter.check("b", "10.0.0.1")
+    with pytest.raises(HTTPException):
+        limiter.check("c", "10.0.0.1")
+    limiter.check("c", "10.0.0.2")
+
+def test_rejected_attempts_are_not_counted():
+    limiter = LoginRateLimiter(user_limit=1, ip_limit=2, window=60)
+    limiter.check("a", "10.0.0.1")
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            limiter.check("a", "10.0.0.1")
+    limiter.check("b", "10.0.0.1")
+
+def test_reset_user_and_window_expiry():
+    limiter = LoginRateLimiter(user_limit=1, ip_limit=100, window=60)
+    limiter.check("a", "10.0.0.1")
+    limiter.reset_user("A")
+    limiter.check("a", "10.0.0.1")
+    expired = LoginRateLimiter(user_limit=1, ip_limit=100, window=0)
+    expired.check("a", "10.0.0.1")
+    expired.check("a", "10.0.0.1")
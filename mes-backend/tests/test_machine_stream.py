@@ -0,0 +1,34 @@
+from machine_stream import MachineBroker, Subscriber
+
+SNAPSHOT = ("snapshot", "{}")
+
+def drain(sub):
+    payloads = []
+    while not sub.queue.empty():
+        payloads.append(sub.queue.get_nowait())
+    return payloads
+
+def test_first_offer_is_a_snapshot():
+    sub = Subscriber(4)
+    sub.offer(("delta", "a"), SNAPSHOT)
+    sub.offer(("delta", "b"), SNAPSHOT)
+    assert drain(sub) == [SNAPSHOT, ("delta", "b")]
+
+def test_overflow_replaces_backlog_with_one_snapshot():
+    sub = Subscriber(2)
+    sub.offer(("delta", "a"), SNAPSHOT)
+    sub.offer(("delta", "b"), SNAPSHOT)
+    sub.offer(("delta", "c"), SNAPSHOT)
+    assert drain(sub) == [SNAPSHOT]
+    assert sub.resyncs == 1
+    sub.offer(("delta", "d"), SNAPSHOT)
+    assert drain(sub) == [("delta", "d")]
+
+def test_apply_sends_only_changed_fields_and_removals():
+    broker = MachineBroker(loader=None)
+    changed, removed = broker._apply([{"id": 1, "status": "RUNNING", "oee": 90.0}, {"id": 2, "status": "RUNNING"}])
+    assert [m["id"] for m in changed] == [1, 2] and removed == []
+    changed, removed = broker._apply([{"id": 1, "status": "STOPPED", "oee": 90.0}])
+    assert changed == [{"id": 1, "status": "STOPPED"}]
+    assert removed == [2]
+    assert broker._apply([{"id": 1, "status": "STOPPED", "oee": 90.0}]) == ([], [])
@@ -0,0 +1,67 @@
+import migrate
+from migrate import _bitmap_uses, _scans
+
+# EXPLAIN (FORMAT JSON) of a bitmap scan over two partitions, trimmed
+PLAN = {
+    "Node Type": "Append",
+    "Plans": [
+        {
+            "Node Type": "Bitmap Heap Scan",
+            "Relation Name": "stops_2024_03",
+            "Plans": [{"Node Type": "Bitmap Index Scan", "Index Name": "stops_2024_03_machine_id_start_time_idx"}],
+        },
+        {"Node Type": "Index Scan", "Relation Name": "stops_2024_04", "Index Name": "stops_2024_04_start_time_idx"},
+        {"Node Type": "Seq Scan", "Relation Name": "machines"},
+    ],
+}
+
+def test_scans_lists_nodes_reading_the_relations():
+    assert _scans(PLAN, {"stops_2024_03", "stops_2024_04"}) == [
+        ("Bitmap Heap Scan", None),
+        ("Index Scan", "stops_2024_04_start_time_idx"),
+    ]
+    assert _scans(PLAN, {"machines"}) == [("Seq Scan", None)]
+    assert _scans(PLAN, {"alarms"}) == []
+
+def test_bitmap_uses_finds_the_index_under_a_heap_scan():
+    assert _bitmap_uses(PLAN, {"stops_2024_03_machine_id_start_time_idx"})
+    assert not _bitmap_uses(PLAN, {"stops_2024_04_start_time_idx"})
+
+def test_migrations_are_numbered_in_order():
+    versions = [version for version, _, _, _ in migrate.discover()]
+    assert versions == sorted(versions) == list(range(1, len(versions) + 1))
+
+def test_migrated_schema_is_complete(db):
+    report = migrate.status(db)
+    assert report["pending"] == [] and report["modified"] == []
+    assert migrate.missing_indexes(db) == []
+
+def test_every_hot_query_can_use_its_index(db):
+    results = migrate.explain_hot_queries(db)
+    assert {r["query"] for r in results} == {label for label, *_ in migrate.hot_queries()}
+    assert [r["query"] for r in results if not r["ok"]] == []
+
+def test_partitioning_bounds_the_months_it_creates(db):
+    # A row with a bogus old timestamp goes to the default partition instead
+    # of one partition per month since then
+    import uuid
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    migrations = {version: sql for version, _, sql, _ in migrate.discover()}
+    cur = db.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path = {schema}")
+    try:
+        for version in (1, 2, 3):
+            cur.execute(migrations[version])
+        cur.execute("INSERT INTO stops (start_time) VALUES ('1970-01-01'), (NOW())")
+        cur.execute(migrations[4])
+        cur.execute(
+            "SELECT COUNT(*) FROM pg_inherits WHERE inhparent = to_regclass('stops') "
+            "AND inhrelid <> to_regclass('stops_default')"
+        )
+        assert cur.fetchone()[0] == 24 + 1 + 3
+        cur.execute("SELECT COUNT(*) FROM stops_default")
+        assert cur.fetchone()[0] == 1
+    finally:
+        db.rollback()
+        cur.close()
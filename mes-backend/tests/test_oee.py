@@ -0,0 +1,37 @@
+from oee import PLANNED_TIME, compute_kpis
+from shift_oee import shift_kpis
+
+def machine(id, counter_type="status", rate=None):
+    return {"id": id, "counter_type": counter_type, "avg_pieces_per_sec": rate}
+
+def test_no_downtime_is_full_oee():
+    assert compute_kpis([machine(1)], {}) == [{"oee": 100.0, "availability": 100.0, "performance": 100.0, "quality": 100.0}]
+
+def test_downtime_lowers_availability_only():
+    [kpis] = compute_kpis([machine(1)], {1: PLANNED_TIME / 4})
+    assert kpis["availability"] == 75.0
+    assert kpis["performance"] == 100.0
+    assert kpis["oee"] == 75.0
+
+def test_downtime_is_per_machine():
+    results = compute_kpis([machine(1), machine(2)], {2: PLANNED_TIME / 2})
+    assert [r["availability"] for r in results] == [100.0, 50.0]
+
+def test_downtime_beyond_planned_time_clamps_to_zero():
+    [kpis] = compute_kpis([machine(1)], {1: PLANNED_TIME * 2})
+    assert kpis["availability"] == 0.0
+    assert kpis["oee"] == 0.0
+
+def test_rolling_window_matches_a_shift_without_counts():
+    # One definition: a machine scores the same whether or not a shift runs
+    machines = [machine(1), machine(2, "counter"), machine(3, "counter", 1.5)]
+    rolling = compute_kpis(machines, {1: 900, 2: 900, 3: 900}, planned_time=3600)
+    for m, kpis in zip(machines, rolling):
+        row = {"downtime": 900, "good": 0, "reject": 0, "counter_type": m["counter_type"], "avg_pieces_per_sec": m["avg_pieces_per_sec"]}
+        shift = shift_kpis(row, 3600)
+        assert kpis == {k: shift[k] for k in kpis}
+        assert kpis["oee"] == 75.0
+
+def test_zero_planned_time():
+    [kpis] = compute_kpis([machine(1)], {}, planned_time=0)
+    assert kpis["availability"] == 0.0
@@ -0,0 +1,43 @@
+from auth import PrincipalCache, _on_users_change, principal_cache
+from change_feed import Change
+
+def user(id, username):
+    return {"id": id, "username": username, "role": "User"}
+
+def test_hit_miss_and_expiry():
+    cache = PrincipalCache(ttl=60)
+    assert cache.get("ana") is None
+    cache.put("ana", user(1, "ana"))
+    assert cache.get("ana")["id"] == 1
+    expired = PrincipalCache(ttl=-1)
+    expired.put("ana", user(1, "ana"))
+    assert expired.get("ana") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+def test_least_recently_used_is_evicted():
+    cache = PrincipalCache(ttl=60, max_size=2)
+    cache.put("a", user(1, "a"))
+    cache.put("b", user(2, "b"))
+    cache.get("a")
+    cache.put("c", user(3, "c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_invalidate_by_user_id_and_username():
+    cache = PrincipalCache(ttl=60)
+    cache.put("a", user(1, "a"))
+    cache.put("b", user(2, "b"))
+    cache.invalidate(user_id=1)
+    cache.invalidate(username="b")
+    assert cache.stats()["size"] == 0
+
+def test_remote_user_writes_invalidate_local_ones_do_not():
+    principal_cache.clear()
+    principal_cache.put("a", user(1, "a"))
+    principal_cache.put("b", user(2, "b"))
+    _on_users_change(Change("users", "update", [1], True))
+    assert principal_cache.stats()["size"] == 2
+    _on_users_change(Change("users", "update", [1], False))
+    assert principal_cache.get("a") is None and principal_cache.get("b") is not None
+    _on_users_change(Change("users", "resync", None, False))
+    assert principal_cache.stats()["size"] == 0
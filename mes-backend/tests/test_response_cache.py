@@ -0,0 +1,72 @@
+import asyncio
+import json
+from starlette.requests import Request
+from change_feed import Change
+from response_cache import ResourceCache, _matches
+
+def request(query=b"", etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": query, "headers": headers})
+
+def test_etag_matching():
+    assert _matches('"a", W/"b"', '"b"')
+    assert _matches("*", '"a"')
+    assert not _matches('"a"', '"b"')
+    assert not _matches(None, '"a"')
+
+def test_hit_serves_stored_bytes_and_304_on_matching_etag():
+    cache = ResourceCache("test")
+    builds = []
+    def build():
+        builds.append(1)
+        return {"rows": [1, 2]}
+    first = cache.respond(request(), build)
+    assert first.status_code == 200 and json.loads(first.body) == {"rows": [1, 2]}
+    etag = first.headers["etag"]
+    second = cache.respond(request(etag=etag), build)
+    assert second.status_code == 304 and second.headers["etag"] == etag
+    assert len(builds) == 1
+    assert cache.stats()["not_modified"] == 1
+
+def test_query_strings_are_separate_entries_and_invalidate_rebuilds():
+    cache = ResourceCache("test")
+    builds = []
+    def build():
+        builds.append(1)
+        return {"n": len(builds)}
+    cache.respond(request(b"limit=1"), build)
+    cache.respond(request(b"limit=2"), build)
+    cache.respond(request(b"limit=1"), build)
+    assert len(builds) == 2
+    cache.invalidate()
+    assert json.loads(cache.respond(request(b"limit=1"), build).body) == {"n": 3}
+
+def test_remote_changes_invalidate_local_ones_do_not():
+    cache = ResourceCache("test")
+    cache._on_change(Change("products", "update", [1], True))
+    assert cache.version == 0
+    cache._on_change(Change("products", "update", [1], False))
+    assert cache.version == 1 and cache.stats()["remote_invalidations"] == 1
+
+def test_concurrent_misses_share_one_build():
+    cache = ResourceCache("test")
+    builds = []
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+    async def main():
+        return await asyncio.gather(*(cache.respond_async(request(), build) for _ in range(5)))
+    responses = asyncio.run(main())
+    assert len(builds) == 1
+    assert {r.headers["etag"] for r in responses} == {responses[0].headers["etag"]}
+    assert cache.stats()["coalesced"] == 4
+    assert cache.inflight == {}
+
+def test_build_started_before_an_invalidation_is_not_stored():
+    cache = ResourceCache("test")
+    def build():
+        cache.invalidate()
+        return {"stale": True}
+    cache.respond(request(), build)
+    assert cache.stats()["entries"] == 0
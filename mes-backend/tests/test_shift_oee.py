@@ -0,0 +1,26 @@
+from shift_oee import shift_kpis
+
+def row(downtime=0, good=0, reject=0, counter_type="status", rate=None):
+    return {"downtime": downtime, "good": good, "reject": reject, "counter_type": counter_type, "avg_pieces_per_sec": rate}
+
+def test_status_machine_without_counts_is_scored_on_availability():
+    k = shift_kpis(row(downtime=900), 3600)
+    assert (k["availability"], k["performance"], k["quality"], k["oee"]) == (75.0, 100.0, 100.0, 75.0)
+    assert k["ideal_rate"] == 1.0
+
+def test_counts_against_the_ideal_rate_and_rejects():
+    k = shift_kpis(row(downtime=1800, good=1350, reject=150, counter_type="counter", rate=1), 3600)
+    assert k["availability"] == 50.0
+    assert k["performance"] == 83.33
+    assert k["quality"] == 90.0
+    assert k["oee"] == 37.5
+
+def test_performance_is_capped_and_downtime_clamped():
+    k = shift_kpis(row(downtime=7200, good=10), 3600)
+    assert k["downtime"] == 3600 and k["availability"] == 0.0 and k["performance"] == 0.0
+    k = shift_kpis(row(good=10000, counter_type="counter", rate=1), 3600)
+    assert k["performance"] == 100.0
+
+def test_counter_machine_without_rate_has_no_performance():
+    k = shift_kpis(row(good=100, counter_type="counter"), 3600)
+    assert k["ideal_rate"] == 0.0 and k["performance"] == 0.0 and k["oee"] == 0.0
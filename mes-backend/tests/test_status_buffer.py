@@ -0,0 +1,119 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import status_buffer as status_buffer_module
+from status_buffer import StatusBuffer, STATUS_MAX_TRANSITIONS, _merge
+from stop_tracker import stop_tracker
+from timeline_store import timeline_store
+
+T0 = datetime(2024, 3, 1, 8, 0)
+
+def at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+def add_machine(db, status="RUNNING"):
+    cur = db.cursor()
+    cur.execute("INSERT INTO machines (name, status) VALUES ('M1', %s) RETURNING id", (status,))
+    machine_id = cur.fetchone()[0]
+    db.commit()
+    cur.close()
+    return machine_id
+
+def machine_status(db, machine_id):
+    cur = db.cursor()
+    cur.execute("SELECT status FROM machines WHERE id = %s", (machine_id,))
+    status = cur.fetchone()[0]
+    db.rollback()
+    cur.close()
+    return status
+
+def fresh_trackers():
+    # The trackers are process-wide and the tables are emptied between tests
+    stop_tracker.invalidate()
+    timeline_store.invalidate()
+
+def test_merge_drops_the_repeat_at_the_seam():
+    older = [("RUNNING", at(0)), ("STOPPED", at(1))]
+    newer = [("STOPPED", at(2)), ("RUNNING", at(3))]
+    assert _merge(older, newer) == [("RUNNING", at(0)), ("STOPPED", at(1)), ("RUNNING", at(3))]
+    assert _merge([], newer) == newer
+
+def test_merge_keeps_the_newest_transitions():
+    flapping = [("RUNNING" if i % 2 else "STOPPED", at(i)) for i in range(STATUS_MAX_TRANSITIONS + 10)]
+    merged = _merge(flapping[:10], flapping[10:])
+    assert merged == flapping[-STATUS_MAX_TRANSITIONS:]
+
+def test_report_coalesces_repeats(tmp_path):
+    buffer = StatusBuffer(log_dir=tmp_path)
+    assert buffer.report(1, "STOPPED", at(0))
+    assert not buffer.report(1, "STOPPED", at(1))
+    assert buffer.report(1, "RUNNING", at(2))
+    assert buffer.latest(1) == "RUNNING"
+    assert buffer.stats()["coalesced"] == 1
+
+def test_supersede_hides_reports_being_flushed(tmp_path):
+    buffer = StatusBuffer(log_dir=tmp_path)
+    buffer.report(1, "STOPPED", at(0))
+    buffer.report(2, "STOPPED", at(0))
+    # A flush has taken the batch when machine 1 is updated
+    buffer.flushing, buffer.pending = buffer.pending, {}
+    buffer.forget_machine(1, at(5))
+    machines = buffer.overlay([{"id": 1, "status": "RUNNING"}, {"id": 2, "status": "RUNNING"}])
+    assert [m["status"] for m in machines] == ["RUNNING", "STOPPED"]
+    assert buffer.latest(1) is None and buffer.latest(2) == "STOPPED"
+    # Reports from before the update are stale too; later ones count
+    assert not buffer.report(1, "IDLE", at(4))
+    assert buffer.report(1, "IDLE", at(6))
+    assert buffer.latest(1) == "IDLE"
+
+def test_write_drops_superseded_transitions(db, tmp_path):
+    fresh_trackers()
+    updated, other = add_machine(db), add_machine(db)
+    buffer = StatusBuffer(log_dir=tmp_path)
+    buffer.forget_machine(updated, at(5))
+    batch = {updated: [("STOPPED", at(1))], other: [("STOPPED", at(1))]}
+    assert buffer._write(db, batch) == 1
+    assert machine_status(db, updated) == "RUNNING"
+    assert machine_status(db, other) == "STOPPED"
+
+def test_recover_skips_reports_superseded_in_the_log(db, tmp_path, monkeypatch):
+    fresh_trackers()
+    updated, other = add_machine(db), add_machine(db)
+    records = [
+        {"machine_id": updated, "status": "STOPPED", "at": at(1).isoformat()},
+        {"machine_id": other, "status": "STOPPED", "at": at(1).isoformat()},
+        {"machine_id": updated, "superseded": at(2).isoformat()},
+    ]
+    (tmp_path / "status-99999.log").write_text("".join(json.dumps(r) + "\n" for r in records))
+
+    @contextmanager
+    def scratch_connection():
+        yield db
+
+    monkeypatch.setattr(status_buffer_module, "connection", scratch_connection)
+    buffer = StatusBuffer(log_dir=tmp_path)
+    assert buffer.recover() == 1
+    assert machine_status(db, updated) == "RUNNING"
+    assert machine_status(db, other) == "STOPPED"
+    assert not list(tmp_path.glob("status-99999.*"))
+
+def test_report_with_an_offset_is_stored_as_local_time(tmp_path, monkeypatch):
+    import routers.machines as machines
+    buffer = StatusBuffer(log_dir=tmp_path)
+    monkeypatch.setattr(machines, "status_buffer", buffer)
+    sent = datetime.fromisoformat("2026-10-17T10:00:00+00:00")
+    buffer.forget_machine(1, sent.astimezone().replace(tzinfo=None) - timedelta(seconds=1))
+    result = machines.report_status(1, {"status": "RUNNING", "at": sent.isoformat()}, user={})
+    assert result["changed"]
+    [(status, at)] = buffer.pending[1]
+    assert at.tzinfo is None and at == sent.astimezone().replace(tzinfo=None)
+
+def test_transitions_invalidate_the_cached_listings(tmp_path):
+    from response_cache import lines_cache, machines_cache
+    buffer = StatusBuffer(log_dir=tmp_path)
+    versions = lines_cache.version, machines_cache.version
+    buffer.report(1, "STOPPED", at(0))
+    assert (lines_cache.version, machines_cache.version) == (versions[0] + 1, versions[1] + 1)
+    # A repeat changes nothing a listing shows
+    buffer.report(1, "STOPPED", at(1))
+    assert (lines_cache.version, machines_cache.version) == (versions[0] + 1, versions[1] + 1)
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from stop_tracker import StopTracker
+
+def add_machine(db):
+    cur = db.cursor()
+    cur.execute("INSERT INTO machines (name, status) VALUES ('M1', 'RUNNING') RETURNING id")
+    machine_id = cur.fetchone()[0]
+    db.commit()
+    cur.close()
+    return machine_id
+
+def stops(db, machine_id):
+    cur = db.cursor()
+    cur.execute("SELECT id, end_time IS NULL FROM stops WHERE machine_id = %s ORDER BY id", (machine_id,))
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+def report(tracker, db, machine_id, status, at):
+    change = tracker.observe(db, machine_id, status, at)
+    db.commit()
+    tracker.apply(change)
+    return change
+
+def test_stop_opens_once_and_closes_on_run(db):
+    machine_id = add_machine(db)
+    tracker = StopTracker()
+    at = datetime.now() - timedelta(minutes=10)
+    report(tracker, db, machine_id, "STOPPED", at)
+    report(tracker, db, machine_id, "STOPPED", at + timedelta(minutes=1))
+    [(stop_id, is_open)] = stops(db, machine_id)
+    assert is_open and tracker.open_stop(machine_id) == stop_id
+    report(tracker, db, machine_id, "RUNNING", at + timedelta(minutes=2))
+    assert stops(db, machine_id) == [(stop_id, False)]
+    assert tracker.open_stop(machine_id) is None
+
+def test_workers_share_one_open_stop_per_machine(db):
+    # Two workers with their own in-memory state both see the machine stop
+    machine_id = add_machine(db)
+    first, second = StopTracker(), StopTracker()
+    at = datetime.now() - timedelta(minutes=5)
+    first.ensure_loaded(db)
+    second.ensure_loaded(db)
+    db.rollback()
+    report(first, db, machine_id, "STOPPED", at)
+    report(second, db, machine_id, "STOPPED", at + timedelta(seconds=1))
+    [(stop_id, is_open)] = stops(db, machine_id)
+    assert is_open
+    assert first.open_stop(machine_id) == second.open_stop(machine_id) == stop_id
+
+def test_run_closes_a_stop_opened_by_another_worker(db):
+    machine_id = add_machine(db)
+    opener = StopTracker()
+    at = datetime.now() - timedelta(minutes=5)
+    report(opener, db, machine_id, "STOPPED", at)
+    # A fresh tracker loads the open stop from the table
+    closer = StopTracker()
+    report(closer, db, machine_id, "RUNNING", at + timedelta(minutes=1))
+    assert [is_open for _, is_open in stops(db, machine_id)] == [False]
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from timeline_store import grid_rows
+
+START = datetime(2024, 3, 1, 6, 0)
+END = START + timedelta(hours=8)
+
+def seg(status, start_min, end_min=None):
+    return {
+        "status": status,
+        "start_time": START + timedelta(minutes=start_min),
+        "end_time": START + timedelta(minutes=end_min) if end_min is not None else None,
+    }
+
+def test_segments_in_minutes_clipped_to_the_window():
+    machines = [{"id": 1, "name": "Press"}]
+    segments = {1: [seg("RUNNING", -30, 120), seg("STOPPED", 120, 180), seg("RUNNING", 180, 600)]}
+    rows, total = grid_rows(machines, segments, START, END, END + timedelta(hours=1))
+    assert total == 480
+    [row] = rows
+    assert [(s["start"], s["end"], s["status"]) for s in row["segments"]] == [(0, 120, "RUNNING"), (120, 180, "STOP"), (180, 480, "RUNNING")]
+    assert row["kpi"] == "420/480"
+    assert row["kpiColor"] == "text-green-400"
+    assert row["id"] == "Press" and row["machine_id"] == 1
+
+def test_open_segment_ends_now_in_a_running_shift():
+    now = START + timedelta(hours=2)
+    rows, _ = grid_rows([{"id": 1, "name": None}], {1: [seg("STOPPED", 0, 60), seg("RUNNING", 60)]}, START, END, now)
+    [row] = rows
+    assert row["segments"][-1]["end"] == 120
+    assert row["kpi"] == "60/120"
+    assert row["kpiColor"] == "text-red-600"
+    assert row["id"] == "1"
+
+def test_machine_without_segments_and_window_in_the_future():
+    rows, _ = grid_rows([{"id": 2, "name": "Saw"}], {}, START, END, START - timedelta(hours=1))
+    assert rows[0]["segments"] == [] and rows[0]["kpi"] == "0/0"
@@ -0,0 +1,151 @@
+import threading
+import psycopg2.extras
+from change_feed import change_feed
+
+# Grid statuses used by the timeline view
+GRID_STATUS = {"STOPPED": "STOP"}
+
+class TimelineStore:
+    # Run-length encoded status history in machine_status_segments: one row
+    # per status run, closed when the status changes. Repeated writes of the
+    # same status are merged into the open run without touching the table.
+
+    def __init__(self):
+        self.open_status = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self, cur):
+        cur.execute("SELECT machine_id, status FROM machine_status_segments WHERE end_time IS NULL")
+        rows = cur.fetchall()
+        with self.lock:
+            if not self.loaded:
+                self.open_status = {machine_id: status for machine_id, status in rows}
+                self.loaded = True
+
+    def record(self, conn, machine_id, status, at=None):
+        # Call inside the transaction that changed the status, then pass the
+        # result to apply() once it has committed. at is when the status was
+        # reported, if not now.
+        cur = conn.cursor()
+        try:
+            if not self.loaded:
+                self._load(cur)
+            if self.open_status.get(machine_id) == status:
+                return None
+            cur.execute(
+                "UPDATE machine_status_segments SET end_time = COALESCE(%s::timestamp, NOW()) "
+                "WHERE machine_id = %s AND end_time IS NULL AND status <> %s",
+                (at, machine_id, status),
+            )
+            cur.execute(
+                "INSERT INTO machine_status_segments (machine_id, status, start_time) "
+                "SELECT %s, %s, COALESCE(%s::timestamp, NOW()) "
+                "WHERE NOT EXISTS (SELECT 1 FROM machine_status_segments WHERE machine_id = %s AND end_time IS NULL)",
+                (machine_id, status, at, machine_id),
+            )
+            return (machine_id, status)
+        finally:
+            cur.close()
+
+    def apply(self, change):
+        if change is None:
+            return
+        machine_id, status = change
+        with self.lock:
+            self.open_status[machine_id] = status
+
+    def invalidate(self):
+        # Drop the in-memory state after a failed transaction that may have
+        # applied changes early, or after another worker changed a status;
+        # it is reloaded from the table on next use
+        with self.lock:
+            self.open_status = {}
+            self.loaded = False
+
+    def forget_machine(self, machine_id):
+        with self.lock:
+            self.open_status.pop(machine_id, None)
+
+    def segments(self, conn, machine_ids, start, end):
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(SEGMENTS_SQL, {"ids": list(machine_ids), "start": start, "end": end})
+        rows = cur.fetchall()
+        cur.close()
+        return _by_machine(machine_ids, rows)
+
+    async def segments_async(self, aconn, machine_ids, start, end):
+        rows = await aconn.fetch(SEGMENTS_SQL, {"ids": list(machine_ids), "start": start, "end": end})
+        return _by_machine(machine_ids, rows)
+
+# Runs overlapping [start, end): the runs that begin inside the window (one
+# range scan on (machine_id, start_time)) plus, per machine, the run already
+# in progress at start (one index probe each)
+SEGMENTS_SQL = """
+    SELECT machine_id, status, start_time, end_time FROM machine_status_segments
+    WHERE machine_id = ANY(%(ids)s) AND start_time >= %(start)s AND start_time < %(end)s
+    UNION ALL
+    SELECT p.machine_id, p.status, p.start_time, p.end_time
+    FROM unnest(%(ids)s::int[]) AS m(id)
+    CROSS JOIN LATERAL (
+        SELECT machine_id, status, start_time, end_time FROM machine_status_segments
+        WHERE machine_id = m.id AND start_time < %(start)s
+        ORDER BY start_time DESC LIMIT 1
+    ) p
+    WHERE p.end_time IS NULL OR p.end_time > %(start)s
+    ORDER BY machine_id, start_time
+"""
+
+def _by_machine(machine_ids, rows):
+    by_machine = {machine_id: [] for machine_id in machine_ids}
+    for row in rows:
+        by_machine[row["machine_id"]].append(row)
+    return by_machine
+
+def grid_rows(machines, segments_by_machine, start, end, now):
+    # Shapes segments for the DetailedTimeline grid: minutes from window start
+    total = (end - start).total_seconds()
+    horizon = min(end, now)
+    rows = []
+    for machine in machines:
+        segments = []
+        running = 0.0
+        for seg in segments_by_machine.get(machine["id"], []):
+            seg_start = max(seg["start_time"], start)
+            seg_end = min(seg["end_time"] or horizon, horizon)
+            if seg_end <= seg_start:
+                continue
+            if seg["status"] == "RUNNING":
+                running += (seg_end - seg_start).total_seconds()
+            segments.append({
+                "start": round((seg_start - start).total_seconds() / 60, 2),
+                "end": round((seg_end - start).total_seconds() / 60, 2),
+                "status": GRID_STATUS.get(seg["status"], seg["status"]),
+            })
+        elapsed = max((horizon - start).total_seconds(), 0)
+        availability = round(running / elapsed * 100) if elapsed else 0
+        if availability >= 85:
+            color = "text-green-400"
+        elif availability >= 60:
+            color = "text-white"
+        else:
+            color = "text-red-600"
+        rows.append({
+            "id": machine["name"] or str(machine["id"]),
+            "machine_id": machine["id"],
+            "kpi": f"{round(running / 60)}/{round(elapsed / 60)}",
+            "kpiColor": color,
+            "segments": segments,
+            "markers": [],
+        })
+    return rows, total / 60
+
+timeline_store = TimelineStore()
+
+def _on_machines_change(change):
+    # Segments are not in the feed; every status write updates machines in
+    # the same transaction, so that stands in for them
+    if not change.local:
+        timeline_store.invalidate()
+
+change_feed.subscribe(("machines",), _on_machines_change)
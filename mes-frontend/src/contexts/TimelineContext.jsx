@@ -1,13 +1,12 @@
 import React, { createContext, useContext, useEffect, useRef, useState } from "react";
-import { fetchMachines, createStop, updateStop } from "../services/api";
+import { openMachineStream } from "../services/api";
 
 const TimelineContext = createContext();
 
 export function TimelineProvider({ children }) {
   const [timeline, setTimeline] = useState({});
   const pollingRef = useRef();
-  const lastStatuses = useRef({});
-  const openStopIds = useRef({});
+  const machinesRef = useRef({});
 
   useEffect(() => {
     // Prevent multiple polling intervals in StrictMode or HMR using a window global
@@ -18,17 +17,19 @@ export function TimelineProvider({ children }) {
 
     let isMounted = true;
 
-    async function poll() {
+    // Statuses arrive over the server stream; the local tick only extends the
+    // current segments, it does not hit the API. Stops are detected server-side
+    // from status changes, so nothing is written from here.
+    function tick() {
       try {
-        const machines = await fetchMachines();
         if (!isMounted) return;
+        const machines = Object.values(machinesRef.current);
         const now = Date.now();
 
         setTimeline(prev => {
           const updated = { ...prev };
 
           machines.forEach(({ id, status }) => {
-            const prevStatus = lastStatuses.current[id];
             const segments = updated[id] || [];
             const lastSeg = segments[segments.length - 1];
 
@@ -38,48 +39,32 @@ export function TimelineProvider({ children }) {
               lastSeg.end = now;
             }
             updated[id] = segments;
-
-            // RUNNING -> STOPPED
-            if (
-              prevStatus === "RUNNING" &&
-              status === "STOPPED" &&
-              !openStopIds.current[id]
-            ) {
-              openStopIds.current[id] = "PENDING";
-              createStop({ machine_id: id, reason: null, start_time: new Date(now).toISOString(), end_time: null })
-                .then(res => {
-                  if (res?.id) openStopIds.current[id] = res.id;
-                  else delete openStopIds.current[id];
-                })
-                .catch(() => delete openStopIds.current[id]);
-            }
-
-            // STOPPED -> RUNNING
-            const stopId = openStopIds.current[id];
-            if (
-              prevStatus === "STOPPED" &&
-              status === "RUNNING" &&
-              stopId &&
-              stopId !== "PENDING"
-            ) {
-              updateStop(stopId, { end_time: new Date(now).toISOString() }).catch(console.error);
-              delete openStopIds.current[id];
-            }
-
-            lastStatuses.current[id] = status;
           });
           return { ...updated };
         });
       } catch (err) {
-        console.error("Polling error:", err);
+        console.error("Timeline update error:", err);
       }
     }
 
-    // Initial and recurring polls
-    poll();
-    pollingRef.current = setInterval(poll, 5000);
+    const source = openMachineStream({
+      onSnapshot: machines => {
+        machinesRef.current = Object.fromEntries(machines.map(m => [m.id, m]));
+        tick();
+      },
+      onDelta: (changed, removed) => {
+        changed.forEach(m => {
+          machinesRef.current[m.id] = { ...machinesRef.current[m.id], ...m };
+        });
+        removed.forEach(id => delete machinesRef.current[id]);
+        tick();
+      },
+      onError: err => console.error("Machine stream error:", err),
+    });
+    pollingRef.current = setInterval(tick, 5000);
     return () => {
       isMounted = false;
+      source.close();
       clearInterval(pollingRef.current);
     };
   }, []);
@@ -4,7 +4,7 @@ import { FiHome, FiActivity, FiCheckCircle, FiUsers, FiClock, FiMenu, FiTrending
 import KpiCard from "../components/common/KpiCard";
 import ChartCard from "../components/common/ChartCard";
 import RecentEvents from "../components/Machines/RecentEvents";
-import { fetchStops } from "../services/api";
+import { fetchDashboardSummary } from "../services/api";
 import {
   ResponsiveContainer,
   PieChart,
@@ -17,16 +17,11 @@ import {
   CartesianGrid,
   Tooltip
 } from "recharts";
-import { fetchMachines, fetchWorkOrders, fetchShifts, fetchProductionLines, fetchEvents } from "../services/api";
-import { useTimeline, calculateTRS, calculateMTBF } from "../contexts/TimelineContext";
 
 const COLORS = ["#10B981", "#EAB308", "#F59E0B"];
 
 // RecentStops component (inline for now)
-function RecentStops({ stops, machines }) {
-  // Map machine id to name for display
-  const machineMap = {};
-  machines.forEach(m => { machineMap[m.id] = m.name || m.id; });
+function RecentStops({ stops }) {
   return (
     <div className="bg-gray-800 rounded-lg p-4 shadow-lg">
       <h3 className="text-lg font-bold mb-4">Recent Stops</h3>
@@ -34,14 +29,14 @@ function RecentStops({ stops, machines }) {
         <div className="text-gray-400">No recent stops.</div>
       ) : (
         <ul className="divide-y divide-gray-700">
-          {stops.slice(0, 8).map((stop, idx) => {
+          {stops.map((stop, idx) => {
             const start = stop.start_time ? new Date(stop.start_time) : null;
             const end = stop.end_time ? new Date(stop.end_time) : null;
             const duration = start && end ? Math.round((end - start) / 1000) : null;
             return (
               <li key={stop.id || idx} className="py-2 flex flex-col gap-1">
                 <div className="flex items-center gap-2">
-                  <span className="font-mono text-green-400">{machineMap[stop.machine_id] || stop.machine_id}</span>
+                  <span className="font-mono text-green-400">{stop.machine_name || stop.machine_id}</span>
                   <span className="text-xs text-gray-400">{start ? start.toLocaleString() : "-"} - {end ? end.toLocaleString() : "Ongoing"}</span>
                   {duration !== null && <span className="text-xs text-yellow-400">{duration}s</span>}
                 </div>
@@ -65,29 +60,14 @@ export default function DashboardPage({
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [dateRange, setDateRange] = useState("7d");
-  const [machines, setMachines] = useState([]);
-  const [workOrders, setWorkOrders] = useState([]);
-  const [shifts, setShifts] = useState([]);
-  const [lines, setLines] = useState([]);
-  const [events, setEvents] = useState([]);
-  const [stops, setStops] = useState([]);
+  const [summary, setSummary] = useState(null);
 
   useEffect(() => {
     setLoading(true);
     setError(null);
-    Promise.all([
-      fetchMachines(),
-      fetchWorkOrders(),
-      fetchShifts(),
-      fetchProductionLines(),
-      fetchStops()
-    ])
-      .then(([machines, workOrders, shifts, lines, stops]) => {
-        setMachines(machines);
-        setWorkOrders(workOrders);
-        setShifts(shifts);
-        setLines(lines);
-        setStops(stops || []);
+    fetchDashboardSummary(dateRange)
+      .then((summary) => {
+        setSummary(summary);
         setLoading(false);
       })
       .catch((err) => {
@@ -96,65 +76,21 @@ export default function DashboardPage({
       });
   }, [dateRange]);
 
-  const { timeline } = useTimeline();
-  // Calculate MTBF and TRS for all machines for today
-  const today = new Date();
-  const windowStart = new Date(today.getFullYear(), today.getMonth(), today.getDate(), 0, 0, 0).getTime();
-  const windowEnd = new Date(today.getFullYear(), today.getMonth(), today.getDate(), 23, 59, 59, 999).getTime();
-  let mtbf = '-';
-  let trs = '-';
-  if (machines.length && timeline) {
-    const mtbfVals = machines.map(m => calculateMTBF(timeline[m.id], windowStart, windowEnd)).filter(Boolean);
-    const trsVals = machines.map(m => calculateTRS(timeline[m.id], windowStart, windowEnd)).filter(Boolean);
-    mtbf = mtbfVals.length ? (mtbfVals.reduce((a, b) => a + b, 0) / mtbfVals.length / 60).toFixed(1) : '-'; // in minutes
-    trs = trsVals.length ? (trsVals.reduce((a, b) => a + b, 0) / trsVals.length).toFixed(1) : '-'; // in %
-  }
-
-  // KPIs from backend data
-  const oeeToday = machines.length ? (machines.reduce((a, b) => a + (Number(b.oee) || 0), 0) / machines.length).toFixed(1) : 0;
-  const oeeValues = machines.map(m => Number(m.oee) || 0);
-  const maxOee = oeeValues.length ? Math.max(...oeeValues).toFixed(1) : "-";
-  const minOee = oeeValues.length ? Math.min(...oeeValues).toFixed(1) : "-";
-  const runningMachines = machines.filter(m => m.status === "RUNNING").length;
-  const activeOrders = workOrders.filter(w => w.status && w.status.toLowerCase().includes("active")).length;
-  // Current shift: find shift where now is between start and end
-  const now = new Date();
-  let currentShift = "-";
-  for (const shift of shifts) {
-    if (shift.start_time && shift.end_time) {
-      const today = now.toISOString().split("T")[0];
-      const start = new Date(`${today}T${shift.start_time}`);
-      const end = new Date(`${today}T${shift.end_time}`);
-      if (now >= start && now <= end) {
-        currentShift = shift.name;
-        break;
-      }
-    }
-  }
-
-  // Calculate average downtime per machine for today (in minutes)
-  let avgDowntime = '-';
-  if (machines.length && stops.length) {
-    const today = new Date();
-    const startOfDay = new Date(today.getFullYear(), today.getMonth(), today.getDate(), 0, 0, 0);
-    const endOfDay = new Date(today.getFullYear(), today.getMonth(), today.getDate(), 23, 59, 59, 999);
-    // Filter stops for today
-    const todayStops = stops.filter(s => {
-      const start = new Date(s.start_time);
-      return start >= startOfDay && start <= endOfDay;
-    });
-    // Group by machine
-    const downtimeByMachine = {};
-    todayStops.forEach(s => {
-      const start = new Date(s.start_time);
-      const end = s.end_time ? new Date(s.end_time) : new Date();
-      const duration = (end - start) / 1000 / 60; // minutes
-      if (!downtimeByMachine[s.machine_id]) downtimeByMachine[s.machine_id] = 0;
-      downtimeByMachine[s.machine_id] += duration > 0 ? duration : 0;
-    });
-    const downtimeVals = Object.values(downtimeByMachine);
-    avgDowntime = downtimeVals.length ? (downtimeVals.reduce((a, b) => a + b, 0) / downtimeVals.length).toFixed(1) : '-';
-  }
+  // Every figure below is aggregated server-side by /api/dashboard/summary
+  const fmt = (value) => (value === null || value === undefined ? "-" : Number(value).toFixed(1));
+  const oee = summary ? summary.oee : {};
+  const today = summary ? summary.today : {};
+  const machineCounts = summary ? summary.machines : { total: 0, running: 0 };
+  const stops = summary ? summary.recent_stops : [];
+  const oeeToday = fmt(oee.avg);
+  const maxOee = fmt(oee.max);
+  const minOee = fmt(oee.min);
+  const mtbf = fmt(today.mtbf_minutes);
+  const trs = fmt(today.trs);
+  const avgDowntime = fmt(today.avg_downtime_minutes);
+  const runningMachines = machineCounts.running;
+  const activeOrders = summary ? summary.active_orders : 0;
+  const currentShift = summary && summary.current_shift ? summary.current_shift.name : "-";
 
   const kpis = [
     { label: "OEE Today", value: oeeToday, unit: "%", icon: <FiActivity />, color: "text-green-400" },
@@ -163,41 +99,30 @@ export default function DashboardPage({
     { label: "Avg Downtime", value: avgDowntime, unit: "min", icon: <FiAlertTriangle />, color: "text-red-400" },
     { label: "Max OEE", value: maxOee, unit: "%", icon: <FiActivity />, color: "text-blue-400" },
     { label: "Min OEE", value: minOee, unit: "%", icon: <FiActivity />, color: "text-red-400" },
-    { label: "Machines Running", value: runningMachines + " / " + machines.length, icon: <FiCheckCircle />, color: "text-blue-400" },
+    { label: "Machines Running", value: runningMachines + " / " + machineCounts.total, icon: <FiCheckCircle />, color: "text-blue-400" },
     { label: "Active Orders", value: activeOrders, icon: <FiUsers />, color: "text-yellow-400" },
   ];
 
-  // OEE Donut Chart (Quality, Performance, Availability) - use machine averages from backend
+  // OEE Donut Chart (Quality, Performance, Availability) - fleet averages
   const donutData = [
-    { name: "Quality", value: machines.length ? (machines.reduce((a, b) => a + (Number(b.quality) || 0), 0) / machines.length) : 0 },
-    { name: "Performance", value: machines.length ? (machines.reduce((a, b) => a + (Number(b.performance) || 0), 0) / machines.length) : 0 },
-    { name: "Availability", value: machines.length ? (machines.reduce((a, b) => a + (Number(b.availability) || 0), 0) / machines.length) : 0 },
+    { name: "Quality", value: Number(oee.quality) || 0 },
+    { name: "Performance", value: Number(oee.performance) || 0 },
+    { name: "Availability", value: Number(oee.availability) || 0 },
   ];
 
-  // Availability Bar Chart (last 7/30 days) - fallback to random if not available
-  const availabilityData = Array.from({ length: dateRange === "7d" ? 7 : 30 }, (_, i) => ({
+  // Fleet availability per day over the selected range
+  const availabilityData = (summary ? summary.availability_by_day : []).map((d, i) => ({
     day: i + 1,
-    value: machines.length ? (machines.reduce((a, b) => a + (Number(b.availability) || 0), 0) / machines.length) : 0
+    value: Number(d.value) || 0
   }));
 
-  // Downtime by group - fallback to stops if available
-  // For demo, fallback to empty or random
-  const downtimeData = [];
-
-  // Recent events - use events if available, else fallback
-  const recentEvents = events && events.length > 0 ? events.map(e => ({
-    title: e.title || e.event_type || e.type || "Event",
-    time: e.created_at ? new Date(e.created_at).toLocaleString() : "",
-    description: e.description || e.message || ""
-  })) : [];
-
   // Date range options
   const dateOptions = [
     { value: "7d", label: "Last 7 days" },
     { value: "30d", label: "Last 30 days" },
   ];
 
-  if (!machines.length && loading) return <div>Loading...</div>;
+  if (!summary && loading) return <div>Loading...</div>;
   if (error) return <div className="text-red-500">Error: {error}</div>;
 
   return (
@@ -285,19 +210,7 @@ export default function DashboardPage({
             {/* Stops per Hour Bar Chart */}
             <ChartCard title="Stops per Hour" subtitle="Today" className="bg-surface text-primary border border-background rounded-xl shadow-lg" >
               <ResponsiveContainer width="100%" height="100%">
-                <BarChart data={(() => {
-                  // Prepare stops per hour data for today
-                  const today = new Date();
-                  const startOfDay = new Date(today.getFullYear(), today.getMonth(), today.getDate(), 0, 0, 0);
-                  const stopsPerHour = Array.from({ length: 24 }, (_, h) => ({ hour: `${h}:00`, count: 0 }));
-                  stops.forEach(s => {
-                    const start = new Date(s.start_time);
-                    if (start >= startOfDay && start.getDate() === today.getDate()) {
-                      stopsPerHour[start.getHours()].count++;
-                    }
-                  });
-                  return stopsPerHour;
-                })()}>
+                <BarChart data={today.stops_per_hour || []}>
                   <CartesianGrid stroke="#333" vertical={false} />
                   <XAxis dataKey="hour" stroke="#888" />
                   <YAxis stroke="#888" allowDecimals={false} />
@@ -309,7 +222,7 @@ export default function DashboardPage({
 
             {/* Recent Stops List */}
             <div className="bg-surface text-primary border border-background rounded-xl shadow-lg">
-              <RecentStops stops={stops} machines={machines} />
+              <RecentStops stops={stops} />
             </div>
 
             {/* Sixth slot left blank to preserve grid */}
@@ -1,8 +1,8 @@
 import React, { useEffect, useState, useRef } from "react";
-import { fetchProductionLines, fetchShifts, fetchMachines, fetchUsers } from "../services/api";
+import { fetchProductionLines, fetchShifts, fetchMachines, fetchUsers, fetchAnalytics } from "../services/api";
 import { useLocation } from "react-router-dom";
 import { useNotifications } from "../contexts/NotificationContext";
-import { useTimeline, calculateTRS, calculateMTBF } from "../contexts/TimelineContext";
+import { useTimeline } from "../contexts/TimelineContext";
 
 /*
 The conversation covers a comprehensive development and debugging process for a manufacturing management web application (MES) with both frontend (React) and backend (FastAPI/PostgreSQL) components. Here's a detailed summary:
@@ -85,6 +85,7 @@ export default function MachinesTimeline({ menuOpen, setMenuOpen, activeNav, set
   const [hoveredSegment, setHoveredSegment] = useState(null);
   const { addNotification } = useNotifications();
   const [selectedMachineId, setSelectedMachineId] = useState(null);
+  const [analytics, setAnalytics] = useState({});
 
   // Always use the current hour for the timeline window
   const nowDate = now;
@@ -126,6 +127,26 @@ export default function MachinesTimeline({ menuOpen, setMenuOpen, activeNav, set
     });
   }, [selectedLine, selectedShift]);
 
+  // Refresh line analytics for the current window once a minute
+  const windowStartIso = shiftStart.toISOString();
+  const windowEndIso = shiftEnd.toISOString();
+  useEffect(() => {
+    if (!selectedLine) return;
+    let cancelled = false;
+    const load = () =>
+      fetchAnalytics({ line_id: selectedLine.id, start: windowStartIso, end: windowEndIso })
+        .then(res => {
+          if (!cancelled) setAnalytics(Object.fromEntries(res.machines.map(m => [m.machine_id, m])));
+        })
+        .catch(console.error);
+    load();
+    const interval = setInterval(load, 60000);
+    return () => {
+      cancelled = true;
+      clearInterval(interval);
+    };
+  }, [selectedLine, windowStartIso, windowEndIso]);
+
   // Auto-select line if passed via navigation state
   useEffect(() => {
     if (location.state && location.state.line) {
@@ -180,12 +201,10 @@ export default function MachinesTimeline({ menuOpen, setMenuOpen, activeNav, set
   // Determine which machine to show KPIs for
   const machineOptions = machines;
   const selectedMachine = machineOptions.find(m => m.id === selectedMachineId);
-  // Calculate TRS and MTBF for selected machine in current shift window
-  let trs = 0, mtbf = 0;
-  if (selectedMachine && timeline[selectedMachine.id]) {
-    trs = calculateTRS(timeline[selectedMachine.id], shiftStart.getTime(), shiftEnd.getTime());
-    mtbf = calculateMTBF(timeline[selectedMachine.id], shiftStart.getTime(), shiftEnd.getTime());
-  }
+  // TRS and MTBF for the selected machine come from the backend analytics
+  const selectedAnalytics = selectedMachine ? analytics[selectedMachine.id] : null;
+  const trs = selectedAnalytics?.trs || 0;
+  const mtbf = selectedAnalytics?.mtbf_seconds || 0;
 
   useEffect(() => {
     if (
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { fetchMachines, updateMachine } from "../services/api";
+import { fetchMachines, updateMachineStatus } from "../services/api";
 import { FiRefreshCw } from "react-icons/fi";
 
 export default function SimulateMachinesPage({ menuOpen, setMenuOpen, toggleMenu }) {
@@ -21,7 +21,7 @@ export default function SimulateMachinesPage({ menuOpen, setMenuOpen, toggleMenu
     setError(null);
     setSuccess("");
     try {
-      await updateMachine(machine.id, { ...machine, status: newStatus });
+      await updateMachineStatus(machine.id, newStatus);
       setMachines((ms) =>
         ms.map((m) => (m.id === machine.id ? { ...m, status: newStatus } : m))
       );
@@ -23,6 +23,22 @@ async function fetchWithAuth(url, options = {}) {
   return res.json();
 }
 
+// List endpoints return at most `limit` rows per request plus a cursor for
+// the next page (null on the last one); follow it so screens get every row
+const PAGE_SIZE = 1000;
+async function fetchAllPages(path, key, cursor = "next_after_id", param = "after_id") {
+  const rows = [];
+  let next = null;
+  do {
+    const query = new URLSearchParams({ limit: PAGE_SIZE });
+    if (next !== null) query.set(param, next);
+    const res = await fetchWithAuth(`${API_BASE}${path}?${query}`);
+    rows.push(...res[key]);
+    next = res[cursor] ?? null;
+  } while (next !== null);
+  return rows;
+}
+
 export async function loginUser(username, password) {
   const res = await fetch(`${API_BASE}/auth/login`, {
     method: "POST",
@@ -52,14 +68,34 @@ export async function updateMachine(id, data) {
     body: JSON.stringify(data),
   });
 }
+// Status-only update; buffered server-side and written in batches
+export async function updateMachineStatus(id, status) {
+  return fetchWithAuth(`${API_BASE}/machines/${id}/status`, {
+    method: "PUT",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ status }),
+  });
+}
 export async function deleteMachine(id) {
   return fetchWithAuth(`${API_BASE}/machines/${id}`, { method: "DELETE" });
 }
 
+// Live machine status/KPI stream (server-sent events). Calls onSnapshot with the
+// full machine list on connect and onDelta with only the machines that changed.
+export function openMachineStream({ onSnapshot, onDelta, onError }) {
+  const source = new EventSource(`${API_BASE}/stream/machines`);
+  source.addEventListener("snapshot", e => onSnapshot?.(JSON.parse(e.data).machines));
+  source.addEventListener("delta", e => {
+    const { machines, removed } = JSON.parse(e.data);
+    onDelta?.(machines, removed);
+  });
+  if (onError) source.onerror = onError;
+  return source;
+}
+
 // Work Orders
 export async function fetchWorkOrders() {
-  const res = await fetchWithAuth(`${API_BASE}/workorders/`);
-  return res.work_orders;
+  return fetchAllPages("/workorders/", "work_orders");
 }
 export async function createWorkOrder(data) {
   return fetchWithAuth(`${API_BASE}/workorders/`, {
@@ -81,8 +117,7 @@ export async function deleteWorkOrder(id) {
 
 // Users
 export async function fetchUsers() {
-  const res = await fetchWithAuth(`${API_BASE}/users/`);
-  return res.users;
+  return fetchAllPages("/users/", "users");
 }
 export async function createUser(data) {
   const payload = { ...data };
@@ -142,8 +177,7 @@ export async function deleteProductionLine(id) {
 
 // Shifts
 export async function fetchShifts() {
-  const res = await fetchWithAuth(`${API_BASE}/shifts/`);
-  return res.shifts;
+  return fetchAllPages("/shifts/", "shifts");
 }
 export async function createShift(data) {
   return fetchWithAuth(`${API_BASE}/shifts/`, {
@@ -164,9 +198,9 @@ export async function deleteShift(id) {
 }
 
 // Stops
+// Newest first
 export async function fetchStops() {
-  const res = await fetchWithAuth(`${API_BASE}/stops/`);
-  return res.stops;
+  return fetchAllPages("/stops/", "stops", "next_before_id", "before_id");
 }
 export async function createStop(data) {
   return fetchWithAuth(`${API_BASE}/stops/`, {
@@ -230,6 +264,18 @@ export async function deleteEvent(id) {
   return fetchWithAuth(`${API_BASE}/events/${id}`, { method: "DELETE" });
 }
 
+// Analytics (MTBF/MTTR/availability/TRS computed server-side from stops)
+export async function fetchAnalytics(params = {}) {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, v]) => v !== undefined && v !== null)
+  ).toString();
+  return fetchWithAuth(`${API_BASE}/analytics/?${query}`);
+}
+
+export async function fetchDashboardSummary(range = "7d") {
+  return fetchWithAuth(`${API_BASE}/dashboard/summary?range=${range}`);
+}
+
 export async function fetchOpenStop(machine_id) {
   const res = await fetchWithAuth(`${API_BASE}/stops/open?machine_id=${machine_id}`);
   return res.stop || null;